@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of AI romaji/translation results.
+Entries are content-addressed by (backend, model, prompt version, normalized
+line) and stored in SQLite with least-recently-used eviction once the cache
+grows past its entry or byte budget.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, Optional, Tuple
+
+import lrc_parser
+
+
+def default_cache_path() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'lyricstamp', 'ai_cache.sqlite')
+
+
+def normalize_line(line: str) -> str:
+    """Canonical form of a lyric for caching and de-duplication."""
+    text = unicodedata.normalize('NFKC', lrc_parser.strip_word_times(line))
+    return ' '.join(text.split())
+
+
+def prompt_version(prompt: str) -> str:
+    """Short content hash of a prompt, so editing the prompt invalidates old entries."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+
+
+def cache_key(backend: str, model: str, version: str, line: str) -> str:
+    raw = '\0'.join((backend, model, version, normalize_line(line)))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationCache:
+    """SQLite-backed LRU cache shared by every thread of the AI pipeline."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 100000,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Return cached values for the keys that are present and mark them used."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                found.update(self._conn.execute(
+                    f'SELECT key, value FROM entries WHERE key IN ({placeholders})', chunk))
+            if found:
+                now = time.time()
+                self._conn.executemany('UPDATE entries SET last_used = ? WHERE key = ?',
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        now = time.time()
+        rows = [(key, value, len(value.encode('utf-8')), now) for key, value in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Drop the least recently used tenth so eviction does not run on every insert
+        target = min(self.max_entries, count) * 9 // 10
+        excess = count - target
+        while True:
+            self._conn.execute('''DELETE FROM entries WHERE key IN (
+                SELECT key FROM entries ORDER BY last_used LIMIT ?)''', (excess,))
+            self.evictions += excess
+            count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+            if total <= self.max_bytes or count == 0:
+                return
+            excess = max(1, count // 10)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
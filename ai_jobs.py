@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Background job queue for AI enhancement.
+Jobs run on a bounded worker pool, report per-line progress, can be
+cancelled, and expose throughput and ETA while they run.
+"""
+
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+
+class AIJob:
+    """State of one enhancement job; `work(job)` reports through update()."""
+
+    def __init__(self, total_lines: int, backend: str, on_update: Optional[Callable[['AIJob'], None]] = None,
+                 owner: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner  # the session that submitted it, if any
+        self.status = 'queued'  # queued, processing, completed, error, cancelled
+        self.total_lines = total_lines
+        self.done_lines = 0
+        self.message = 'Queued'
+        self.backend = backend
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.partial = {}  # lyric index -> result, filled in as streamed lines arrive
+        self.cancel_event = threading.Event()
+        self._on_update = on_update
+
+    def _changed(self):
+        if self._on_update:
+            self._on_update(self)
+
+    def start(self):
+        self.status = 'processing'
+        self.started_at = time.time()
+        self.message = 'Starting AI processing...'
+        self._changed()
+
+    def update(self, done_lines: int, total_lines: Optional[int] = None, message: Optional[str] = None):
+        """Progress callback: `done_lines` of `total_lines` are finished."""
+        self.done_lines = done_lines
+        if total_lines is not None:
+            self.total_lines = total_lines
+        self.message = message or f"Processed {done_lines}/{self.total_lines} lines"
+        self._changed()
+
+    def finish(self, status: str, message: str, result=None):
+        self.status = status
+        self.message = message
+        self.result = result
+        self.finished_at = time.time()
+        self._changed()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'error', 'cancelled')
+
+    def to_dict(self) -> dict:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        throughput = self.done_lines / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total_lines - self.done_lines)
+        if self.status == 'completed':
+            progress = 100
+        else:
+            progress = int(self.done_lines * 100 / self.total_lines) if self.total_lines else 0
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'current_line': self.done_lines,
+            'total_lines': self.total_lines,
+            'progress': progress,
+            'message': self.message,
+            'backend': self.backend,
+            'elapsed': elapsed,
+            'lines_per_second': throughput,
+            'eta_seconds': remaining / throughput if throughput and not self.finished else None
+        }
+
+
+class JobQueue:
+    """Runs jobs on a bounded worker pool and remembers the most recent ones."""
+
+    def __init__(self, max_workers: int = 2, history: int = 50):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, work: Callable[[AIJob], object], total_lines: int, backend: str,
+               on_update: Optional[Callable[[AIJob], None]] = None, owner: Optional[str] = None) -> AIJob:
+        job = AIJob(total_lines, backend, on_update, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [job_id for job_id, old in self._jobs.items() if old.finished]
+            for job_id in itertools.islice(finished, max(0, len(self._jobs) - self.history)):
+                del self._jobs[job_id]
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job: AIJob, work: Callable[[AIJob], object]):
+        if job.cancel_event.is_set():
+            job.finish('cancelled', 'Cancelled before start')
+            return
+        job.start()
+        try:
+            result = work(job)
+        except Exception as e:
+            if job.cancel_event.is_set():
+                job.finish('cancelled', 'AI processing cancelled')
+            else:
+                job.finish('error', f'AI processing failed: {e}')
+            return
+        job.finish('completed', 'AI processing completed successfully!', result)
+
+    def get(self, job_id: str) -> Optional[AIJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self) -> Optional[AIJob]:
+        with self._lock:
+            return next(reversed(self._jobs.values()), None)
+
+    def list(self) -> List[AIJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """Cancel a queued or running job; with `owner`, only a job that owner submitted."""
+        job = self.get(job_id)
+        if not job or job.finished or (owner is not None and job.owner != owner):
+            return False
+        job.cancel_event.set()
+        job.message = 'Cancelling...'
+        return True
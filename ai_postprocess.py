@@ -4,58 +4,101 @@ AI-powered phonetics and translation script for .lcrx files using Ollama.
 This script reads a .lcrx file and uses Ollama to add phonetics and translations.
 """
 
+import glob
 import json
 import os
 import sys
 import argparse
 import requests
 import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import List, Tuple, Optional
-import re
+from typing import Callable, Iterator, List, Tuple, Optional
+
+import ai_cache
+import atomic_io
+import lrc_parser
+import metrics
+import profiling
+from lyrics_index import LyricsIndex
+
+AI_REQUEST_SECONDS = metrics.histogram('lyricstamp_ai_request_seconds', 'AI backend requests, to the end of the answer',
+                                       ('backend', 'mode', 'outcome'))
+AI_TOKENS = metrics.counter('lyricstamp_ai_tokens_total', 'Tokens the AI backend reported using',
+                            ('backend', 'kind'))
+
+
+def record_ai_request(backend: str, mode: str, started: float, outcome: str,
+                      prompt_tokens: int = 0, completion_tokens: int = 0):
+    """Record one backend request's latency and token usage."""
+    AI_REQUEST_SECONDS.observe(time.perf_counter() - started, backend, mode, outcome)
+    if prompt_tokens:
+        AI_TOKENS.inc(backend, 'prompt', amount=prompt_tokens)
+    if completion_tokens:
+        AI_TOKENS.inc(backend, 'completion', amount=completion_tokens)
+
+
+def pooled_session(pool_size: int = 16) -> requests.Session:
+    """Session whose connection pool is large enough for concurrent batch workers."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
 
 class OpenAIClient:
     """Client for interacting with OpenAI API."""
     
-    def __init__(self):
+    url = "https://api.openai.com/v1/chat/completions"
+    
+    def __init__(self, pool_size: int = 16):
         self.api_key = os.environ.get('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
-        self.session = requests.Session()
+        self.session = pooled_session(pool_size)
         self.session.headers.update({
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         })
     
-    def generate(self, model: str, prompt: str, system: str = None) -> str:
-        """Generate text using OpenAI."""
+    def _request_data(self, model: str, prompt: str, system: str, max_tokens: int) -> dict:
         # Reload API key from environment in case it changed
         api_key = os.environ.get('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
         self.session.headers.update({'Authorization': f'Bearer {api_key}'})
-        url = "https://api.openai.com/v1/chat/completions"
         
         messages = []
         if system:
             messages.append({"role": "system", "content": system})
         messages.append({"role": "user", "content": prompt})
         
-        data = {
+        return {
             "model": model,
             "messages": messages,
             "temperature": 0.1,
-            "max_tokens": 200
+            "max_tokens": max_tokens
         }
+    
+    def generate(self, model: str, prompt: str, system: str = None, max_tokens: int = 200) -> str:
+        """Generate text using OpenAI."""
+        data = self._request_data(model, prompt, system, max_tokens)
+        started = time.perf_counter()
+        outcome, usage = 'error', {}
         
         try:
-            response = self.session.post(url, json=data, timeout=30)
+            response = self.session.post(self.url, json=data, timeout=30)
             response.raise_for_status()
             result = response.json()
+            outcome, usage = 'ok', result.get("usage") or {}
             return result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 429:
+                outcome = 'rate_limited'
                 raise e  # Re-raise to handle in calling function
             else:
                 print(f"Error calling OpenAI: {e}")
@@ -63,64 +106,149 @@ class OpenAIClient:
         except requests.exceptions.RequestException as e:
             print(f"Error calling OpenAI: {e}")
             return ""
+        finally:
+            record_ai_request('openai', 'generate', started, outcome,
+                              usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+    
+    def stream(self, model: str, prompt: str, system: str = None, max_tokens: int = 200) -> Iterator[str]:
+        """Yield completion text as the server streams it (server-sent events).
+
+        HTTP and transport errors propagate, so the caller can tell a failed
+        request from a malformed answer.
+        """
+        data = self._request_data(model, prompt, system, max_tokens)
+        data["stream"] = True
+        # The last event before [DONE] then carries the token usage
+        data["stream_options"] = {"include_usage": True}
+        started = time.perf_counter()
+        outcome, usage = 'error', {}
+        
+        try:
+            with self.session.post(self.url, json=data, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                # chunk_size=None hands over each chunk as it arrives instead of filling 512 bytes
+                for line in response.iter_lines(chunk_size=None):
+                    if not line.startswith(b'data:'):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == b'[DONE]':
+                        outcome = 'ok'
+                        return
+                    event = json.loads(payload)
+                    usage = event.get("usage") or usage
+                    choices = event.get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+                outcome = 'ok'
+        except GeneratorExit:
+            # The caller stopped reading (cancelled, or it had every line it asked for)
+            outcome = 'closed'
+            raise
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 429:
+                outcome = 'rate_limited'
+            raise
+        finally:
+            record_ai_request('openai', 'stream', started, outcome,
+                              usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
 
 
 class OllamaClient:
     """Client for interacting with Ollama API."""
-    def __init__(self):
+    def __init__(self, pool_size: int = 16):
         self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
-        self.session = requests.Session()
+        self.session = pooled_session(pool_size)
         self.session.headers.update({'Content-Type': 'application/json'})
 
-    def generate(self, model: str, prompt: str, system: str = None) -> str:
-        url = f"{self.ollama_url}/api/generate"
-        
+    def _request_data(self, model: str, prompt: str, system: str, stream: bool) -> dict:
         # Combine system and user prompt for generate endpoint
         full_prompt = ""
         if system:
             full_prompt += f"{system}\n\n"
         full_prompt += prompt
         
-        data = {
+        return {
             "model": model,
             "prompt": full_prompt,
-            "stream": False
+            "stream": stream
         }
+    
+    def generate(self, model: str, prompt: str, system: str = None, max_tokens: int = None) -> str:
+        url = f"{self.ollama_url}/api/generate"
+        data = self._request_data(model, prompt, system, stream=False)
+        started = time.perf_counter()
+        outcome, result = 'error', {}
         
         try:
             response = self.session.post(url, json=data, timeout=120)  # Increased timeout
             response.raise_for_status()
             result = response.json()
+            outcome = 'ok'
             return result.get("response", "").strip()
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 429:
+                outcome = 'rate_limited'
+                raise e  # Re-raise to handle in calling function
+            print(f"Error calling Ollama: {e}")
+            return ""
         except requests.exceptions.RequestException as e:
             print(f"Error calling Ollama: {e}")
             return ""
+        finally:
+            record_ai_request('ollama', 'generate', started, outcome,
+                              result.get("prompt_eval_count", 0), result.get("eval_count", 0))
+    
+    def stream(self, model: str, prompt: str, system: str = None, max_tokens: int = None) -> Iterator[str]:
+        """Yield response text as the model produces it (newline-delimited JSON).
+
+        HTTP and transport errors, and errors Ollama reports mid-stream,
+        propagate, so the caller can tell a failed request from a malformed answer.
+        """
+        url = f"{self.ollama_url}/api/generate"
+        data = self._request_data(model, prompt, system, stream=True)
+        started = time.perf_counter()
+        outcome, event = 'error', {}
+        
+        try:
+            with self.session.post(url, json=data, timeout=120, stream=True) as response:
+                response.raise_for_status()
+                # chunk_size=None hands over each chunk as it arrives instead of filling 512 bytes
+                for line in response.iter_lines(chunk_size=None):
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("error"):
+                        raise RuntimeError(f"Ollama error: {event['error']}")
+                    if event.get("response"):
+                        yield event["response"]
+                    if event.get("done"):
+                        # The final event carries the token counts
+                        outcome = 'ok'
+                        return
+                outcome = 'ok'
+        except GeneratorExit:
+            # The caller stopped reading (cancelled, or it had every line it asked for)
+            outcome = 'closed'
+            raise
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 429:
+                outcome = 'rate_limited'
+            raise
+        finally:
+            record_ai_request('ollama', 'stream', started, outcome,
+                              event.get("prompt_eval_count", 0), event.get("eval_count", 0))
 
 
 def parse_lrcx_file(file_path: str) -> Tuple[List[str], List[str]]:
-    """Parse a .lrcx file and return timestamps and lyrics."""
-    timestamps = []
-    lyrics = []
-    
+    """Parse a .lrcx file and return timestamps and lyrics.
+
+    Each timestamp entry is the row's full tag prefix (several timestamps, or a
+    metadata tag with an empty lyric), so writing prefix + lyric is lossless.
+    """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Find the timestamp at the beginning of the line
-                timestamp_end = line.find(']')
-                if timestamp_end != -1 and line.startswith('['):
-                    timestamp = line[:timestamp_end + 1]
-                    lyric = line[timestamp_end + 1:].strip()
-                    timestamps.append(timestamp)
-                    lyrics.append(lyric)
-                else:
-                    # No timestamp, treat as lyric only
-                    timestamps.append("")
-                    lyrics.append(line)
-    
+            rows = list(lrc_parser.tokenize(f))
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
         sys.exit(1)
@@ -128,7 +256,7 @@ def parse_lrcx_file(file_path: str) -> Tuple[List[str], List[str]]:
         print(f"Error reading file: {e}")
         sys.exit(1)
     
-    return timestamps, lyrics
+    return [row.prefix for row in rows], [row.text for row in rows]
 
 
 def detect_language(text: str) -> str:
@@ -143,22 +271,65 @@ def detect_language(text: str) -> str:
     return result.lower().strip()
 
 
-def add_ai_phonetics_and_translation(lyrics: List[str], target_language: str = "en", model: str = "gpt-3.5-turbo", include_kanji: bool = False, ollama_url: str = None, use_ollama: bool = False) -> List[str]:
-    """Add English translations and romaji versions for Japanese text using AI."""
-    client = OllamaClient() if use_ollama else OpenAIClient()
-    
-    # Use appropriate model for each backend
-    if use_ollama:
-        ollama_model = "phi3.5:3.8b"  # Default Ollama model
-    else:
-        ollama_model = model  # Use the provided model for OpenAI
-    
-    # Use the include_kanji flag to determine if we should add kanji
-    should_include_kanji = include_kanji
-    print(f"Kanji inclusion: {should_include_kanji}")
-    print(f"Using model: {ollama_model if use_ollama else model}")
-    
-    system_prompt = """You are a Japanese text processing expert. For each line of Japanese lyrics, provide the romaji (Latin alphabet transcription).
+class AIProcessingCancelled(Exception):
+    """Raised when a caller cancels add_ai_phonetics_and_translation mid-run."""
+
+
+class AdaptiveRateLimiter:
+    """Bounds in-flight requests and backs off when the backend returns 429.
+
+    A 429 halves the concurrency limit and pauses every worker until the
+    Retry-After deadline; each success lets the limit grow back by one.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.active = 0
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self.active >= self.limit:
+                    self._cond.wait()
+                else:
+                    self.active += 1
+                    return
+
+    def release(self, success: bool = True):
+        with self._cond:
+            self.active -= 1
+            if success and self.limit < self.max_concurrency:
+                self.limit += 1
+            self._cond.notify_all()
+
+    def rate_limited(self, retry_after: float):
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+
+def parse_retry_after(response, attempt: int) -> float:
+    """Seconds to wait after a 429: the Retry-After header, else exponential backoff."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(60.0, 2.0 ** attempt)
+
+
+ROMAJI_BATCH_SYSTEM_PROMPT = """You are a Japanese text processing expert. For each numbered line of Japanese lyrics, provide the romaji (Latin alphabet transcription).
 
 For romaji conversion:
 - Convert all Japanese text to romaji (Latin alphabet)
@@ -168,137 +339,534 @@ For romaji conversion:
 
 IMPORTANT: Respond ONLY with valid JSON. Do not include any thinking process, explanations, or other text.
 
-Format your response as JSON with this structure:
-{
-    "romaji": "romaji transcription of the Japanese text"
-}
+Format your response as a JSON array with one object per input line, in the same order:
+[
+    {"id": 1, "romaji": "romaji transcription of line 1"},
+    {"id": 2, "romaji": "romaji transcription of line 2"}
+]
 
 Only respond with valid JSON, no other text."""
 
-    enhanced_lyrics = []
+
+def build_batch_prompt(lines: List[str]) -> str:
+    numbered = "\n".join(f"{i}. {lrc_parser.strip_word_times(line)}" for i, line in enumerate(lines, 1))
+    return f"Provide romaji transcription for each of these {len(lines)} lines of Japanese text:\n{numbered}"
+
+
+class StreamingJSONArrayParser:
+    """Incremental parser for a JSON array of objects that arrives in pieces.
+
+    feed() returns each top-level object as soon as its closing brace has been
+    seen, so a streamed batch can be used line by line. Text before the array
+    (a code fence, a short preamble) is skipped; anything else that cannot be
+    part of the expected array raises json.JSONDecodeError immediately so the
+    caller can drop the response instead of waiting for the model to finish.
+    """
+
+    def __init__(self, max_preamble: int = 256):
+        self.max_preamble = max_preamble
+        self.started = False
+        self.finished = False
+        self._consumed = 0
+        self._object: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, ''.join(self._object), self._consumed)
+
+    def feed(self, chunk: str) -> List[dict]:
+        objects = []
+        for char in chunk:
+            self._consumed += 1
+            if self.finished:
+                continue  # trailing text such as a closing code fence
+            if not self.started:
+                if char == '[':
+                    self.started = True
+                elif self._consumed > self.max_preamble:
+                    raise self._error("No JSON array in response")
+                continue
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                    self._object = [char]
+                elif char == ']':
+                    self.finished = True
+                elif not (char.isspace() or char == ','):
+                    raise self._error(f"Unexpected {char!r} between array items")
+                continue
+            self._object.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append(json.loads(''.join(self._object)))
+                    self._object = []
+        return objects
+
+    def close(self):
+        """Signal the end of input; a response that never opened an array is malformed."""
+        if not self.started:
+            raise self._error("No JSON array in response")
+
+
+def batch_item_index(item: dict, position: int, count: int) -> Optional[int]:
+    """Zero-based batch line an array item answers, preferring its "id" over its position."""
+    index = item.get('id', position + 1)
+    if isinstance(index, int) and 1 <= index <= count:
+        return index - 1
+    return None
+
+
+@profiling.profiled('ai_pipeline')
+def add_ai_phonetics_and_translation(lyrics: List[str], target_language: str = "en", model: str = "gpt-3.5-turbo", include_kanji: bool = False, ollama_url: str = None, use_ollama: bool = False, batch_size: int = 8, concurrency: int = 4, max_retries: int = 5, use_cache: bool = True, cache: Optional[ai_cache.TranslationCache] = None, progress: Optional[Callable[[int, int], None]] = None, cancel_event: Optional[threading.Event] = None, stream: bool = True, on_line: Optional[Callable[[int, str], None]] = None, client=None, limiter: Optional['AdaptiveRateLimiter'] = None, verbose: bool = True, missing: Optional[List[int]] = None) -> List[str]:
+    """Add English translations and romaji versions for Japanese text using AI.
+
+    Repeated lines are requested once and earlier answers come from the
+    persistent cache unless use_cache is False. The remaining lines are sent
+    `batch_size` at a time with up to `concurrency` requests in flight; 429
+    responses throttle all workers via Retry-After. The output keeps the input
+    order.
     
-    for i, lyric in enumerate(lyrics):
-        if not lyric or lyric.startswith('[tr]') or lyric.startswith('[tl]'):
-            enhanced_lyrics.append(lyric)
-            continue
-        
-        print(f"Processing line {i+1}/{len(lyrics)}: {lyric[:50]}...")
-        
-        prompt = f"Provide romaji transcription for this Japanese text:\n{lyric}"
-        
+    `progress(done, total)` is called as lines complete; setting `cancel_event`
+    stops issuing requests and raises AIProcessingCancelled.
+    
+    With `stream` the responses are parsed while they arrive: each line's
+    result is cached and passed to `on_line(index, romaji)` (index into
+    `lyrics`, once per occurrence) as soon as its JSON object closes, and a
+    malformed response is abandoned at the first bad character.
+    
+    Batch runs share one `client` (and so one connection pool) and one
+    `limiter` across files, so concurrency is bounded per backend rather than
+    per file; `verbose=False` keeps per-file chatter off the console.
+    
+    Lines the backend never answered (errors, malformed or short responses)
+    get no [tr] line; their indices into `lyrics` are appended to `missing`
+    when it is given, so callers can tell a partial result from a full one.
+    """
+    client = client or (OllamaClient() if use_ollama else OpenAIClient())
+    log = print if verbose else (lambda *args, **kwargs: None)
+    
+    # Use appropriate model for each backend
+    if use_ollama:
+        ollama_model = "phi3.5:3.8b"  # Default Ollama model
+    else:
+        ollama_model = model  # Use the provided model for OpenAI
+    
+    # Use the include_kanji flag to determine if we should add kanji
+    should_include_kanji = include_kanji
+    log(f"Kanji inclusion: {should_include_kanji}")
+    log(f"Using model: {ollama_model if use_ollama else model}")
+    
+    pending = [i for i, lyric in enumerate(lyrics) if lyric and not lrc_parser.is_subline(lyric)]
+    normalized = {i: ai_cache.normalize_line(lyrics[i]) for i in pending}
+    # Repeated lines (choruses) are only requested once
+    unique_lines = list(dict.fromkeys(normalized.values()))
+    backend = 'ollama' if use_ollama else 'openai'
+    version = ai_cache.prompt_version(ROMAJI_BATCH_SYSTEM_PROMPT)
+    keys = {line: ai_cache.cache_key(backend, ollama_model, version, line) for line in unique_lines}
+    results: dict = {}
+    
+    owns_cache = use_cache and cache is None
+    if owns_cache:
         try:
-            result = client.generate(ollama_model, prompt, system_prompt)
-            
-            # Try to parse JSON response
-            try:
-                # Try to extract JSON from the response (in case there's extra text)
-                json_match = re.search(r'\{.*\}', result, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    parsed = json.loads(json_str)
-                else:
-                    parsed = json.loads(result)
-                
-                romaji = parsed.get("romaji", "")
-                
-                # Debug output
-                print(f"  AI Response: {result}")
-                print(f"  Parsed romaji: '{romaji}'")
-                
-                # Add original lyric
-                enhanced_lyrics.append(lyric)
-                
-                # Only add romaji line when kanji is requested, skip translations
-                romaji_line = romaji if romaji else lyric
-                if should_include_kanji:
-                    enhanced_lyrics.append(f"[tr]{romaji_line}")
-                    
-            except json.JSONDecodeError:
-                print(f"Warning: Could not parse AI response for line {i+1}, skipping enhancement")
-                print(f"  Raw response: {result}")
-                enhanced_lyrics.append(lyric)
-                
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                print(f"Rate limited, waiting 5 seconds...")
-                time.sleep(5)
-                # Try one more time
+            cache = ai_cache.TranslationCache()
+        except sqlite3.Error as e:
+            print(f"AI cache unavailable, continuing without it: {e}")
+            use_cache = False
+    if use_cache:
+        cached = cache.get_many(keys.values())
+        results.update((line, cached[key]) for line, key in keys.items() if key in cached)
+    
+    # Lines per unique text, so progress counts every original line a result covers
+    line_counts: dict = {}
+    for line in normalized.values():
+        line_counts[line] = line_counts.get(line, 0) + 1
+    progress_lock = threading.Lock()
+    done = [sum(line_counts[line] for line in results)]
+    
+    def report(lines: List[str]):
+        with progress_lock:
+            done[0] += sum(line_counts[line] for line in lines)
+            if progress:
+                progress(done[0], len(pending))
+    
+    # Original positions of each unique line, for on_line
+    positions: dict = {}
+    for i, line in normalized.items():
+        positions.setdefault(line, []).append(i)
+    
+    def deliver(line: str, value: str):
+        results[line] = value
+        if on_line:
+            for i in positions[line]:
+                on_line(i, value)
+        report([line])
+    
+    if on_line:
+        for line, value in results.items():
+            for i in positions[line]:
+                on_line(i, value)
+    report([])
+    to_request = [line for line in unique_lines if line not in results]
+    log(f"{len(pending)} lines to enhance: {len(unique_lines)} unique, "
+          f"{len(unique_lines) - len(to_request)} from cache, {len(to_request)} to request")
+    batches = [to_request[i:i + batch_size] for i in range(0, len(to_request), max(1, batch_size))]
+    limiter = limiter or AdaptiveRateLimiter(concurrency)
+    
+    def request_batch(prompt: str, count: int):
+        """Yield (batch index, romaji) pairs as the response's objects complete."""
+        if stream:
+            chunks = client.stream(ollama_model, prompt, ROMAJI_BATCH_SYSTEM_PROMPT, max_tokens=200 * count)
+            parser = StreamingJSONArrayParser()
+        else:
+            result = client.generate(ollama_model, prompt, ROMAJI_BATCH_SYSTEM_PROMPT, max_tokens=200 * count)
+            if not result:
+                # generate() reports errors as an empty answer
+                raise RuntimeError("No response from the AI backend")
+            chunks = iter([result])
+            # The whole answer is here, so any amount of chatter may precede the array
+            parser = StreamingJSONArrayParser(max_preamble=len(result))
+        position = 0
+        try:
+            for chunk in chunks:
+                for item in parser.feed(chunk):
+                    index = batch_item_index(item, position, count)
+                    position += 1
+                    if index is not None:
+                        yield index, item.get('romaji', '')
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+        finally:
+            # Closing the stream drops the connection, so the server stops generating
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        parser.close()
+    
+    # Runs on the worker threads, so it is a profiled region of its own
+    @profiling.profiled('ai_pipeline')
+    def process_batch(number: int, lines: List[str]):
+        prompt = build_batch_prompt(lines)
+        log(f"Processing batch {number}/{len(batches)}: {len(lines)} lines")
+        answered = {}
+        try:
+            for attempt in range(max_retries + 1):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                limiter.acquire()
                 try:
-                    result = client.generate(ollama_model, prompt, system_prompt)
-                    try:
-                        # Try to extract JSON from the response (in case there's extra text)
-                        json_match = re.search(r'\{.*\}', result, re.DOTALL)
-                        if json_match:
-                            json_str = json_match.group(0)
-                            parsed = json.loads(json_str)
-                        else:
-                            parsed = json.loads(result)
-                        
-                        romaji = parsed.get("romaji", "")
-                        enhanced_lyrics.append(lyric)
-                        if should_include_kanji:
-                            enhanced_lyrics.append(f"[tr]{romaji}")
-                    except json.JSONDecodeError:
-                        print(f"Warning: Could not parse AI response for line {i+1}, skipping enhancement")
-                        enhanced_lyrics.append(lyric)
-                except Exception as retry_e:
-                    print(f"Error on retry for line {i+1}: {retry_e}")
-                    enhanced_lyrics.append(lyric)
-            else:
-                print(f"Error processing line {i+1}: {e}")
-                enhanced_lyrics.append(lyric)
-        except Exception as e:
-            print(f"Error processing line {i+1}: {e}")
-            enhanced_lyrics.append(lyric)
-        
-        # Add delay to avoid rate limiting
-        if i < len(lyrics) - 1:
-            time.sleep(2)
+                    for index, value in request_batch(prompt, len(lines)):
+                        if lines[index] not in answered:
+                            answered[lines[index]] = value
+                            deliver(lines[index], value)
+                except requests.exceptions.HTTPError as e:
+                    limiter.release(success=False)
+                    if e.response is not None and e.response.status_code == 429 and attempt < max_retries:
+                        delay = parse_retry_after(e.response, attempt)
+                        log(f"Rate limited, backing off {delay:.1f}s...")
+                        limiter.rate_limited(delay)
+                        continue
+                    log(f"Error processing batch {number}: {e}")
+                except (json.JSONDecodeError, TypeError) as e:
+                    limiter.release()
+                    log(f"Warning: Malformed AI response for batch {number} after "
+                        f"{len(answered)}/{len(lines)} lines, skipping the rest: {e}")
+                except Exception as e:
+                    limiter.release(success=False)
+                    log(f"Error processing batch {number}: {e}")
+                else:
+                    limiter.release()
+                # Lines the model skipped (or never reached) still count towards progress
+                report([line for line in lines if line not in answered])
+                return
+        finally:
+            if use_cache and answered:
+                cache.put_many((keys[line], value) for line, value in answered.items())
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(process_batch, range(1, len(batches) + 1), batches))
+    
+    if use_cache:
+        log(f"AI cache: {cache.stats()}")
+        if owns_cache:
+            cache.close()
+    if cancel_event is not None and cancel_event.is_set():
+        raise AIProcessingCancelled("AI processing cancelled")
+    
+    unanswered = [i for i in pending if normalized[i] not in results]
+    if unanswered:
+        log(f"Warning: {len(unanswered)}/{len(pending)} lines got no answer from the AI backend")
+        if missing is not None:
+            missing.extend(unanswered)
+    
+    enhanced_lyrics = []
+    for i, lyric in enumerate(lyrics):
+        enhanced_lyrics.append(lyric)
+        line = normalized.get(i)
+        if line in results and should_include_kanji:
+            # Only add romaji line when kanji is requested, skip translations
+            enhanced_lyrics.append(f"[tr]{results[line] or lyric}")
     
     return enhanced_lyrics
 
 
-def save_enhanced_lrcx(timestamps: List[str], enhanced_lyrics: List[str], output_path: str):
-    """Save the enhanced lyrics to a new .lrcx file."""
+def render_enhanced_lrcx(timestamps: List[str], lyrics: List[str], enhanced_lyrics: List[str]) -> str:
+    """Pair enhanced lyrics with their timestamps.
+
+    ``timestamps`` and ``lyrics`` are the parsed input rows; ``enhanced_lyrics`` is
+    ``lyrics`` with AI lines inserted. Every input row keeps its own prefix, including
+    sublines already in the file, and inserted lines repeat the prefix of the row
+    before them.
+    """
+    output = []
+    row_index = 0
+    timestamp = ""
+    for lyric in enhanced_lyrics:
+        if row_index < len(lyrics) and lyric == lyrics[row_index]:
+            timestamp = timestamps[row_index] if row_index < len(timestamps) else ""
+            row_index += 1
+        output.append(f"{timestamp}{lyric}\n")
+    return ''.join(output)
+
+
+def save_enhanced_lrcx(timestamps: List[str], lyrics: List[str], enhanced_lyrics: List[str], output_path: str,
+                       fsync: bool = False):
+    """Save the enhanced lyrics to a new .lrcx file.
+
+    The whole file is built in memory and replaced atomically, so readers never
+    see a partly written file.
+    """
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            timestamp_index = 0
-            for lyric in enhanced_lyrics:
-                # Use the corresponding timestamp for original lyrics
-                if not lyric.startswith('[tr]') and not lyric.startswith('[tl]'):
-                    if timestamp_index < len(timestamps):
-                        timestamp = timestamps[timestamp_index]
-                        timestamp_index += 1
-                    else:
-                        timestamp = ""
-                else:
-                    # For translation and kanji lines, use the same timestamp as the original line
-                    if timestamp_index > 0:
-                        timestamp = timestamps[timestamp_index - 1]
-                    else:
-                        timestamp = ""
-                
-                if timestamp:
-                    f.write(f"{timestamp}{lyric}\n")
-                else:
-                    f.write(f"{lyric}\n")
+        atomic_io.atomic_write(output_path, render_enhanced_lrcx(timestamps, lyrics, enhanced_lyrics), fsync=fsync)
         print(f"Enhanced lyrics saved to: {output_path}")
     except Exception as e:
         print(f"Error saving file: {e}")
         sys.exit(1)
 
 
+BATCH_MANIFEST = '.lyricstamp_batch.jsonl'
+
+
+def find_batch_inputs(pattern: str, lyricsx_dir: str) -> List[str]:
+    """The .lrcx files named by --batch: a directory's files, or a glob.
+
+    Relative globs that match nothing are retried inside the LyricsX
+    directory. Outputs of earlier runs (*_enhanced.lrcx) are never inputs.
+    """
+    pattern = os.path.expanduser(pattern)
+    if os.path.isdir(pattern):
+        with os.scandir(pattern) as it:
+            paths = [entry.path for entry in it if entry.is_file()]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+        if not paths and not os.path.isabs(pattern):
+            paths = glob.glob(os.path.join(lyricsx_dir, pattern), recursive=True)
+    return sorted(os.path.abspath(path) for path in paths
+                  if path.endswith('.lrcx') and not path.endswith('_enhanced.lrcx') and os.path.isfile(path))
+
+
+class BatchManifest:
+    """Append-only record of batch results, so an interrupted run resumes where it stopped.
+
+    One JSON line per finished or failed file; on load the last line for
+    each input wins and a torn final line is ignored. A file counts as done
+    while its content hash and the run's options are unchanged and its
+    output still exists.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for raw in f:
+                    try:
+                        entry = json.loads(raw)
+                        self.entries[entry['input']] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def is_done(self, input_path: str, content_hash: str, options: str) -> bool:
+        entry = self.entries.get(input_path)
+        return bool(entry and entry.get('status') == 'done' and entry.get('hash') == content_hash
+                    and entry.get('options') == options and os.path.exists(entry.get('output', '')))
+
+    def record(self, input_path: str, **fields):
+        entry = dict(fields, input=input_path, time=time.time())
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self.entries[input_path] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class BatchProgress:
+    """Progress bar for --batch on stderr; a plain line per file when stderr is not a terminal."""
+
+    def __init__(self, total_files: int, stream=None, width: int = 30):
+        self.stream = stream or sys.stderr
+        self.interactive = self.stream.isatty()
+        self.width = width
+        self.total_files = total_files
+        self.finished = {'done': 0, 'partial': 0, 'skipped': 0, 'failed': 0}
+        self.lines_done = 0
+        self._active: dict = {}  # path -> (done, total) lines
+        self._started = time.monotonic()
+        self._last_draw = 0.0
+        self._lock = threading.Lock()
+
+    def lines(self, path: str, done: int, total: int):
+        with self._lock:
+            previous = self._active.get(path, (0, 0))[0]
+            self.lines_done += max(0, done - previous)
+            self._active[path] = (done, total)
+            self._draw()
+
+    def file_finished(self, path: str, status: str, detail: str = ''):
+        with self._lock:
+            self._active.pop(path, None)
+            self.finished[status] += 1
+            if not self.interactive and status != 'skipped':
+                count = sum(self.finished.values())
+                print(f"[{count}/{self.total_files}] {status}: {os.path.basename(path)}"
+                      f"{f' ({detail})' if detail else ''}", file=self.stream, flush=True)
+            self._draw(force=True)
+
+    def _draw(self, force: bool = False):
+        now = time.monotonic()
+        if not self.interactive or (not force and now - self._last_draw < 0.1):
+            return
+        self._last_draw = now
+        partial = sum(done / total for done, total in self._active.values() if total)
+        fraction = (sum(self.finished.values()) + partial) / self.total_files if self.total_files else 1.0
+        filled = int(fraction * self.width)
+        rate = self.lines_done / max(now - self._started, 1e-6)
+        self.stream.write(f"\r[{'#' * filled}{'.' * (self.width - filled)}] "
+                          f"{sum(self.finished.values())}/{self.total_files} files, "
+                          f"{self.finished['skipped']} skipped, {self.finished['partial']} partial, "
+                          f"{self.finished['failed']} failed, "
+                          f"{rate:.1f} lines/s ")
+        self.stream.flush()
+
+    def close(self):
+        if self.interactive:
+            self._draw(force=True)
+            self.stream.write('\n')
+            self.stream.flush()
+
+
+def process_library(paths: List[str], target_language: str = "en", model: str = "gpt-3.5-turbo",
+                    include_kanji: bool = False, use_ollama: bool = False, batch_size: int = 8,
+                    concurrency: int = 4, jobs: int = 4, use_cache: bool = True, stream: bool = True,
+                    output_dir: Optional[str] = None, manifest_path: Optional[str] = None,
+                    fsync: bool = False, progress_stream=None) -> dict:
+    """Enhance many .lrcx files in one process; returns counts of done, partial, skipped and failed files.
+
+    Up to `jobs` files are processed at once, but every file shares one client
+    (one connection pool), one rate limiter and one cache, so the backend
+    never sees more than `concurrency` requests in flight. Each output is
+    written next to its input (or into `output_dir`) as <name>_enhanced.lrcx,
+    and each result is appended to the manifest as soon as it is known.
+    A file with lines the backend never answered is still written but
+    recorded as partial, so the next run retries it (answered lines then
+    come from the cache).
+    """
+    if not paths:
+        return {'done': 0, 'partial': 0, 'skipped': 0, 'failed': 0}
+    manifest = BatchManifest(manifest_path or os.path.join(os.path.dirname(paths[0]), BATCH_MANIFEST))
+    client = OllamaClient(pool_size=concurrency) if use_ollama else OpenAIClient(pool_size=concurrency)
+    limiter = AdaptiveRateLimiter(concurrency)
+    cache = None
+    if use_cache:
+        try:
+            cache = ai_cache.TranslationCache()
+        except sqlite3.Error as e:
+            print(f"AI cache unavailable, continuing without it: {e}")
+            use_cache = False
+    # A changed prompt or option produces different output, so earlier results no longer count
+    options = json.dumps([ai_cache.prompt_version(ROMAJI_BATCH_SYSTEM_PROMPT), 'ollama' if use_ollama else 'openai',
+                          model, target_language, include_kanji])
+    progress = BatchProgress(len(paths), progress_stream)
+    cancel_event = threading.Event()
+
+    def process_file(path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        content_hash = atomic_io.content_hash(data)
+        if manifest.is_done(path, content_hash, options):
+            progress.file_finished(path, 'skipped')
+            return
+        rows = list(lrc_parser.tokenize_text(data.decode('utf-8')))
+        timestamps, lyrics = [row.prefix for row in rows], [row.text for row in rows]
+        missing: List[int] = []
+        enhanced = add_ai_phonetics_and_translation(
+            lyrics, target_language, model, include_kanji, None, use_ollama,
+            batch_size=batch_size, concurrency=concurrency, use_cache=use_cache, cache=cache,
+            progress=lambda done, total: progress.lines(path, done, total),
+            cancel_event=cancel_event, stream=stream, client=client, limiter=limiter, verbose=False,
+            missing=missing)
+        output_path = os.path.join(output_dir or os.path.dirname(path), f"{Path(path).stem}_enhanced.lrcx")
+        atomic_io.atomic_write(output_path, render_enhanced_lrcx(timestamps, lyrics, enhanced), fsync=fsync)
+        # Only 'done' counts on resume, so a partial file is requested again next run
+        status = 'partial' if missing else 'done'
+        manifest.record(path, status=status, hash=content_hash, options=options, output=output_path,
+                        missing=len(missing))
+        progress.file_finished(path, status, f"{len(missing)} lines unanswered" if missing else '')
+
+    def run(path: str):
+        try:
+            process_file(path)
+        except AIProcessingCancelled:
+            progress.file_finished(path, 'failed', 'cancelled')
+        except Exception as e:
+            manifest.record(path, status='failed', error=str(e))
+            progress.file_finished(path, 'failed', str(e))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+    try:
+        futures = [executor.submit(run, path) for path in paths]
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        # Finished files are in the manifest; the next run resumes from there
+        cancel_event.set()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        progress.close()
+        if cache is not None:
+            cache.close()
+    return dict(progress.finished)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Add AI-powered romaji and translation to .lrcx files using OpenAI or Ollama"
     )
     parser.add_argument(
         "input_file",
+        nargs="?",
         help="Path to the input .lrcx file (can be relative to $HOME/Music/LyricsX)"
     )
     parser.add_argument(
         "-o", "--output",
-        help="Output file path (default: input_file_enhanced.lrcx in $HOME/Music/LyricsX)"
+        help="Output file path (default: input_file_enhanced.lrcx in $HOME/Music/LyricsX); "
+             "with --batch, the output directory (default: next to each input)"
     )
     parser.add_argument(
         "-t", "--target-language",
@@ -339,8 +907,52 @@ def main():
         action="store_true",
         help="Use Ollama backend instead of OpenAI"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=8,
+        help="Lyric lines sent per AI request (default: 8)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the persistent AI result cache"
+    )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Wait for whole AI responses instead of streaming them"
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Flush the output file to disk before exiting"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum AI requests in flight (default: 4)"
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="DIR_OR_GLOB",
+        help="Enhance every .lrcx file in a directory or matching a glob, skipping files already enhanced"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="Files processed at once in --batch mode (default: 4)"
+    )
+    parser.add_argument(
+        "--manifest",
+        help=f"Resumable --batch manifest (default: {BATCH_MANIFEST} next to the inputs)"
+    )
     
     args = parser.parse_args()
+    # LYRICSTAMP_PROFILE=sample|cprofile profiles the run into LYRICSTAMP_PROFILE_OUTPUT
+    profiling.start_from_env()
     
     # Expand LyricsX directory path
     lyricsx_dir = os.path.expanduser(args.lyricsx_dir)
@@ -351,15 +963,40 @@ def main():
             print(f"LyricsX directory not found: {lyricsx_dir}")
             sys.exit(1)
         
-        lrcx_files = [f for f in os.listdir(lyricsx_dir) if f.endswith('.lrcx')]
+        lrcx_files = LyricsIndex(lyricsx_dir).list()
         if not lrcx_files:
             print(f"No .lrcx files found in {lyricsx_dir}")
         else:
             print(f"Found {len(lrcx_files)} .lrcx files in {lyricsx_dir}:")
-            for i, file in enumerate(sorted(lrcx_files), 1):
-                print(f"{i:2d}. {file}")
+            for i, entry in enumerate(lrcx_files, 1):
+                languages = entry.languages.replace(',', ', ') or '-'
+                print(f"{i:2d}. {entry.filename} ({entry.line_count} lines, "
+                      f"{entry.coverage:.0%} timed, {languages})")
         return
     
+    if args.batch:
+        paths = find_batch_inputs(args.batch, lyricsx_dir)
+        if not paths:
+            print(f"No .lrcx files match {args.batch}")
+            sys.exit(1)
+        output_dir = None
+        if args.output:
+            output_dir = os.path.expanduser(args.output)
+            os.makedirs(output_dir, exist_ok=True)
+        print(f"Enhancing {len(paths)} files with {args.jobs} jobs and {args.concurrency} requests in flight")
+        started = time.monotonic()
+        counts = process_library(
+            paths, args.target_language, args.model, args.kanji, args.use_ollama,
+            batch_size=args.batch_size, concurrency=args.concurrency, jobs=args.jobs,
+            use_cache=not args.no_cache, stream=not args.no_stream, output_dir=output_dir,
+            manifest_path=args.manifest, fsync=args.fsync)
+        print(f"{counts['done']} enhanced, {counts['partial']} partial, {counts['skipped']} already done, "
+              f"{counts['failed']} failed in {time.monotonic() - started:.1f}s")
+        sys.exit(1 if counts['failed'] or counts['partial'] else 0)
+    
+    if not args.input_file:
+        parser.error("input_file is required unless --list or --batch is given")
+    
     # Handle input file path
     input_file = args.input_file
     if not os.path.isabs(input_file):
@@ -413,11 +1050,15 @@ def main():
         args.model,
         args.kanji,
         args.ollama_url,
-        args.use_ollama
+        args.use_ollama,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        stream=not args.no_stream
     )
     
     # Save the enhanced file
-    save_enhanced_lrcx(timestamps, enhanced_lyrics, output_file)
+    save_enhanced_lrcx(timestamps, lyrics, enhanced_lyrics, output_file, fsync=args.fsync)
     
     print("Processing complete!")
 
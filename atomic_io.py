@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Atomic file writes for lyrics output.
+Content is built in memory, written to a temp file in the target directory
+and renamed over the target, so a crash never leaves a truncated file and a
+reader (LyricsX, the lyrics watcher) only ever sees the old or the new file.
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Union
+
+
+def _read_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Read once; os.umask() can only be queried by setting it, which is not thread-safe
+UMASK = _read_umask()
+
+
+@contextmanager
+def atomic_open(path: str, fsync: bool = False) -> Iterator[BinaryIO]:
+    """Yield a binary file that replaces `path` in one rename when the block exits.
+
+    For output too large to build in memory; if the block raises, `path` is
+    left untouched. With `fsync` the data and the directory entry are flushed
+    to disk before returning, so the new content survives a power loss.
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        # mkstemp creates 0600; keep the existing file's mode, or use the usual default
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~UMASK
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if fsync:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def atomic_write(path: str, data: Union[str, bytes], fsync: bool = False, encoding: str = 'utf-8'):
+    """Replace `path` with `data` in one rename (see atomic_open)."""
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    with atomic_open(path, fsync=fsync) as f:
+        f.write(data)
+
+
+def content_hash(data: Union[str, bytes], encoding: str = 'utf-8') -> str:
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str) -> Optional[str]:
+    """SHA-256 of a file's content, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def write_if_changed(path: str, data: Union[str, bytes], fsync: bool = False, encoding: str = 'utf-8') -> bool:
+    """Atomically write `data` unless `path` already holds exactly that content.
+
+    Returns True if the file was written.
+    """
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    try:
+        unchanged = (os.path.getsize(path) == len(data) and file_hash(path) == content_hash(data))
+    except OSError:
+        unchanged = False
+    if unchanged:
+        return False
+    atomic_write(path, data, fsync=fsync)
+    return True
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Automatic lyric alignment against an audio file.
+The track is processed in fixed-size chunks and reduced to 100 frames/second of
+vocal-band energy and spectral-flux onset strength, so memory stays bounded
+regardless of track length. Line starts are then chosen among onset
+candidates by dynamic programming that balances onset strength against the
+duration each line should take given its length. Every proposal carries a
+confidence so a human only needs to check the suspect ones.
+
+Requires NumPy. Audio is read through audio_cache, so a track is decoded only
+once however many times it is aligned.
+"""
+
+import argparse
+import math
+import re
+import sys
+import unicodedata
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import atomic_io
+import lrc_parser
+from audio_cache import AudioDecodeError, PCMCache, default_cache
+
+FRAME_RATE = 100  # feature frames per second
+VOCAL_BAND = (250.0, 3500.0)
+MIN_CANDIDATE_GAP = 0.25  # seconds between two candidate line starts
+
+
+@dataclass
+class AudioFeatures:
+    """Per-frame features at FRAME_RATE frames per second."""
+    energy: np.ndarray  # log vocal-band energy
+    onset: np.ndarray  # spectral flux in the vocal band
+    frame_rate: int = FRAME_RATE
+
+    @property
+    def duration(self) -> float:
+        return len(self.energy) / self.frame_rate
+
+
+def extract_features(chunks: Iterator[Tuple[int, np.ndarray]]) -> AudioFeatures:
+    """Compute vocal-band energy and onset strength chunk by chunk.
+
+    Only one chunk of audio (plus one analysis window of overlap) is held at
+    a time; the per-frame features are tiny in comparison.
+    """
+    energy_parts, onset_parts = [], []
+    tail = None
+    previous = None
+    for rate, samples in chunks:
+        if tail is None:
+            hop = max(1, rate // FRAME_RATE)
+            size = 1 << math.ceil(math.log2(rate * 0.064))
+            window = np.hanning(size).astype(np.float32)
+            freqs = np.fft.rfftfreq(size, 1.0 / rate)
+            band = (freqs >= VOCAL_BAND[0]) & (freqs <= VOCAL_BAND[1])
+            # Half a window of silence first, so frame k is centred on sample k * hop
+            tail = np.zeros(size // 2, dtype=np.float32)
+        buffer = np.concatenate((tail, samples.astype(np.float32, copy=False)))
+        count = (len(buffer) - size) // hop + 1 if len(buffer) >= size else 0
+        if count <= 0:
+            tail = buffer
+            continue
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, size)[::hop][:count]
+        spectrum = np.abs(np.fft.rfft(frames * window, axis=1)[:, band]).astype(np.float32)
+        compressed = np.log1p(100.0 * spectrum)
+        energy_parts.append(np.log1p((spectrum ** 2).sum(axis=1)))
+        if previous is None:
+            previous = compressed[0]
+        deltas = np.diff(np.vstack((previous[None, :], compressed)), axis=0)
+        onset_parts.append(np.maximum(deltas, 0.0).sum(axis=1))
+        previous = compressed[-1]
+        tail = buffer[count * hop:]
+    if not energy_parts:
+        return AudioFeatures(np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32))
+    return AudioFeatures(np.concatenate(energy_parts).astype(np.float32),
+                         np.concatenate(onset_parts).astype(np.float32))
+
+
+def line_weight(text: str) -> float:
+    """Rough sung length of a line: CJK characters/kana plus vowel groups of Latin words."""
+    text = lrc_parser.strip_word_times(text)
+    cjk = sum(1 for ch in text if unicodedata.east_asian_width(ch) in ('W', 'F') and ch.isalpha())
+    latin = len(re.findall(r'[aeiouyAEIOUY]+', unicodedata.normalize('NFKD', text)))
+    return max(1.0, cjk + latin)
+
+
+def _smooth(values: np.ndarray, frames: int) -> np.ndarray:
+    if frames <= 1 or len(values) < frames:
+        return values
+    kernel = np.ones(frames, dtype=np.float32) / frames
+    return np.convolve(values, kernel, mode='same')
+
+
+def _normalize(values: np.ndarray, low: float, high: float) -> np.ndarray:
+    lo, hi = np.percentile(values, [low, high])
+    return np.clip((values - lo) / max(hi - lo, 1e-6), 0.0, 1.0)
+
+
+@dataclass
+class LineAlignment:
+    time: float
+    confidence: float
+    suspect: bool
+
+    def to_dict(self) -> dict:
+        return {
+            'time': self.time,
+            'timestamp': lrc_parser.format_timestamp(int(round(self.time * 1000))),
+            'confidence': self.confidence,
+            'suspect': self.suspect
+        }
+
+
+def align(features: AudioFeatures, lines: List[str], duration_sigma: float = 0.5,
+          onset_weight: float = 4.0) -> List[LineAlignment]:
+    """Propose a start time for every line.
+
+    Candidates are peaks of a boundary score (onset strength plus a rise in
+    vocal energy); the DP picks one increasing candidate per line minimizing
+    a log-normal duration penalty minus the weighted boundary score. Only
+    transitions within a plausible duration of the previous line are scored,
+    so memory grows with candidates times that band, not candidates squared.
+    """
+    if not lines:
+        return []
+    rate = features.frame_rate
+    if len(features.energy) < rate:
+        raise ValueError("Audio is too short to align")
+    energy = _normalize(_smooth(features.energy, 5), 10, 95)
+    onset = np.clip(features.onset / max(np.percentile(features.onset, 95), 1e-6), 0.0, 2.0)
+
+    # Boundary score: a fresh onset where vocal energy rises after a quieter stretch
+    span = int(0.3 * rate)
+    cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+    index = np.arange(len(energy))
+    before = (cumulative[index] - cumulative[np.maximum(index - span, 0)]) / span
+    after = (cumulative[np.minimum(index + span, len(energy))] - cumulative[index]) / span
+    score = _smooth(0.5 * onset + np.maximum(after - before, 0.0) * 2.0, 3)
+
+    voiced = np.flatnonzero(_smooth(energy, int(0.5 * rate)) > 0.3)
+    voiced_start = voiced[0] / rate if len(voiced) else 0.0
+    voiced_end = (voiced[-1] + 1) / rate if len(voiced) else features.duration
+
+    # Candidate starts: local maxima of the score at least MIN_CANDIDATE_GAP apart
+    gap = int(MIN_CANDIDATE_GAP * rate)
+    peaks = np.flatnonzero((score[1:-1] >= score[:-2]) & (score[1:-1] > score[2:])) + 1
+    taken = np.zeros(len(score), dtype=bool)
+    chosen = []
+    for peak in peaks[np.argsort(-score[peaks])]:
+        if score[peak] <= 0.05 or len(chosen) >= max(20 * len(lines), 400):
+            break
+        if not taken[max(0, peak - gap + 1):peak + gap].any():
+            taken[peak] = True
+            chosen.append(peak)
+    if len(chosen) < 2 * len(lines):
+        # Too few onsets (quiet or sparse audio): fall back to a regular grid as well
+        chosen.extend(range(int(voiced_start * rate), int(voiced_end * rate), gap))
+    candidates = np.unique(np.array(chosen, dtype=np.int64))
+    times = candidates / rate
+    strength = score[candidates] / max(score[candidates].max(), 1e-6)
+
+    weights = np.array([line_weight(line) for line in lines])
+    seconds_per_weight = max(voiced_end - voiced_start, 1.0) / weights.sum()
+    expected = weights * seconds_per_weight
+
+    def duration_window(expect: float) -> Tuple[float, float]:
+        return 0.25 * expect, 4.0 * expect + 8.0
+
+    def duration_cost(durations: np.ndarray, expect: float) -> np.ndarray:
+        shortest, longest = duration_window(expect)
+        valid = (durations >= shortest) & (durations <= longest)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost = np.log(durations / expect) ** 2 / (2 * duration_sigma ** 2)
+        return np.where(valid, cost, np.inf)
+
+    cost = ((times - voiced_start) / 3.0) ** 2 - onset_weight * strength
+    back = np.zeros((len(lines), len(candidates)), dtype=np.int32)
+    columns = np.arange(len(candidates))
+    for i in range(1, len(lines)):
+        # Only previous starts within the duration window can precede candidate k, and
+        # candidates are at least MIN_CANDIDATE_GAP apart, so each band of rows stays
+        # short however many lines (and candidates) there are
+        shortest, longest = duration_window(expected[i - 1])
+        first = np.searchsorted(times, times - longest, side='left')
+        stop = np.searchsorted(times, times - shortest, side='right')
+        width = int((stop - first).max(initial=0))
+        if width == 0:
+            cost = np.full(len(candidates), np.inf)
+            continue
+        previous = first[None, :] + np.arange(width)[:, None]
+        inside = previous < stop[None, :]
+        previous = np.minimum(previous, len(candidates) - 1)
+        total = cost[previous] + duration_cost(times[None, :] - times[previous], expected[i - 1])
+        total[~inside] = np.inf
+        best = np.argmin(total, axis=0)
+        back[i] = previous[best, columns]
+        cost = total[best, columns] - onset_weight * strength
+    cost = cost + duration_cost(voiced_end - times, expected[-1])
+    if not np.isfinite(cost).any():
+        raise ValueError("Could not fit the lines to the audio (too many lines for its length?)")
+
+    path = [int(np.argmin(cost))]
+    for i in range(len(lines) - 1, 0, -1):
+        path.append(int(back[i][path[-1]]))
+    path.reverse()
+
+    result = []
+    for i, k in enumerate(path):
+        end = times[path[i + 1]] if i + 1 < len(path) else voiced_end
+        ratio = (end - times[k]) / expected[i]
+        confidence = float(strength[k])
+        result.append(LineAlignment(float(times[k]), confidence,
+                                    suspect=confidence < 0.2 or not 0.4 <= ratio <= 2.5))
+    return result
+
+
+def align_file(path: str, lines: List[str], chunk_seconds: float = 10.0,
+               cache: Optional[PCMCache] = None) -> List[LineAlignment]:
+    """Align `lines` to `path`, decoding it through the PCM cache on first use."""
+    audio = (cache or default_cache()).open(path)
+    return align(extract_features(audio.chunks(chunk_seconds)), lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose timestamps for lyrics by aligning them to an audio file")
+    parser.add_argument("audio_file", help="Audio file (wav, or mp3/m4a/flac/aac with ffmpeg or afconvert)")
+    parser.add_argument("lyrics_file", help="Plain text lyrics, one line per row")
+    parser.add_argument("-o", "--output", help="Write the timed lyrics to this .lrcx file instead of stdout")
+    args = parser.parse_args()
+
+    with open(args.lyrics_file, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    try:
+        proposals = align_file(args.audio_file, lines)
+    except (AudioDecodeError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    output = ''.join(f"{p.to_dict()['timestamp']}{line}\n" for p, line in zip(proposals, lines))
+    if args.output:
+        atomic_io.atomic_write(args.output, output)
+    else:
+        sys.stdout.write(output)
+    suspects = [i + 1 for i, p in enumerate(proposals) if p.suspect]
+    if suspects:
+        print(f"Check lines: {', '.join(map(str, suspects))}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
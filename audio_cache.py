@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Decoded audio cache for LyricStamp's audio features.
+A track is decoded once, in fixed-size chunks, into mono float32 PCM on disk
+next to a downsampled min/max/RMS envelope. Entries are keyed by the file's
+content hash and memory-mapped read-only, so windowed reads are zero-copy
+slices and waveform or alignment requests never decode the same file twice.
+A pyramid of int16 min/max peaks, halving in resolution per level, is built
+alongside so a waveform at any zoom is a slice of one level. The cache evicts
+least-recently-used entries once it grows past its byte budget.
+
+Requires NumPy. WAV files are read directly; other formats are decoded with
+ffmpeg, or afconvert on macOS.
+"""
+
+import json
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import atomic_io
+
+DECODE_RATE = 16000  # sample rate requested from external decoders
+ENVELOPE_RATE = 200  # envelope blocks per second
+CACHE_VERSION = 2
+# Memory maps kept open between requests
+OPEN_ENTRIES = 8
+
+
+class AudioDecodeError(Exception):
+    """Raised when an audio file cannot be read or decoded."""
+
+
+# Decoding
+
+def _wav_chunks(path: str, chunk_seconds: float) -> Iterator[Tuple[int, np.ndarray]]:
+    with wave.open(path, 'rb') as wav:
+        rate, channels, width = wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+        frames_per_chunk = max(1, int(rate * chunk_seconds))
+        while True:
+            raw = wav.readframes(frames_per_chunk)
+            if not raw:
+                return
+            if width == 1:
+                samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+            elif width == 2:
+                samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+            elif width == 3:
+                bytes3 = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+                values = bytes3[:, 0] | (bytes3[:, 1] << 8) | (bytes3[:, 2] << 16)
+                samples = (np.where(values & 0x800000, values - 0x1000000, values)).astype(np.float32) / 8388608.0
+            else:
+                samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+            yield rate, samples.reshape(-1, channels).mean(axis=1)
+
+
+def _ffmpeg_chunks(path: str, chunk_seconds: float) -> Iterator[Tuple[int, np.ndarray]]:
+    """Read mono float32 PCM at DECODE_RATE from ffmpeg's stdout."""
+    command = ['ffmpeg', '-v', 'error', '-i', path, '-f', 'f32le', '-ac', '1', '-ar', str(DECODE_RATE), '-']
+    chunk_bytes = int(DECODE_RATE * chunk_seconds) * 4
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finished = False
+    try:
+        pending = b''
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % 4
+            pending = data[usable:]
+            yield DECODE_RATE, np.frombuffer(data[:usable], dtype='<f4')
+        finished = True
+    finally:
+        if process.poll() is None and not finished:
+            process.kill()
+        process.stdout.close()
+        error = process.stderr.read().decode(errors='replace').strip()
+        process.stderr.close()
+        if process.wait() != 0 and finished:
+            raise AudioDecodeError(f"ffmpeg could not decode {path}: {error}")
+
+
+def pcm_chunks(path: str, chunk_seconds: float = 10.0) -> Iterator[Tuple[int, np.ndarray]]:
+    """Decode `path`, yielding (sample_rate, mono float32 samples) chunks of `chunk_seconds` each."""
+    if not os.path.isfile(path):
+        raise AudioDecodeError(f"Audio file not found: {path}")
+    if path.lower().endswith('.wav'):
+        try:
+            yield from _wav_chunks(path, chunk_seconds)
+            return
+        except (wave.Error, EOFError):
+            pass  # compressed or float WAV; let a decoder handle it
+    if shutil.which('ffmpeg'):
+        yield from _ffmpeg_chunks(path, chunk_seconds)
+        return
+    if shutil.which('afconvert'):
+        # afconvert cannot write to a pipe; decode to a temporary WAV and stream that
+        with tempfile.TemporaryDirectory() as directory:
+            wav_path = os.path.join(directory, 'decoded.wav')
+            result = subprocess.run(['afconvert', '-f', 'WAVE', '-d', f'LEI16@{DECODE_RATE}', '-c', '1',
+                                     path, wav_path], capture_output=True)
+            if result.returncode != 0:
+                raise AudioDecodeError(f"afconvert failed: {result.stderr.decode(errors='replace').strip()}")
+            yield from _wav_chunks(wav_path, chunk_seconds)
+        return
+    raise AudioDecodeError("Decoding this format needs ffmpeg (or afconvert on macOS)")
+
+
+class _EnvelopeWriter:
+    """Reduce PCM to one (min, max, rms) row per block as it streams past.
+
+    The min/max columns are also kept as int16 for the peak pyramid.
+    """
+
+    def __init__(self, out: BinaryIO, block: int):
+        self.out = out
+        self.block = block
+        self.rows = 0
+        self.peaks: List[np.ndarray] = []
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def add(self, samples: np.ndarray):
+        data = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        usable = len(data) - len(data) % self.block
+        self._write(data[:usable].reshape(-1, self.block))
+        self._pending = np.array(data[usable:], dtype=np.float32)
+
+    def finish(self):
+        if len(self._pending):
+            self._write(self._pending[None, :])
+            self._pending = self._pending[:0]
+
+    def _write(self, blocks: np.ndarray):
+        if not len(blocks):
+            return
+        rows = np.stack((blocks.min(axis=1), blocks.max(axis=1),
+                         np.sqrt(np.mean(np.square(blocks, dtype=np.float32), axis=1))), axis=1)
+        self.out.write(rows.astype('<f4').tobytes())
+        self.peaks.append(np.round(np.clip(rows[:, :2], -1.0, 1.0) * 32767).astype('<i2'))
+        self.rows += len(rows)
+
+
+def build_pyramid(peaks: np.ndarray) -> List[np.ndarray]:
+    """Levels of (min, max) rows; each level merges pairs of rows of the one below."""
+    levels = [peaks]
+    while len(levels[-1]) > 1:
+        below = levels[-1]
+        if len(below) % 2:
+            below = np.vstack((below, below[-1:]))
+        pairs = below.reshape(-1, 2, 2)
+        levels.append(np.stack((pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)), axis=1))
+    return levels
+
+
+# Cache entries
+
+class CachedAudio:
+    """One decoded track: read-only memory maps of its PCM and envelope.
+
+    `samples` is mono float32 at `rate`; `envelope` has one (min, max, rms)
+    row per `envelope_block` samples; peak level k has one int16 (min, max)
+    row per `envelope_block * 2**k` samples. Slices of any of them are views
+    of the cache files, not copies.
+    """
+
+    def __init__(self, key: str, pcm_path: str, envelope_path: str, peaks_path: str, meta: dict):
+        self.key = key
+        self.source = meta['source']
+        self.rate = meta['rate']
+        self.envelope_block = meta['envelope_block']
+        self.samples = np.memmap(pcm_path, dtype='<f4', mode='r')
+        self.envelope = np.memmap(envelope_path, dtype='<f4', mode='r').reshape(-1, 3)
+        pyramid = np.memmap(peaks_path, dtype='<i2', mode='r').reshape(-1, 2)
+        self.peak_levels = [pyramid[offset:offset + count] for offset, count in meta['peak_levels']]
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.rate
+
+    @property
+    def envelope_rate(self) -> float:
+        return self.rate / self.envelope_block
+
+    def window(self, start: float = 0.0, end: Optional[float] = None) -> np.ndarray:
+        """Samples between `start` and `end` seconds, as a view into the cache."""
+        first = max(0, int(start * self.rate))
+        last = len(self.samples) if end is None else max(first, int(end * self.rate))
+        return self.samples[first:last]
+
+    def envelope_window(self, start: float = 0.0, end: Optional[float] = None) -> np.ndarray:
+        """Envelope rows covering `start` to `end` seconds."""
+        first = max(0, int(start * self.rate) // self.envelope_block)
+        last = len(self.envelope) if end is None else max(first, -(-int(end * self.rate) // self.envelope_block))
+        return self.envelope[first:last]
+
+    def peaks(self, start: float = 0.0, end: Optional[float] = None,
+              width: int = 1000) -> Tuple[int, float, float, np.ndarray]:
+        """Peaks covering `start` to `end` seconds from the coarsest level with at least `width` rows.
+
+        `start` and `end` are clamped to the track. Returns (level, rows per
+        second, time in seconds where the first row starts, int16 (min, max) rows).
+        """
+        end = self.duration if end is None else min(end, self.duration)
+        start = max(0.0, min(start, end))
+        base_rows = (end - start) * self.rate / self.envelope_block
+        level = 0
+        if width > 0 and base_rows > width:
+            level = min(int(math.log2(base_rows / width)), len(self.peak_levels) - 1)
+        block = self.envelope_block << level
+        rows = self.peak_levels[level]
+        first = int(start * self.rate) // block
+        last = max(first, -(-int(end * self.rate) // block))
+        return level, self.rate / block, first * block / self.rate, rows[first:last]
+
+    def chunks(self, chunk_seconds: float = 10.0) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yield (rate, samples) chunks like pcm_chunks(), without decoding."""
+        size = max(1, int(self.rate * chunk_seconds))
+        for start in range(0, len(self.samples), size):
+            yield self.rate, self.samples[start:start + size]
+
+
+def default_cache_dir() -> str:
+    if os.environ.get('LYRICSTAMP_AUDIO_CACHE'):
+        return os.environ['LYRICSTAMP_AUDIO_CACHE']
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'lyricstamp', 'pcm')
+
+
+class PCMCache:
+    """Directory of decoded tracks keyed by content hash, shared by every thread.
+
+    Each entry is `<key>.f32` (PCM), `<key>.env` (envelope), `<key>.peaks`
+    (peak pyramid) and `<key>.json` (metadata). The metadata is written last, so an entry without it is an
+    interrupted decode and is ignored.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._decode_locks: Dict[str, threading.Lock] = {}
+        # (path, size, mtime) -> content hash, so unchanged files are hashed once
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._open: 'OrderedDict[str, CachedAudio]' = OrderedDict()
+
+    def _paths(self, key: str) -> Tuple[str, str, str, str]:
+        base = os.path.join(self.directory, key)
+        return base + '.f32', base + '.env', base + '.peaks', base + '.json'
+
+    def key_for(self, path: str) -> str:
+        path = os.path.realpath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise AudioDecodeError(f"Audio file not found: {path}")
+        identity = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            key = self._hashes.get(identity)
+        if key is None:
+            key = atomic_io.file_hash(path)
+            if key is None:
+                raise AudioDecodeError(f"Audio file not found: {path}")
+            with self._lock:
+                self._hashes[identity] = key
+        return key
+
+    def open(self, path: str) -> CachedAudio:
+        """Return the decoded track for `path`, decoding it on the first request."""
+        key = self.key_for(path)
+        with self._lock:
+            audio = self._open.get(key)
+            if audio is not None:
+                self._open.move_to_end(key)
+                self.hits += 1
+                return audio
+            decode_lock = self._decode_locks.setdefault(key, threading.Lock())
+        # Concurrent requests for the same new track wait for one decode
+        try:
+            with decode_lock:
+                audio = self._load(key)
+                if audio is None:
+                    self._decode(path, key)
+                    audio = self._load(key)
+                    self.prune(keep=key)
+                    with self._lock:
+                        self.misses += 1
+                else:
+                    with self._lock:
+                        self.hits += 1
+        finally:
+            # Also when the decode fails, or every undecodable file would leave a lock behind
+            with self._lock:
+                if self._decode_locks.get(key) is decode_lock:
+                    del self._decode_locks[key]
+        with self._lock:
+            self._open[key] = audio
+            while len(self._open) > OPEN_ENTRIES:
+                self._open.popitem(last=False)
+        return audio
+
+    def _load(self, key: str) -> Optional[CachedAudio]:
+        pcm_path, envelope_path, peaks_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != CACHE_VERSION:
+                return None
+            audio = CachedAudio(key, pcm_path, envelope_path, peaks_path, meta)
+            os.utime(meta_path)  # recency for eviction
+        except (OSError, ValueError, KeyError):
+            return None
+        return audio
+
+    def _decode(self, path: str, key: str):
+        pcm_path, envelope_path, peaks_path, meta_path = self._paths(key)
+        rate, samples_written = None, 0
+        with atomic_io.atomic_open(pcm_path) as pcm, atomic_io.atomic_open(envelope_path) as envelope_file:
+            envelope = None
+            for chunk_rate, samples in pcm_chunks(path):
+                if envelope is None:
+                    rate = chunk_rate
+                    envelope = _EnvelopeWriter(envelope_file, max(1, rate // ENVELOPE_RATE))
+                samples = samples.astype('<f4', copy=False)
+                pcm.write(samples.tobytes())
+                envelope.add(samples)
+                samples_written += len(samples)
+            if not samples_written:
+                raise AudioDecodeError(f"No audio decoded from {path}")
+            envelope.finish()
+        levels = build_pyramid(np.concatenate(envelope.peaks))
+        atomic_io.atomic_write(peaks_path, b''.join(level.tobytes() for level in levels))
+        offsets = np.cumsum([0] + [len(level) for level in levels])
+        atomic_io.atomic_write(meta_path, json.dumps({
+            'version': CACHE_VERSION,
+            'source': os.path.realpath(path),
+            'rate': rate,
+            'samples': samples_written,
+            'envelope_block': envelope.block,
+            'peak_levels': [[int(offset), len(level)] for offset, level in zip(offsets, levels)]
+        }))
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def prune(self, keep: Optional[str] = None):
+        """Evict least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            key = entry.name[:-len('.json')]
+            size = 0
+            for entry_path in self._paths(key):
+                try:
+                    size += os.path.getsize(entry_path)
+                except OSError:
+                    pass
+            entries.append((entry.stat().st_mtime, key, size))
+            total += size
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # Metadata first, so a concurrent open never sees a half-deleted entry
+            for entry_path in reversed(self._paths(key)):
+                try:
+                    os.unlink(entry_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            with self._lock:
+                self._open.pop(key, None)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'open': len(self._open)}
+
+
+_default_cache: Optional[PCMCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> PCMCache:
+    """Process-wide cache; LYRICSTAMP_AUDIO_CACHE_MB sets its budget (default 2048)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_mb = float(os.environ.get('LYRICSTAMP_AUDIO_CACHE_MB', 2048))
+            _default_cache = PCMCache(max_bytes=int(max_mb * 1024 * 1024))
+        return _default_cache
+
+
+def open_audio(path: str) -> CachedAudio:
+    """Decoded, memory-mapped audio for `path` from the default cache."""
+    return default_cache().open(path)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Index of the audio files in the user's music folders.
+Directories are listed in parallel with os.scandir and the result is kept in
+SQLite. A rescan only lists directories whose mtime changed (a file was
+added, removed or renamed in them); every other directory costs one stat, and
+its files and subdirectories come from the index. Tags are read with mutagen
+when it is installed, otherwise title/artist/album are guessed from the
+filename and folder layout. Queries filter and page the in-memory index, and
+tracks are matched to LyricsX files by their tags.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from lyrics_index import LyricsIndex, normalize
+
+try:
+    import mutagen
+except ImportError:  # optional; without it tags are guessed from the path
+    mutagen = None
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.wav', '.flac', '.aac')
+# Bump when the stored columns or their meaning change
+SCHEMA_VERSION = 1
+# Filesystems with coarse timestamps (HFS+, FAT) may store mtimes in whole seconds
+RACY_WINDOW_NS = 2_000_000_000
+TRACK_NUMBER = re.compile(r'^\d{1,3}(?:[-.]\d{1,3})?[\s._-]+')
+
+
+def default_roots() -> List[str]:
+    return [os.path.expanduser(path) for path in ('~/Music', '~/Downloads', '~/Desktop')]
+
+
+def default_index_path() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'lyricstamp', 'audio_library.sqlite')
+
+
+def relative_folders(directory: str, root: str) -> List[str]:
+    return [folder for folder in os.path.relpath(directory, root).split(os.sep) if folder not in ('', '.')]
+
+
+def guess_tags(filename: str, folders: List[str]) -> Tuple[str, str, str]:
+    """(title, artist, album) from 'Artist - Title.ext' or an Artist/Album/NN Title.ext layout.
+
+    `folders` are the directories between the library root and the file.
+    """
+    name = os.path.splitext(filename)[0]
+    stem = TRACK_NUMBER.sub('', name) or name
+    album = folders[-1] if folders else ''
+    artist = folders[-2] if len(folders) >= 2 else ''
+    if ' - ' in stem:
+        artist, stem = stem.split(' - ', 1)
+    return stem.strip(), artist.strip(), album
+
+
+def read_tags(path: str, folders: List[str]) -> Tuple[str, str, str, float]:
+    """(title, artist, album, duration) from the file's tags, falling back to guess_tags."""
+    title, artist, album = guess_tags(os.path.basename(path), folders)
+    duration = 0.0
+    if mutagen is None:
+        return title, artist, album, duration
+    try:
+        audio = mutagen.File(path, easy=True)
+    except Exception:
+        return title, artist, album, duration
+    if audio is not None:
+        tags = audio.tags or {}
+
+        def first(name, default):
+            values = tags.get(name) if hasattr(tags, 'get') else None
+            return str(values[0]).strip() if values else default
+
+        title, artist, album = first('title', title), first('artist', artist), first('album', album)
+        duration = float(getattr(audio.info, 'length', 0.0) or 0.0)
+    return title, artist, album, duration
+
+
+class AudioTrack:
+    """One indexed audio file."""
+    FIELDS = ('path', 'directory', 'root', 'size', 'mtime_ns', 'title', 'artist', 'album', 'duration')
+    __slots__ = FIELDS + ('_keys',)
+
+    def __init__(self, path, directory, root, size, mtime_ns, title, artist, album, duration):
+        self.path = path
+        self.directory = directory
+        self.root = root
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.duration = duration
+        self._keys = None
+
+    @property
+    def keys(self) -> Tuple[str, str, str, str]:
+        """Normalized (searchable text, title, artist, album), computed once per track."""
+        if self._keys is None:
+            title, artist, album = normalize(self.title), normalize(self.artist), normalize(self.album)
+            text = f"{title} {normalize(os.path.basename(self.path))} {artist} {album}"
+            self._keys = (text, title, artist, album)
+        return self._keys
+
+    def to_dict(self) -> dict:
+        return {
+            'path': self.path,
+            'name': os.path.basename(self.path),
+            'display': os.path.relpath(self.path, self.root),
+            'title': self.title,
+            'artist': self.artist,
+            'album': self.album,
+            'duration': self.duration
+        }
+
+
+class AudioLibrary:
+    """Incrementally maintained index of the audio files under a set of root folders."""
+
+    def __init__(self, roots: Optional[List[str]] = None, index_path: Optional[str] = None,
+                 workers: int = 8, lyrics: Optional[LyricsIndex] = None):
+        self.roots = [os.path.abspath(root) for root in (roots or default_roots())]
+        self.index_path = index_path or default_index_path()
+        self.workers = workers
+        self.lyrics = lyrics
+        self.tracks: Dict[str, AudioTrack] = {}
+        self.last_scan = None  # time.time() of the last completed refresh
+        self.last_scan_seconds = None
+        # directory -> (mtime_ns, root, parent)
+        self._dirs: Dict[str, Tuple[int, str, Optional[str]]] = {}
+        self._sorted: List[AudioTrack] = []
+        # Built on the first find() after each change; normalizing every tag costs more than the scan
+        self._by_key: Optional[Dict[Tuple[str, str], AudioTrack]] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+    # Persistence
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.index_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        conn = sqlite3.connect(self.index_path)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS dirs')
+            conn.execute('DROP TABLE IF EXISTS files')
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.execute('''CREATE TABLE IF NOT EXISTS dirs (
+            path TEXT PRIMARY KEY, mtime_ns INTEGER, root TEXT, parent TEXT)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, directory TEXT, root TEXT, size INTEGER, mtime_ns INTEGER,
+            title TEXT, artist TEXT, album TEXT, duration REAL)''')
+        return conn
+
+    def load(self):
+        """Load the stored index without touching the music folders."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+        try:
+            conn = self._connect()
+            dirs = {row[0]: tuple(row[1:]) for row in conn.execute('SELECT * FROM dirs')}
+            tracks = {row[0]: AudioTrack(*row) for row in conn.execute('SELECT * FROM files')}
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Audio library index unavailable: {e}")
+            return
+        self._install(dirs, tracks)
+
+    def _install(self, dirs, tracks):
+        ordered = sorted(tracks.values(), key=lambda track: track.path.casefold())
+        with self._lock:
+            self._dirs, self.tracks = dirs, tracks
+            self._sorted, self._by_key = ordered, None
+
+    # Scanning
+
+    def _scan_directory(self, path: str, root: str, known: Optional[Tuple[int, str, Optional[str]]],
+                        full: bool, tracks: Dict[str, AudioTrack]):
+        """List one directory unless its mtime is unchanged.
+
+        Returns (path, mtime_ns, subdirectories, tracks); the last two are None
+        when the directory is unchanged. Tags are only read for new or changed files.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        if known is not None and known[0] == mtime_ns and not full:
+            return path, mtime_ns, None, None
+        # A file added later in the same mtime tick would go unnoticed; relist
+        # directories modified this recently on the next scan too
+        if time.time_ns() - mtime_ns < RACY_WINDOW_NS:
+            mtime_ns = 0
+        subdirectories, found = [], []
+        folders = relative_folders(path, root)
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.name.lower().endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                    stat = entry.stat()
+                    track = tracks.get(entry.path)
+                    if track is None or track.size != stat.st_size or track.mtime_ns != stat.st_mtime_ns:
+                        track = AudioTrack(entry.path, path, root, stat.st_size, stat.st_mtime_ns,
+                                           *read_tags(entry.path, folders))
+                    found.append(track)
+        return path, mtime_ns, subdirectories, found
+
+    def refresh(self, full: bool = False) -> int:
+        """Rescan the roots in parallel; returns the number of directories listed.
+
+        Only directories whose mtime changed are listed. Retagging a file in
+        place does not touch its directory, so `full` lists every directory
+        (tags are still only re-read for files whose size or mtime changed).
+        """
+        self.load()
+        with self._refresh_lock:
+            started = time.monotonic()
+            with self._lock:
+                old_dirs, old_tracks = self._dirs, self.tracks
+            children: Dict[str, List[str]] = {}
+            for path, (_, _, parent) in old_dirs.items():
+                if parent is not None:
+                    children.setdefault(parent, []).append(path)
+            files_in: Dict[str, List[AudioTrack]] = {}
+            for track in old_tracks.values():
+                files_in.setdefault(track.directory, []).append(track)
+
+            dirs, tracks, changed, listed = {}, {}, [], 0
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = {}
+                seen = set()
+
+                def submit(path, root, parent):
+                    # Roots may overlap; list each directory once
+                    if path in seen:
+                        return
+                    seen.add(path)
+                    future = executor.submit(self._scan_directory, path, root, old_dirs.get(path), full, old_tracks)
+                    pending[future] = (root, parent)
+
+                for root in self.roots:
+                    if os.path.isdir(root):
+                        submit(root, root, None)
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        root, parent = pending.pop(future)
+                        try:
+                            path, mtime_ns, subdirectories, found = future.result()
+                        except OSError:
+                            continue  # vanished or unreadable; dropped from the index
+                        dirs[path] = (mtime_ns, root, parent)
+                        if subdirectories is None:
+                            subdirectories = children.get(path, [])
+                            found = files_in.get(path, [])
+                        else:
+                            listed += 1
+                            changed.extend(track for track in found if old_tracks.get(track.path) is not track)
+                        for track in found:
+                            tracks[track.path] = track
+                        for subdirectory in subdirectories:
+                            submit(subdirectory, root, path)
+
+            if changed or dirs != old_dirs or len(tracks) != len(old_tracks):
+                self._save(dirs, tracks, changed, old_dirs, old_tracks)
+                self._install(dirs, tracks)
+            self.last_scan = time.time()
+            self.last_scan_seconds = time.monotonic() - started
+            return listed
+
+    def _save(self, dirs, tracks, changed, old_dirs, old_tracks):
+        removed_dirs = [path for path in old_dirs if path not in dirs]
+        removed_tracks = [path for path in old_tracks if path not in tracks]
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)',
+                                 [(path, *dirs[path]) for path in dirs if old_dirs.get(path) != dirs[path]])
+                conn.executemany('DELETE FROM dirs WHERE path = ?', [(path,) for path in removed_dirs])
+                conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                 [tuple(getattr(track, field) for field in AudioTrack.FIELDS)
+                                  for track in changed])
+                conn.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in removed_tracks])
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Audio library index not saved: {e}")
+
+    def refresh_async(self):
+        """Start a background refresh unless one is already running."""
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name='audio-library-scan', daemon=True)
+            self._refresh_thread.start()
+
+    @property
+    def scanning(self) -> bool:
+        return bool(self._refresh_thread and self._refresh_thread.is_alive())
+
+    def ensure_fresh(self, max_age: float = 60.0):
+        """Serve the stored index right away and rescan in the background when it is stale."""
+        self.load()
+        if self.last_scan is None or time.time() - self.last_scan > max_age:
+            self.refresh_async()
+
+    # Queries
+
+    def query(self, text: str = '', artist: str = '', album: str = '', extension: str = '',
+              offset: int = 0, limit: int = 50) -> Tuple[int, List[AudioTrack]]:
+        """Tracks matching every word of `text` and the given filters, sorted by path.
+
+        Returns (total number of matches, the requested page).
+        """
+        words = normalize(text).split()
+        artist, album = normalize(artist), normalize(album)
+        extension = extension.lower().lstrip('.')
+        with self._lock:
+            ordered = self._sorted
+        matches = []
+        for track in ordered:
+            track_text, _, track_artist, track_album = track.keys
+            if ((not artist or track_artist == artist) and (not album or track_album == album)
+                    and (not extension or track.path.lower().endswith('.' + extension))
+                    and all(word in track_text for word in words)):
+                matches.append(track)
+        return len(matches), matches[max(0, offset):max(0, offset) + max(0, limit)]
+
+    def find(self, title: str, artist: str) -> Optional[AudioTrack]:
+        """The track whose tags match a song's title and artist, if any."""
+        with self._lock:
+            by_key, ordered = self._by_key, self._sorted
+        if by_key is None:
+            by_key = {}
+            for track in ordered:
+                by_key.setdefault(track.keys[1:3], track)
+            with self._lock:
+                if self._sorted is ordered:
+                    self._by_key = by_key
+        return by_key.get((normalize(title), normalize(artist)))
+
+    def lyrics_for(self, track: AudioTrack) -> Optional[str]:
+        """Path of the LyricsX file matching the track's tags, or None."""
+        if self.lyrics is None or not track.title:
+            return None
+        return self.lyrics.lookup(track.title, track.artist)
+
+    def stats(self) -> dict:
+        return {
+            'tracks': len(self.tracks),
+            'directories': len(self._dirs),
+            'scanning': self.scanning,
+            'last_scan': self.last_scan,
+            'last_scan_seconds': self.last_scan_seconds
+        }
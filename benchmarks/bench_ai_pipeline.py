@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Wall-time benchmark for ai_postprocess.add_ai_phonetics_and_translation.
+Runs the pipeline against a local mock Ollama server, comparing one line per
+request (the old behaviour, minus its fixed sleeps) with batched concurrent
+requests, with and without 429 responses, whole responses with streamed
+ones (time to first enhanced line), and how much survives 500 errors and
+malformed answers.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_llm import MockLLMServer
+
+import ai_postprocess
+
+
+def run(lyrics, batch_size, concurrency, latency, per_line_latency, rate_limit_ratio, stream,
+        error_ratio=0.0, malformed_ratio=0.0):
+    first_line = []
+
+    def progress(done, total):
+        if done and not first_line:
+            first_line.append(time.perf_counter() - start)
+
+    with MockLLMServer(latency=latency, per_line_latency=per_line_latency,
+                       rate_limit_ratio=rate_limit_ratio, retry_after=0.2,
+                       error_ratio=error_ratio, malformed_ratio=malformed_ratio) as server:
+        os.environ['OLLAMA_URL'] = server.url
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            enhanced = ai_postprocess.add_ai_phonetics_and_translation(
+                lyrics, include_kanji=True, use_ollama=True,
+                batch_size=batch_size, concurrency=concurrency, use_cache=False,
+                progress=progress, stream=stream)
+        seconds = time.perf_counter() - start
+    enhanced_lines = sum(1 for line in enhanced if line.startswith('[tr]'))
+    return {
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'rate_limit_ratio': rate_limit_ratio,
+        'error_ratio': error_ratio,
+        'malformed_ratio': malformed_ratio,
+        'stream': stream,
+        'seconds': seconds,
+        'first_line_seconds': first_line[0] if first_line else None,
+        'requests': server.requests,
+        'rate_limited': server.rate_limited,
+        'errors': server.errors,
+        'malformed': server.malformed,
+        'enhanced_lines': enhanced_lines
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI enhancement pipeline against a mock server")
+    parser.add_argument("--lines", type=int, default=60, help="Lyric lines per song (default: 60)")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock model latency per request in seconds (default: 0.3)")
+    parser.add_argument("--per-line-latency", type=float, default=0.05,
+                        help="Mock generation time per answered line in seconds (default: 0.05)")
+    parser.add_argument("--error-ratio", type=float, default=0.1,
+                        help="Share of requests answered with a 500 in the failure scenario (default: 0.1)")
+    parser.add_argument("--malformed-ratio", type=float, default=0.1,
+                        help="Share of truncated answers in the failure scenario (default: 0.1)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    lyrics = [f"歌詞の行 {i}" for i in range(args.lines)]
+    scenarios = [
+        (1, 1, 0.0, False, False),
+        (8, 1, 0.0, False, False),
+        (8, 4, 0.0, False, False),
+        (8, 4, 0.0, True, False),
+        (8, 4, 0.3, True, False),
+        (8, 4, 0.0, True, True),
+    ]
+    results = []
+    for batch_size, concurrency, ratio, stream, failures in scenarios:
+        error_ratio, malformed_ratio = (args.error_ratio, args.malformed_ratio) if failures else (0.0, 0.0)
+        result = run(lyrics, batch_size, concurrency, args.latency, args.per_line_latency, ratio, stream,
+                     error_ratio, malformed_ratio)
+        results.append(result)
+        first_line = result['first_line_seconds']
+        print(f"batch={batch_size:<2} concurrency={concurrency:<2} 429s={ratio:<4.0%} stream={stream!s:<5} "
+              f"failures={failures!s:<5}: {result['seconds']:6.2f}s "
+              f"(first line {first_line if first_line is None else round(first_line, 2)}s), "
+              f"{result['requests']:3d} requests ({result['rate_limited']} rate limited, "
+              f"{result['errors']} errors, {result['malformed']} malformed), "
+              f"{result['enhanced_lines']}/{args.lines} lines enhanced")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the web endpoints the pages hit most.
+Runs web_lyricstamp on plain Linux against the simulated player backend, with
+HOME, the session journal and the caches in a temporary directory and a lyrics
+file for the simulated song built from the corpus. Requests go through Flask's
+test client (server cost only) or, with --http, through a real threaded server
+over keep-alive HTTP. Reports mean and percentile latency per endpoint.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_lrc_parser import load_corpus
+
+SIMULATED_SONG = 'Simulated Song - LyricStamp.lrcx'
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(name, samples):
+    milliseconds = [sample * 1000 for sample in samples]
+    return {
+        'name': name,
+        'requests': len(milliseconds),
+        'mean_ms': statistics.fmean(milliseconds),
+        'p50_ms': percentile(milliseconds, 0.50),
+        'p90_ms': percentile(milliseconds, 0.90),
+        'p99_ms': percentile(milliseconds, 0.99),
+        'max_ms': max(milliseconds)
+    }
+
+
+def prepare_home(home, lines):
+    """A HOME with ~/Music/LyricsX holding lyrics for the simulated player's song."""
+    lyricsx = os.path.join(home, 'Music', 'LyricsX')
+    os.makedirs(lyricsx, exist_ok=True)
+    corpus = load_corpus()
+    body = ''.join(corpus.values())
+    rows = [row for row in body.splitlines() if row.strip()]
+    with open(os.path.join(lyricsx, SIMULATED_SONG), 'w', encoding='utf-8') as f:
+        f.write(''.join(rows[i % len(rows)] + '\n' for i in range(lines)))
+
+
+class TestClientTransport:
+    """Calls the app in-process; measures only the server's own work."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path, headers=None):
+        response = self.client.get(path, headers=headers)
+        return response.status_code, dict(response.headers), response.data
+
+    def post(self, path, body, headers=None):
+        response = self.client.post(path, json=body, headers=headers)
+        return response.status_code, dict(response.headers), response.data
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Real sockets against a threaded werkzeug server, one keep-alive session."""
+
+    def __init__(self, app):
+        import logging
+        import requests
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, name='bench-server', daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.session = requests.Session()
+
+    def get(self, path, headers=None):
+        response = self.session.get(self.url + path, headers=headers)
+        return response.status_code, dict(response.headers), response.content
+
+    def post(self, path, body, headers=None):
+        response = self.session.post(self.url + path, json=body, headers=headers)
+        return response.status_code, dict(response.headers), response.content
+
+    def close(self):
+        self.session.close()
+        self.server.shutdown()
+
+
+def measure(call, requests, warmup=20):
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(transport, requests, lines):
+    results = []
+
+    def get_ok(path, headers=None):
+        status, response_headers, body = transport.get(path, headers)
+        if status not in (200, 304):
+            raise RuntimeError(f"{path} returned {status}: {body[:200]!r}")
+        return response_headers
+
+    results.append(summarize('GET /api/music/position', measure(lambda: get_ok('/api/music/position'), requests)))
+    results.append(summarize('GET /api/get_lyrics_file', measure(lambda: get_ok('/api/get_lyrics_file'), requests)))
+    etag = get_ok('/api/get_lyrics_file').get('ETag')
+    if etag:
+        results.append(summarize('GET /api/get_lyrics_file (304)', measure(
+            lambda: get_ok('/api/get_lyrics_file', {'If-None-Match': etag}), requests)))
+
+    # Stamping: the session is restarted (outside the timed call) whenever its lines run out
+    lyrics = '\n'.join(f"line {i}" for i in range(lines))
+    headers = {}
+    stamped = [lines]
+
+    def start_session():
+        status, _, body = transport.post('/api/start_session',
+                                         {'source': 'manual', 'lyrics': lyrics, 'filename': 'bench.lrcx'}, headers)
+        if status != 200:
+            raise RuntimeError(f"start_session returned {status}: {body[:200]!r}")
+        headers['X-LyricStamp-Session'] = json.loads(body)['session_id']
+        transport.post('/api/start_timing', {}, headers)
+        stamped[0] = 0
+
+    def next_line():
+        status, _, body = transport.post('/api/next_line', {}, headers)
+        if status != 200 or not json.loads(body).get('success'):
+            raise RuntimeError(f"next_line returned {status}: {body[:200]!r}")
+        stamped[0] += 1
+
+    def stamp_samples():
+        samples = []
+        for _ in range(requests):
+            if stamped[0] >= lines - 1:
+                start_session()
+            start = time.perf_counter()
+            next_line()
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    results.append(summarize('POST /api/next_line', stamp_samples()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark endpoint latency against the simulated player")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint (default: 2000)")
+    parser.add_argument("--lines", type=int, default=120, help="Lines in the lyrics and timing session (default: 120)")
+    parser.add_argument("--http", action="store_true", help="Go through a real HTTP server instead of the test client")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='lyricstamp-bench-') as home:
+        prepare_home(home, args.lines)
+        # web_lyricstamp reads its configuration at import time
+        os.environ.update({
+            'HOME': home,
+            'XDG_CACHE_HOME': os.path.join(home, '.cache'),
+            'LYRICSTAMP_PLAYER': 'simulated',
+            'LYRICSTAMP_JOURNAL': os.path.join(home, 'sessions.journal')
+        })
+        import web_lyricstamp
+
+        # The player service publishes its first snapshot asynchronously
+        deadline = time.monotonic() + 5
+        while web_lyricstamp.player_service.snapshot().title == '' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        transport = HTTPTransport(web_lyricstamp.app) if args.http else TestClientTransport(web_lyricstamp.app)
+        try:
+            results = run(transport, args.requests, args.lines)
+        finally:
+            transport.close()
+            web_lyricstamp.journal.close()
+
+    mode = 'http' if args.http else 'test client'
+    for result in results:
+        result['transport'] = mode
+        print(f"{result['name']:<34} mean {result['mean_ms']:7.3f} ms  p50 {result['p50_ms']:7.3f}  "
+              f"p90 {result['p90_ms']:7.3f}  p99 {result['p99_ms']:7.3f}  max {result['max_ms']:7.3f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
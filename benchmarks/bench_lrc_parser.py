@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the LRC/LRCX tokenizer and Timeline compiler.
+Checks that every file in benchmarks/corpus round-trips losslessly, then
+measures parse throughput over a synthetic library built from the corpus.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lrc_parser
+from lyrics_timeline import Timeline
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def load_corpus():
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.lrcx'))):
+        # newline='' keeps CRLF endings, which the round trip must preserve
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            corpus[os.path.basename(path)] = f.read()
+    return corpus
+
+
+def check_round_trip(corpus):
+    """Return the names of corpus files that do not survive tokenize -> dumps."""
+    return [name for name, text in corpus.items()
+            if lrc_parser.dumps(lrc_parser.tokenize_text(text)) != text]
+
+
+def build_library(corpus, files):
+    """Synthesize `files` lyrics files of ~60 lines by repeating corpus content."""
+    texts = list(corpus.values())
+    library = []
+    for i in range(files):
+        body = texts[i % len(texts)]
+        library.append(body * max(1, 60 // max(1, body.count('\n'))))
+    return library
+
+
+def bench(label, func, library, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in library:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    lines = sum(text.count('\n') for text in library)
+    return {
+        'name': label,
+        'files': len(library),
+        'lines': lines,
+        'seconds': best,
+        'files_per_second': len(library) / best,
+        'lines_per_second': lines / best
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LRC/LRCX parser")
+    parser.add_argument("--files", type=int, default=2000, help="Synthetic library size (default: 2000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions, best run is reported (default: 3)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    failures = check_round_trip(corpus)
+    if failures:
+        print(f"Round-trip failed for: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"Round-trip OK for {len(corpus)} corpus files")
+
+    library = build_library(corpus, args.files)
+    results = [
+        bench('tokenize', lambda text: list(lrc_parser.tokenize_text(text)), library, args.repeat),
+        bench('timeline', Timeline.from_text, library, args.repeat),
+    ]
+    for result in results:
+        print(f"{result['name']:>10}: {result['files_per_second']:10.0f} files/s "
+              f"{result['lines_per_second']:12.0f} lines/s")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Local mock of the Ollama and OpenAI HTTP APIs for benchmarks.
+Answers romaji prompts (single-line or numbered batches) with configurable
+latency and configurable shares of failures: 429 responses carrying
+Retry-After, 500 errors, and malformed (truncated) answers.
+Requests with "stream": true get chunked responses in each API's streaming
+format, one line's JSON object at a time.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+NUMBERED_LINE_RE = re.compile(r'^(\d+)\. (.*)$', re.MULTILINE)
+
+
+def fake_answer(prompt: str) -> str:
+    """Build the JSON text a well-behaved model would return for the prompt."""
+    return ''.join(fake_answer_pieces(prompt))
+
+
+def fake_answer_pieces(prompt: str) -> List[str]:
+    """The answer split the way a model streams it: one piece per line's object."""
+    numbered = NUMBERED_LINE_RE.findall(prompt)
+    if numbered:
+        objects = [json.dumps({"id": int(i), "romaji": f"romaji {text}"}, ensure_ascii=False)
+                   for i, text in numbered]
+        return ['['] + [obj + (', ' if n < len(objects) - 1 else '') for n, obj in enumerate(objects)] + [']']
+    text = prompt.rsplit('\n', 1)[-1]
+    return [json.dumps({"romaji": f"romaji {text}"}, ensure_ascii=False)]
+
+
+def truncate(pieces: List[str]) -> List[str]:
+    """A broken answer: the first half of the objects, then a cut-off one and no closing bracket."""
+    keep = max(1, len(pieces) // 2)
+    return pieces[:keep] + [pieces[keep][:len(pieces[keep]) // 2]] if keep < len(pieces) else pieces[:1]
+
+
+def token_counts(prompt: str, answer: str):
+    """Rough (prompt, completion) token counts, about four characters per token."""
+    return max(1, len(prompt) // 4), max(1, len(answer) // 4)
+
+
+class MockLLMServer:
+    """Threaded HTTP server; use as a context manager or call start()/stop()."""
+
+    def __init__(self, latency: float = 0.3, per_line_latency: float = 0.0,
+                 rate_limit_ratio: float = 0.0, retry_after: float = 0.5, seed: int = 0,
+                 error_ratio: float = 0.0, malformed_ratio: float = 0.0):
+        self.latency = latency
+        self.per_line_latency = per_line_latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.error_ratio = error_ratio
+        self.malformed_ratio = malformed_ratio
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.malformed = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 for keep-alive and chunked streaming, like the real servers
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, prompt, ollama, malformed):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson' if ollama else 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                time.sleep(mock.latency)
+                pieces = fake_answer_pieces(prompt)
+                if malformed:
+                    pieces = truncate(pieces)
+                for n, piece in enumerate(pieces):
+                    if 0 < n < len(pieces) - 1:
+                        time.sleep(mock.per_line_latency)
+                    if ollama:
+                        event = json.dumps({"response": piece, "done": False}, ensure_ascii=False) + '\n'
+                    else:
+                        event = 'data: ' + json.dumps({"choices": [{"delta": {"content": piece}}]},
+                                                      ensure_ascii=False) + '\n\n'
+                    self._write_chunk(event.encode('utf-8'))
+                prompt_tokens, completion_tokens = token_counts(prompt, ''.join(pieces))
+                if ollama:
+                    final = json.dumps({"response": "", "done": True, "prompt_eval_count": prompt_tokens,
+                                        "eval_count": completion_tokens}) + '\n'
+                else:
+                    final = 'data: ' + json.dumps({"choices": [], "usage": {
+                        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}}) + '\n\ndata: [DONE]\n\n'
+                self._write_chunk(final.encode('utf-8'))
+                self._write_chunk(b'')
+
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                data = json.loads(self.rfile.read(length) or b'{}')
+                with mock._lock:
+                    mock.requests += 1
+                    limited = mock._random.random() < mock.rate_limit_ratio
+                    failed = not limited and mock._random.random() < mock.error_ratio
+                    malformed = not (limited or failed) and mock._random.random() < mock.malformed_ratio
+                    mock.rate_limited += limited
+                    mock.errors += failed
+                    mock.malformed += malformed
+                if limited:
+                    self._send(429, {"error": "rate limited"}, {'Retry-After': str(mock.retry_after)})
+                    return
+                if failed:
+                    time.sleep(mock.latency)
+                    self._send(500, {"error": "internal error"})
+                    return
+
+                if self.path.startswith('/api/generate'):
+                    prompt = data.get('prompt', '')
+                elif self.path.startswith('/v1/chat/completions'):
+                    prompt = data.get('messages', [{}])[-1].get('content', '')
+                else:
+                    self._send(404, {"error": "not found"})
+                    return
+
+                if data.get('stream'):
+                    try:
+                        self._send_stream(prompt, self.path.startswith('/api/generate'), malformed)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # the client abandoned the stream early
+                    return
+
+                lines = max(1, len(NUMBERED_LINE_RE.findall(prompt)))
+                time.sleep(mock.latency + mock.per_line_latency * lines)
+                answer = ''.join(truncate(fake_answer_pieces(prompt))) if malformed else fake_answer(prompt)
+                prompt_tokens, completion_tokens = token_counts(prompt, answer)
+                if self.path.startswith('/api/generate'):
+                    self._send(200, {"response": answer, "done": True, "prompt_eval_count": prompt_tokens,
+                                     "eval_count": completion_tokens})
+                else:
+                    self._send(200, {"choices": [{"message": {"content": answer}}],
+                                     "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}})
+
+        return Handler
+
+    def start(self) -> 'MockLLMServer':
+        threading.Thread(target=self._server.serve_forever, name='mock-llm', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Runs every benchmark in this directory and writes one combined JSON report.
+Each bench_*.py runs in its own process (so one's imports and environment do
+not leak into another) with --json pointing at a temporary file; the merged
+report records the git commit, Python version and platform next to the
+results. With --compare, numeric results are printed against an earlier
+report to spot regressions between commits.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(script, extra_args):
+    """Run one benchmark script; returns (results or None, seconds, error text or None)."""
+    with tempfile.TemporaryDirectory(prefix='lyricstamp-bench-') as tmp:
+        output = os.path.join(tmp, 'results.json')
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, script, '--json', output] + extra_args, cwd=BENCH_DIR)
+        seconds = time.perf_counter() - started
+        if completed.returncode != 0 or not os.path.exists(output):
+            return None, seconds, f"exited with status {completed.returncode}"
+        with open(output, encoding='utf-8') as f:
+            return json.load(f), seconds, None
+
+
+def result_label(result):
+    """A stable name for one result row, built from its non-measurement fields."""
+    if 'name' in result:
+        return str(result['name'])
+    settings = ('batch_size', 'concurrency', 'rate_limit_ratio', 'error_ratio', 'malformed_ratio', 'stream')
+    return ' '.join(f"{key}={result[key]}" for key in settings if key in result)
+
+
+def compare(previous, current):
+    """Print each numeric field of rows present in both reports with its relative change."""
+    for name, benchmark in current['benchmarks'].items():
+        before = {result_label(row): row for row in previous['benchmarks'].get(name, {}).get('results') or []}
+        for row in benchmark.get('results') or []:
+            label = result_label(row)
+            if label not in before:
+                continue
+            for key, value in row.items():
+                old = before[label].get(key)
+                if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                        and isinstance(old, (int, float)) and old):
+                    change = (value - old) / old * 100
+                    print(f"{name:<16} {label:<40} {key:<20} {old:12.3f} -> {value:12.3f} ({change:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all benchmarks and merge their results")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="Combined report to write (default: benchmark_results.json)")
+    parser.add_argument("--only", action="append", default=[],
+                        help="Run only this benchmark, e.g. --only endpoints (repeatable)")
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads, for a fast sanity run")
+    parser.add_argument("--compare", help="Earlier combined report to compare against")
+    args = parser.parse_args()
+
+    quick_args = {
+        'lrc_parser': ['--files', '200', '--repeat', '1'],
+        'ai_pipeline': ['--lines', '20', '--latency', '0.02', '--per-line-latency', '0.002'],
+        'endpoints': ['--requests', '200']
+    }
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'benchmarks': {}
+    }
+    failed = False
+    for script in sorted(glob.glob(os.path.join(BENCH_DIR, 'bench_*.py'))):
+        name = os.path.basename(script)[len('bench_'):-len('.py')]
+        if args.only and name not in args.only:
+            continue
+        print(f"== {name}", flush=True)
+        results, seconds, error = run_benchmark(script, quick_args.get(name, []) if args.quick else [])
+        report['benchmarks'][name] = {'seconds': seconds, 'results': results}
+        if error:
+            report['benchmarks'][name]['error'] = error
+            print(f"{name} failed: {error}", file=sys.stderr)
+            failed = True
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+        compare(previous, report)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events push channel for LyricStamp.
+One producer publishes position ticks, track changes, session updates and AI
+progress; every open page subscribes to /api/stream instead of polling.
+Events can be broadcast or addressed to one channel (a timing session).
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def format_event(event: str, payload: str) -> str:
+    """Format one SSE message; payload is already-serialized JSON."""
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class Subscriber:
+    """Bounded per-client queue with coalescing of tick events.
+
+    Coalesced events share a key, so a slow client only ever holds the latest
+    tick. When the queue is full the oldest event is dropped; a client that
+    keeps overflowing is closed so it cannot hold memory indefinitely.
+    """
+
+    def __init__(self, max_pending: int = 64, max_dropped: int = 256, channel: Optional[str] = None):
+        self.channel = channel
+        self.max_pending = max_pending
+        self.max_dropped = max_dropped
+        self.dropped = 0
+        self.closed = False
+        self._pending = OrderedDict()
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def put(self, event: str, payload: str, coalesce: bool = False):
+        with self._cond:
+            if self.closed:
+                return
+            key = event if coalesce else next(self._counter)
+            if key in self._pending:
+                del self._pending[key]
+            elif len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+                if self.dropped > self.max_dropped:
+                    self.closed = True
+            self._pending[key] = (event, payload)
+            self._cond.notify()
+
+    def get(self, timeout: float) -> List[Tuple[str, str]]:
+        """Wait up to `timeout` seconds and drain everything pending."""
+        with self._cond:
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._pending.values())
+            self._pending.clear()
+            return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class EventHub:
+    """Fans published events out to all subscribers from a single producer."""
+
+    def __init__(self, max_pending: int = 64, heartbeat: float = 15.0):
+        self.max_pending = max_pending
+        self.heartbeat = heartbeat
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._has_subscribers = threading.Event()
+        self._producers = []
+        self._producers_started = False
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, channel: Optional[str] = None) -> Subscriber:
+        """Subscribe to broadcasts plus the events published to `channel`."""
+        subscriber = Subscriber(self.max_pending, channel=channel)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self._has_subscribers.set()
+            if not self._producers_started:
+                self._producers_started = True
+                for produce, interval in self._producers:
+                    self._start_producer(produce, interval)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._has_subscribers.clear()
+
+    def publish(self, event: str, data, coalesce: bool = False, channel: Optional[str] = None):
+        """Serialize once and queue the event for every subscriber (or every one on `channel`)."""
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = [s for s in self._subscribers if channel is None or s.channel == channel]
+        if not subscribers:
+            return
+        payload = json.dumps(data)
+        for subscriber in subscribers:
+            subscriber.put(event, payload, coalesce)
+
+    def add_producer(self, produce: Callable[[], None], interval: float):
+        """Run `produce` every `interval` seconds while anyone is subscribed.
+
+        Producer threads start with the first subscriber, so importing the app
+        (or the debug reloader's parent process) never spawns them.
+        """
+        with self._lock:
+            self._producers.append((produce, interval))
+            if self._producers_started:
+                self._start_producer(produce, interval)
+
+    def _start_producer(self, produce: Callable[[], None], interval: float):
+        def run():
+            while True:
+                self._has_subscribers.wait()
+                try:
+                    produce()
+                except Exception as e:
+                    print(f"Event producer error: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=run, name='event-producer', daemon=True).start()
+
+    def stream(self, subscriber: Subscriber, initial: Optional[Iterable[Tuple[str, object]]] = None) -> Iterator[str]:
+        """Yield SSE text for one subscriber until it disconnects."""
+        try:
+            yield "retry: 2000\n\n"
+            for event, data in initial or []:
+                yield format_event(event, json.dumps(data))
+            while not subscriber.closed:
+                events = subscriber.get(self.heartbeat)
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield ''.join(format_event(event, payload) for event, payload in events)
+        finally:
+            self.unsubscribe(subscriber)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Serialized response cache with conditional GET and compression.
+Responses are keyed by whatever identifies their content (for lyrics, the
+file's path, mtime and size), serialized once and kept in a small LRU with
+their ETag, a content hash. Repeat requests that send If-None-Match or
+If-Modified-Since get a bodiless 304; others get the cached bytes, gzip- or
+brotli-compressed once per entry when the payload is large enough to matter.
+
+brotli is optional; without it clients that accept gzip get gzip.
+"""
+
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from werkzeug.http import parse_date, parse_etags
+from werkzeug.wrappers import Request, Response
+
+import atomic_io
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+# Smaller bodies are not worth the compression and header overhead
+MIN_COMPRESS_BYTES = 1024
+
+
+class CachedResponse:
+    """One serialized body and its lazily compressed variants."""
+
+    def __init__(self, body: bytes, mimetype: str, last_modified: Optional[float] = None):
+        self.body = body
+        self.mimetype = mimetype
+        self.last_modified = last_modified
+        self.etag = atomic_io.content_hash(body)[:32]
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                if encoding == 'br':
+                    data = brotli.compress(self.body, quality=5)
+                else:
+                    data = gzip.compress(self.body, compresslevel=6)
+                self._encoded[encoding] = data
+            return data
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self._encoded.values())
+
+
+class ResponseCache:
+    """Thread-safe LRU of serialized responses, bounded by entry count and bytes."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries: 'OrderedDict[Hashable, CachedResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], bytes], mimetype: str,
+            last_modified: Optional[float] = None) -> CachedResponse:
+        """Return the cached response for `key`, calling `build()` for its body on a miss."""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        cached = CachedResponse(build(), mimetype, last_modified)
+        with self._lock:
+            self._entries[key] = cached
+            self._evict()
+        return cached
+
+    def get_json(self, key: Hashable, build: Callable[[], Any],
+                 last_modified: Optional[float] = None) -> CachedResponse:
+        """Like get(), for a JSON payload serialized once per entry."""
+        return self.get(key, lambda: json.dumps(build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+                        'application/json', last_modified)
+
+    def _evict(self):
+        total = sum(entry.size for entry in self._entries.values())
+        while self._entries and (len(self._entries) > self.max_entries or total > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            total -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def respond(self, cached: CachedResponse, request: Request) -> Response:
+        """Build the response for `request`: 304 if its validators match, else the negotiated encoding."""
+        encoding = None
+        if len(cached.body) >= MIN_COMPRESS_BYTES:
+            accepted = request.accept_encodings
+            if brotli is not None and accepted['br']:
+                encoding = 'br'
+            elif accepted['gzip']:
+                encoding = 'gzip'
+        # Each encoding is a different representation, so it gets its own strong ETag
+        etag = f"{cached.etag}-{encoding}" if encoding else cached.etag
+
+        if not self._modified(cached, request):
+            with self._lock:
+                self.not_modified += 1
+            response = Response(status=304)
+        else:
+            response = Response(cached.encoded(encoding) if encoding else cached.body, mimetype=cached.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        if cached.last_modified is not None:
+            response.headers['Last-Modified'] = formatdate(cached.last_modified, usegmt=True)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Cacheable, but revalidated every time so a changed file shows up at once
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @staticmethod
+    def _modified(cached: CachedResponse, request: Request) -> bool:
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if etags.star_tag:
+                return False
+            # Any encoding of unchanged content still matches
+            return not any(tag.split('-')[0] == cached.etag for tag in etags.as_set(include_weak=True))
+        if_modified_since = parse_date(request.headers.get('If-Modified-Since'))
+        if if_modified_since is not None and cached.last_modified is not None:
+            return int(cached.last_modified) > if_modified_since.timestamp()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(entry.size for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified
+            }
@@ -2,25 +2,32 @@
 
 echo "Starting LyricStamp..."
 
-# Start Flask server in background
-echo "Starting Flask server..."
-python3 web_lyricstamp.py &
+PORT=${LYRICSTAMP_PORT:-5734}
+
+# Start the server (waitress, LYRICSTAMP_THREADS request threads) in background
+echo "Starting LyricStamp server..."
+python3 web_lyricstamp.py --port "$PORT" --threads "${LYRICSTAMP_THREADS:-16}" &
 FLASK_PID=$!
+trap 'kill $FLASK_PID 2>/dev/null' INT TERM
 
-# Wait for Flask server to start
-echo "Waiting for Flask server to start..."
-for i in {1..30}; do
-    if curl -s http://localhost:5734 > /dev/null; then
-        echo "Flask server is running!"
+# Wait (up to 30 seconds) until the server reports ready: player polled, lyrics indexed
+echo "Waiting for LyricStamp server to become ready..."
+for i in {1..300}; do
+    if ! kill -0 $FLASK_PID 2>/dev/null; then
+        echo "LyricStamp server exited during startup."
+        exit 1
+    fi
+    if curl -sf "http://localhost:$PORT/api/ready" > /dev/null; then
+        echo "LyricStamp server is ready!"
         break
     fi
-    sleep 1
+    sleep 0.1
 done
 
 # Open the Tauri app
 echo "Opening LyricStamp app..."
 open src-tauri/target/release/bundle/macos/lyricstamp.app
 
-# Keep the script running to keep Flask server alive
+# Keep the script running to keep the server alive
 echo "LyricStamp is running. Press Ctrl+C to stop."
-wait $FLASK_PID 
\ No newline at end of file
+wait $FLASK_PID
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Streaming LRC/LRCX tokenizer shared by web_lyricstamp and ai_postprocess.
+Handles multi-timestamp lines, [offset:] and other metadata tags, LRCX [tr]/[tl]
+sub-lines and enhanced word timings (<mm:ss.xx>). Every row keeps its raw text,
+surrounding whitespace and line ending, and blank lines are rows too, so
+`dumps(tokenize_text(text))` reproduces the input byte for byte.
+"""
+
+import io
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+STAMP_RE = re.compile(r'\[(\d+):(\d{1,2})(?:[.:](\d{1,3}))?\]')
+META_RE = re.compile(r'\[([A-Za-z][A-Za-z0-9_-]*):([^\]]*)\]')
+SUBTAG_RE = re.compile(r'\[((?:tr|tl|tt)(?::[^\]]*)?)\]')
+WORD_RE = re.compile(r'<(\d+):(\d{1,2})(?:[.:](\d{1,3}))?>')
+SUBLINE_KEYS = {'tr', 'tl', 'tt'}
+
+
+def _to_ms(minutes: str, seconds: str, fraction: Optional[str]) -> int:
+    millis = int(fraction.ljust(3, '0')) if fraction else 0
+    return (int(minutes) * 60 + int(seconds)) * 1000 + millis
+
+
+def parse_timestamp(timestamp: str) -> Optional[int]:
+    """Convert a timestamp like [1:02.345] to integer milliseconds."""
+    match = STAMP_RE.match(timestamp)
+    return _to_ms(*match.groups()) if match else None
+
+
+def format_timestamp(ms: int) -> str:
+    """Format integer milliseconds the way LyricStamp writes them: [m:ss.mmm]."""
+    minutes, rest = divmod(ms, 60000)
+    seconds, millis = divmod(rest, 1000)
+    return f"[{minutes}:{seconds:02d}.{millis:03d}]"
+
+
+def parse_words(text: str) -> Tuple[str, Optional[List[Tuple[int, str]]]]:
+    """Split enhanced-LRC word timings out of a lyric.
+
+    Returns the plain text and a list of (ms, word) pairs, or None when the
+    text carries no <mm:ss.xx> tags.
+    """
+    if '<' not in text:
+        return text, None
+    parts = WORD_RE.split(text)
+    if len(parts) == 1:
+        return text, None
+    words = []
+    plain = [parts[0]]
+    for i in range(1, len(parts), 4):
+        word = parts[i + 3]
+        words.append((_to_ms(parts[i], parts[i + 1], parts[i + 2]), word))
+        plain.append(word)
+    return ''.join(plain), words
+
+
+def strip_word_times(text: str) -> str:
+    """Return a lyric without its enhanced-LRC word timings."""
+    return parse_words(text)[0]
+
+
+def is_subline(text: str) -> bool:
+    """True for LRCX translation/transliteration rows such as [tr]... or [tr:zh-Hans]..."""
+    return text.startswith('[t') and SUBTAG_RE.match(text) is not None
+
+
+class Row:
+    """One tokenized line of an LRC/LRCX file.
+
+    kind is 'lyric' (one or more leading timestamps), 'meta' ([key:value] tag),
+    'blank' (empty or whitespace-only) or 'text' (anything else). `prefix + text`
+    is always the stripped line; `lead` and `end` hold the whitespace around it,
+    `end` including the line ending.
+    """
+    __slots__ = ('kind', 'prefix', 'text', 'stamps', 'tag', 'body', 'words', 'key', 'value', 'lead', 'end')
+
+    def __init__(self, kind: str, prefix: str, text: str):
+        self.kind = kind
+        self.prefix = prefix
+        self.text = text
+        self.stamps: List[Tuple[str, int]] = []  # (raw timestamp, ms) in line order
+        self.tag: Optional[str] = None  # 'tr', 'tr:zh-Hans', 'tl'... for LRCX sub-lines
+        self.body = text  # text without sub-line tag and word timings
+        self.words: Optional[List[Tuple[int, str]]] = None
+        self.key: Optional[str] = None
+        self.value: Optional[str] = None
+        self.lead = ''
+        self.end = '\n'
+
+    @property
+    def raw(self) -> str:
+        return self.prefix + self.text
+
+    def __repr__(self):
+        return f"Row({self.kind!r}, {self.raw!r})"
+
+
+def tokenize_line(line: str) -> Row:
+    """Tokenize a single stripped, non-empty line."""
+    if not line.startswith('['):
+        row = Row('text', '', line)
+        row.body, row.words = parse_words(line)
+        return row
+
+    stamps = []
+    pos = 0
+    match = STAMP_RE.match(line)
+    while match:
+        stamps.append((match.group(0), _to_ms(*match.groups())))
+        pos = match.end()
+        match = STAMP_RE.match(line, pos)
+
+    if not stamps:
+        meta = META_RE.fullmatch(line)
+        if meta and meta.group(1).lower() not in SUBLINE_KEYS:
+            row = Row('meta', line, '')
+            row.key = meta.group(1).lower()
+            row.value = meta.group(2).strip()
+            return row
+        row = Row('text', '', line)
+    else:
+        row = Row('lyric', line[:pos], line[pos:])
+        row.stamps = stamps
+
+    body = row.text
+    sub = SUBTAG_RE.match(body)
+    if sub:
+        row.tag = sub.group(1)
+        body = body[sub.end():]
+    row.body, row.words = parse_words(body.strip())
+    return row
+
+
+def tokenize(lines: Iterable[str]) -> Iterator[Row]:
+    """Lazily tokenize lines from any iterable (an open file works).
+
+    Blank lines come out as 'blank' rows, which consumers skip. Open files
+    with newline='' to keep CRLF line endings.
+    """
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            row = Row('blank', '', '')
+            row.end = line
+        else:
+            row = tokenize_line(stripped)
+            start = len(line) - len(line.lstrip())
+            row.lead = line[:start]
+            row.end = line[start + len(stripped):]
+        yield row
+
+
+def tokenize_text(content: str) -> Iterator[Row]:
+    # newline='' splits on \n, \r\n and \r but leaves each line's ending in place
+    return tokenize(io.StringIO(content, newline=''))
+
+
+def dumps(rows: Iterable[Row]) -> str:
+    """Serialize rows back to LRC text, with their original whitespace and line endings.
+
+    Rows whose line had no ending (the file's last line, or lines given
+    without one) are joined with '\n'.
+    """
+    parts = []
+    for row in rows:
+        if parts and not parts[-1].endswith(('\n', '\r')):
+            parts.append('\n')
+        parts.append(f"{row.lead}{row.raw}{row.end}")
+    return ''.join(parts)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Library-wide index of LyricsX lyrics files.
+The directory is scanned once and per-file facts (title, artist, line count,
+languages, timestamp coverage) are kept in a SQLite cache under
+~/.cache/lyricstamp, one per directory. Later scans only re-parse files whose
+mtime or size changed, and songs are resolved through normalized or fuzzy
+title/artist keys held in memory.
+"""
+
+import difflib
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from lyrics_timeline import Timeline
+
+# Bump when the stored columns or their meaning change
+SCHEMA_VERSION = 1
+FUZZY_CUTOFF = 0.85
+
+
+def default_index_path(directory: str) -> str:
+    """Cache file for one lyrics directory, outside it so the LyricsX folder holds only lyrics."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    digest = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_home, 'lyricstamp', f'lyrics_index-{digest}.sqlite')
+
+
+def normalize(text: str) -> str:
+    """Normalize a title or artist for matching: NFKC, casefolded, punctuation removed."""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = ''.join(ch if ch.isalnum() else ' ' for ch in text)
+    return ' '.join(text.split())
+
+
+def split_filename(filename: str) -> Tuple[str, str]:
+    """Recover (title, artist) from a 'Title - Artist.lrcx' filename."""
+    stem = os.path.splitext(filename)[0]
+    if ' - ' in stem:
+        title, artist = stem.rsplit(' - ', 1)
+        return title, artist
+    return stem, ''
+
+
+def detect_languages(timeline: Timeline) -> List[str]:
+    """Rough language tags from the scripts used in lines, plus [tr:lang] sub-line tags."""
+    languages = set()
+    for text in timeline.texts:
+        if re.search(r'[぀-ヿ]', text):
+            languages.add('ja')
+        elif re.search(r'[一-鿿]', text):
+            languages.add('zh')
+        elif re.search(r'[가-힯]', text):
+            languages.add('ko')
+        elif re.search(r'[A-Za-z]', text):
+            languages.add('latin')
+    for sublines in timeline.sublines:
+        for tag in sublines:
+            if ':' in tag:
+                languages.add(tag.split(':', 1)[1])
+    return sorted(languages)
+
+
+class LyricsEntry:
+    """Cached facts about one lyrics file."""
+    __slots__ = ('filename', 'mtime_ns', 'size', 'title', 'artist',
+                 'line_count', 'languages', 'coverage')
+
+    def __init__(self, filename, mtime_ns, size, title, artist, line_count, languages, coverage):
+        self.filename = filename
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.title = title
+        self.artist = artist
+        self.line_count = line_count
+        self.languages = languages
+        self.coverage = coverage
+
+    def to_dict(self) -> dict:
+        return {
+            'filename': self.filename,
+            'title': self.title,
+            'artist': self.artist,
+            'line_count': self.line_count,
+            'languages': self.languages.split(',') if self.languages else [],
+            'coverage': self.coverage
+        }
+
+
+class LyricsIndex:
+    """Incrementally maintained index of the .lrcx files in one directory."""
+
+    def __init__(self, directory: str, cache_path: Optional[str] = None):
+        self.directory = directory
+        self.cache_path = cache_path or default_index_path(directory)
+        self.entries: Dict[str, LyricsEntry] = {}
+        self._by_key: Dict[Tuple[str, str], str] = {}
+        self._by_title: Dict[str, List[str]] = {}
+        self._by_artist: Dict[str, List[str]] = {}
+        self._fuzzy_keys: Dict[str, str] = {}
+        self._misses = set()
+        self._dir_mtime = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.cached_misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        conn = sqlite3.connect(self.cache_path)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS files')
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.execute('''CREATE TABLE IF NOT EXISTS files (
+            filename TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER,
+            title TEXT, artist TEXT, line_count INTEGER, languages TEXT, coverage REAL)''')
+        return conn
+
+    def _load_entry(self, filename: str, stat: os.stat_result) -> LyricsEntry:
+        timeline = Timeline.from_file(os.path.join(self.directory, filename))
+        title, artist = split_filename(filename)
+        title = timeline.metadata.get('ti') or title
+        artist = timeline.metadata.get('ar') or artist
+        line_count = len(timeline)
+        coverage = sum(timeline.timed) / line_count if line_count else 0.0
+        return LyricsEntry(filename, stat.st_mtime_ns, stat.st_size, title, artist,
+                           line_count, ','.join(detect_languages(timeline)), coverage)
+
+    def refresh(self) -> int:
+        """Rescan the directory, re-parsing only new or changed files.
+
+        Returns the number of files (re)parsed.
+        """
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                self.entries = {}
+                self._rebuild_keys()
+                return 0
+            self._dir_mtime = os.stat(self.directory).st_mtime_ns
+            try:
+                conn = self._connect()
+            except sqlite3.Error as e:
+                print(f"Lyrics index cache unavailable: {e}")
+                conn = None
+
+            cached = dict(self.entries)
+            if conn and not cached:
+                for row in conn.execute('SELECT * FROM files'):
+                    cached[row[0]] = LyricsEntry(*row)
+
+            entries = {}
+            changed = []
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if not item.name.endswith('.lrcx') or not item.is_file():
+                        continue
+                    stat = item.stat()
+                    entry = cached.get(item.name)
+                    if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+                        try:
+                            entry = self._load_entry(item.name, stat)
+                        except (OSError, UnicodeDecodeError) as e:
+                            print(f"Skipping unreadable lyrics file {item.name}: {e}")
+                            continue
+                        changed.append(entry)
+                    entries[item.name] = entry
+
+            removed = [name for name in cached if name not in entries]
+            if conn:
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                     [tuple(getattr(e, f) for f in LyricsEntry.__slots__) for e in changed])
+                    conn.executemany('DELETE FROM files WHERE filename = ?', [(name,) for name in removed])
+                conn.close()
+
+            self.entries = entries
+            self._rebuild_keys()
+            return len(changed)
+
+    def _rebuild_keys(self):
+        by_key, by_title, by_artist, fuzzy_keys = {}, {}, {}, {}
+        for filename, entry in self.entries.items():
+            file_title, file_artist = split_filename(filename)
+            for title, artist in ((entry.title, entry.artist), (file_title, file_artist)):
+                key = (normalize(title), normalize(artist))
+                by_key.setdefault(key, filename)
+                by_title.setdefault(key[0], []).append(filename)
+                by_artist.setdefault(key[1], []).append(filename)
+                fuzzy_keys.setdefault(' '.join(key), filename)
+        self._by_key, self._by_title, self._by_artist = by_key, by_title, by_artist
+        self._fuzzy_keys = fuzzy_keys
+        self._misses = set()
+
+    def ensure_fresh(self):
+        """Refresh if never scanned or if files were added or removed since.
+
+        Files edited in place leave the directory mtime alone; lookup() catches
+        those by checking the file it matched.
+        """
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+        if self._dir_mtime is None or dir_mtime != self._dir_mtime:
+            self.refresh()
+
+    def lookup(self, title: str, artist: str) -> Optional[str]:
+        """Find the lyrics file for a song and return its full path, or None.
+
+        Tries the exact normalized title/artist, then the normalized forms of
+        create_safe_filename's 50-character truncation, then a unique title
+        match, then a fuzzy match.
+        """
+        self.ensure_fresh()
+        # Songs without lyrics are asked for repeatedly; remember misses until the next scan
+        if (title, artist) in self._misses:
+            self._count('cached_misses')
+            return None
+        filename = self._match(title, artist)
+        if filename and not self._is_current(filename):
+            # Edited in place (or removed) since the last scan: its title or artist may have changed
+            self.refresh()
+            filename = self._match(title, artist)
+        if not filename:
+            self._misses.add((title, artist))
+            self._count('misses')
+            return None
+        self._count('hits')
+        return os.path.join(self.directory, filename)
+
+    def _is_current(self, filename: str) -> bool:
+        """True if the indexed entry still matches the file's mtime and size."""
+        entry = self.entries.get(filename)
+        try:
+            stat = os.stat(os.path.join(self.directory, filename))
+        except OSError:
+            return False
+        return entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size
+
+    def _count(self, field: str):
+        with self._stats_lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def stats(self) -> dict:
+        """Index size and lookup outcomes; cached misses are songs already known to have no lyrics."""
+        with self._stats_lock:
+            lookups = self.hits + self.misses + self.cached_misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'cached_misses': self.cached_misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def _match(self, title: str, artist: str) -> Optional[str]:
+        keys = [(normalize(title), normalize(artist)),
+                (normalize(title[:50]), normalize(artist[:50]))]
+        for key in keys:
+            if key in self._by_key:
+                return self._by_key[key]
+
+        norm_title, norm_artist = keys[0]
+        candidates = set(self._by_title.get(norm_title, []))
+        if len(candidates) == 1:
+            return candidates.pop()
+
+        # Fuzzy: prefer files by the same artist, fall back to the whole library
+        query = f"{norm_title} {norm_artist}"
+        same_artist = set(self._by_artist.get(norm_artist, []))
+        for pool in (same_artist, None):
+            choices = {key: filename for key, filename in self._fuzzy_keys.items()
+                       if pool is None or filename in pool}
+            match = difflib.get_close_matches(query, choices, n=1, cutoff=FUZZY_CUTOFF)
+            if match:
+                return choices[match[0]]
+        return None
+
+    def list(self) -> List[LyricsEntry]:
+        self.ensure_fresh()
+        return sorted(self.entries.values(), key=lambda entry: entry.filename)
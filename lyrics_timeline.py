@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Compiled lyric timeline shared by the web interface and ai_postprocess.
+A lyrics file is tokenized once by lrc_parser into integer-millisecond timestamps
+with [tr]/[tl] sub-lines grouped under their line, and positions are looked up by
+binary search.
+"""
+
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import lrc_parser
+
+
+class Timeline:
+    """Parsed lyrics: one entry per (line, timestamp), sub-lines grouped, times in ms.
+
+    Lines with several timestamps become one entry per timestamp, [offset:] is
+    applied, and entries are sorted by start time. `times` is a compact array('q')
+    used for O(log n) lookups; untimed lines inherit the previous line's time.
+    The flat `lines`/`timestamps`/`row_times`/`row_timed` views lay entries
+    out with their sub-lines for the web pages (so they are longer than
+    `times` when a file has sub-lines), while `rows` keeps the source file for
+    lossless rewriting.
+    """
+
+    def __init__(self):
+        self.rows: List[lrc_parser.Row] = []
+        self.metadata: Dict[str, str] = {}
+        self.offset = 0
+        self.times = array('q')
+        self.texts: List[str] = []
+        self.sublines: List[Dict[str, str]] = []
+        self.words: List[Optional[List[Tuple[int, str]]]] = []
+        self.timed: List[bool] = []
+        self.lines: List[str] = []
+        self.timestamps: List[str] = []
+        self.row_times: List[int] = []
+        self.row_timed: List[bool] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[lrc_parser.Row]) -> 'Timeline':
+        timeline = cls()
+        # (time, timed, raw stamp, text, words, sub-line rows) in source order
+        entries = []
+        last_main = []
+        previous = 0
+        for row in rows:
+            timeline.rows.append(row)
+            if row.kind == 'blank':
+                continue
+            if row.kind == 'meta':
+                timeline.metadata[row.key] = row.value
+                continue
+            if row.tag:
+                for entry in last_main:
+                    entry[5].append(row)
+                continue
+            if row.stamps:
+                last_main = [[ms, True, stamp, row.body, row.words, []] for stamp, ms in row.stamps]
+                previous = row.stamps[-1][1]
+            else:
+                last_main = [[previous, False, '', row.body, row.words, []]]
+            entries.extend(last_main)
+
+        try:
+            timeline.offset = int(timeline.metadata.get('offset', 0))
+        except ValueError:
+            timeline.offset = 0
+        # A positive offset shows lyrics earlier
+        entries.sort(key=lambda entry: entry[0])
+        for ms, timed, stamp, text, words, subrows in entries:
+            ms = max(0, ms - timeline.offset)
+            if words and timeline.offset:
+                words = [(max(0, at - timeline.offset), word) for at, word in words]
+            timeline.times.append(ms)
+            timeline.texts.append(text)
+            timeline.words.append(words)
+            timeline.timed.append(timed)
+            timeline.sublines.append({sub.tag: sub.body for sub in subrows})
+
+            # Untimed rows carry their inherited time, so row_times stays sorted
+            timeline.lines.append(text)
+            timeline.timestamps.append(stamp)
+            timeline.row_times.append(ms)
+            timeline.row_timed.append(timed)
+            for sub in subrows:
+                timeline.lines.append(sub.text)
+                timeline.timestamps.append(stamp)
+                timeline.row_times.append(ms)
+                timeline.row_timed.append(timed)
+        return timeline
+
+    @classmethod
+    def from_text(cls, content: str) -> 'Timeline':
+        return cls.from_rows(lrc_parser.tokenize_text(content))
+
+    @classmethod
+    def from_file(cls, file_path: str) -> 'Timeline':
+        # newline='' keeps CRLF endings in `rows`, so dumps() rewrites the file as it was
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            return cls.from_rows(lrc_parser.tokenize(f))
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def line_at(self, position_ms: int) -> int:
+        """Index of the line playing at `position_ms`, or -1 before the first line.
+
+        Lines sharing a start time (e.g. untimed lines inheriting one) resolve to
+        the first of them.
+        """
+        index = bisect_right(self.times, position_ms) - 1
+        if index <= 0:
+            return index
+        return bisect_left(self.times, self.times[index], 0, index)
+
+    def next_boundary(self, position_ms: int) -> Optional[int]:
+        """Start time (ms) of the first line after `position_ms`, or None at the end."""
+        index = bisect_right(self.times, position_ms)
+        return self.times[index] if index < len(self.times) else None
+
+    def dumps(self) -> str:
+        return lrc_parser.dumps(self.rows)
+
+    def to_dict(self) -> dict:
+        """Flat view for the web API, with precomputed millisecond boundaries.
+
+        `lines`, `timestamps`, `times_ms` and `timed` have one item per row,
+        sub-lines included; `times_ms` is sorted, with untimed rows at the
+        time they inherit. `boundaries` has one item per line, without
+        sub-lines.
+        """
+        return {
+            'lines': self.lines,
+            'timestamps': self.timestamps,
+            'times_ms': self.row_times,
+            'timed': self.row_timed,
+            'boundaries': list(self.times),
+            'metadata': self.metadata
+        }
+
+
+_cache: Dict[str, Tuple[Tuple[int, int], Timeline]] = {}
+_cache_lock = threading.Lock()
+_counts = {'hits': 0, 'misses': 0}
+
+
+def _count(field: str):
+    with _cache_lock:
+        _counts[field] += 1
+
+
+def load_timeline(file_path: str, validate: bool = True) -> Timeline:
+    """Load a timeline, reusing the parsed copy while the file is unchanged.
+
+    With validate=False the cached copy is trusted without a stat call; callers
+    that do this must invalidate() paths when a watcher reports a change.
+    """
+    with _cache_lock:
+        cached = _cache.get(file_path)
+    if cached and not validate:
+        _count('hits')
+        return cached[1]
+    stat = os.stat(file_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    if cached and cached[0] == key:
+        _count('hits')
+        return cached[1]
+    timeline = Timeline.from_file(file_path)
+    with _cache_lock:
+        _cache[file_path] = (key, timeline)
+        _counts['misses'] += 1
+    return timeline
+
+
+def invalidate(file_path: str):
+    """Drop the cached timeline for a path."""
+    with _cache_lock:
+        _cache.pop(file_path, None)
+
+
+def stats() -> dict:
+    """Size and hit counts of the parsed-timeline cache."""
+    with _cache_lock:
+        lookups = _counts['hits'] + _counts['misses']
+        return {
+            'entries': len(_cache),
+            'hits': _counts['hits'],
+            'misses': _counts['misses'],
+            'hit_rate': _counts['hits'] / lookups if lookups else 0.0
+        }
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Filesystem watcher for the LyricsX directory.
+Uses watchdog (inotify on Linux, FSEvents on macOS) when it is installed and
+falls back to polling mtimes otherwise. Bursts of events are debounced and
+reported as one set of changed .lrcx filenames.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Set, Tuple
+
+WRITE_EVENTS = {'created', 'modified', 'deleted', 'moved', 'closed'}
+
+
+class LyricsWatcher:
+    """Calls on_change(filenames) when .lrcx files are created, modified or removed."""
+
+    def __init__(self, directory: str, on_change: Callable[[Set[str]], None],
+                 interval: float = 1.0, debounce: float = 0.2):
+        self.directory = directory
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self.mode = None  # 'watchdog' or 'polling' once started
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+
+    @property
+    def running(self) -> bool:
+        return self.mode is not None and not self._stop.is_set()
+
+    def start(self):
+        """Start watching; safe to call repeatedly.
+
+        A missing directory is not created (that is LyricsX's job): watching is
+        skipped and the next call tries again.
+        """
+        with self._lock:
+            if self.mode is not None or not os.path.isdir(self.directory):
+                return
+            try:
+                self._start_watchdog()
+                self.mode = 'watchdog'
+            except ImportError:
+                # Baseline taken before returning, so no change after start() is missed
+                threading.Thread(target=self._poll, args=(self._scan(),), name='lyrics-poll', daemon=True).start()
+                self.mode = 'polling'
+            threading.Thread(target=self._dispatch, name='lyrics-watch', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer:
+            self._observer.stop()
+
+    def _start_watchdog(self):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # Ignore opened/closed-without-write events; our own reads emit them
+                if event.event_type not in WRITE_EVENTS:
+                    return
+                for path in (event.src_path, getattr(event, 'dest_path', '')):
+                    if path and path.endswith('.lrcx'):
+                        watcher._notify(os.path.basename(path))
+
+        self._observer = Observer()
+        # Native watchers do not follow a symlinked directory, so watch its target
+        self._observer.schedule(Handler(), os.path.realpath(self.directory), recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if item.name.endswith('.lrcx') and item.is_file():
+                        stat = item.stat()
+                        state[item.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return state
+
+    def _poll(self, previous: Dict[str, Tuple[int, int]]):
+        while not self._stop.wait(self.interval):
+            current = self._scan()
+            for name in previous.keys() | current.keys():
+                if previous.get(name) != current.get(name):
+                    self._notify(name)
+            previous = current
+
+    def _notify(self, filename: str):
+        with self._lock:
+            self._pending.add(filename)
+        self._wake.set()
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            # Editors and atomic saves emit several events per write; let them settle
+            time.sleep(self.debounce)
+            self._wake.clear()
+            with self._lock:
+                changed, self._pending = self._pending, set()
+            if changed and not self._stop.is_set():
+                try:
+                    self.on_change(changed)
+                except Exception as e:
+                    print(f"Lyrics watcher callback failed: {e}")
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+In-process metrics for LyricStamp: counters, latency histograms and the
+stats() of the caches, exported as Prometheus text or JSON.
+Recording is a lock, a bisect and two additions per observation, so it stays
+on in production. Histograms use fixed buckets; quantiles in the JSON export
+are estimated from them the way Prometheus' histogram_quantile() does.
+Cache stats are not recorded at all: registered stats() callables are read
+when the metrics are scraped.
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans a cached request (~0.1 ms) to a slow LLM batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def prometheus(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}'
+                for labels, value in self.samples()]
+
+    def to_dict(self) -> dict:
+        return {
+            'type': self.kind,
+            'help': self.help,
+            'samples': [{'labels': dict(zip(self.labels, labels)), 'value': value}
+                        for labels, value in self.samples()]
+        }
+
+
+class Histogram:
+    """Bucketed distribution (with count and sum) per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: one count per bucket, then +Inf, then the sum
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], List[float]]]:
+        with self._lock:
+            return sorted((labels, list(row)) for labels, row in self._values.items())
+
+    def quantile(self, row: List[float], q: float) -> Optional[float]:
+        """Estimate a quantile from bucket counts, interpolating linearly inside the bucket."""
+        counts = row[:-1]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    # Beyond the last bound: the best estimate is the last bound
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def prometheus(self) -> List[str]:
+        lines = []
+        for labels, row in self.samples():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), row[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(row[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+    def to_dict(self) -> dict:
+        samples = []
+        for labels, row in self.samples():
+            count = sum(row[:-1])
+            samples.append({
+                'labels': dict(zip(self.labels, labels)),
+                'count': count,
+                'sum': row[-1],
+                'mean': row[-1] / count if count else None,
+                'p50': self.quantile(row, 0.50),
+                'p90': self.quantile(row, 0.90),
+                'p99': self.quantile(row, 0.99)
+            })
+        return {'type': self.kind, 'help': self.help, 'samples': samples}
+
+
+class Registry:
+    """Named metrics plus stats() callables read at scrape time."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._stats: Dict[str, Tuple[Callable[[], dict], Tuple[str, ...]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Modules imported twice (e.g. as __main__ and by name) share the first instance
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict], counters: Iterable[str] = ()):
+        """Export the numeric fields of `stats()` as `<prefix>_<field>`; fields in `counters` as counters."""
+        with self._lock:
+            self._stats[prefix] = (stats, tuple(counters))
+
+    def _read_stats(self) -> Dict[str, dict]:
+        with self._lock:
+            sources = dict(self._stats)
+        results = {}
+        for prefix, (stats, counters) in sources.items():
+            try:
+                results[prefix] = (stats(), counters)
+            except Exception as e:
+                # A broken source must not take the whole scrape down with it
+                results[prefix] = ({'error': str(e)}, counters)
+        return results
+
+    def prometheus(self) -> str:
+        """Everything in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.prometheus())
+        for prefix, (stats, counters) in sorted(self._read_stats().items()):
+            for field, value in sorted(stats.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{prefix}_{field}_total' if field in counters else f'{prefix}_{field}'
+                lines.append(f'# TYPE {name} {"counter" if field in counters else "gauge"}')
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {
+            'metrics': {name: metric.to_dict() for name, metric in sorted(metrics.items())},
+            'stats': {prefix: stats for prefix, (stats, _) in sorted(self._read_stats().items())}
+        }
+
+
+# Process-wide registry every module records into
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.counter(name, help, labels)
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, help, labels, buckets)
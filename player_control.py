@@ -1,11 +1,22 @@
 # https://stackoverflow.com/questions/51775132/how-to-get-return-value-from-applescript-in-python
+import sys
+import time
 from subprocess import Popen, PIPE
 
+import metrics
+
+OSASCRIPT_SECONDS = metrics.histogram('lyricstamp_osascript_seconds', 'osascript calls by player_control function',
+                                      ('function', 'status'))
+
 
 def execute(script):
+    started = time.perf_counter()
     proc = Popen(['osascript', '-'], stdin=PIPE, stdout=PIPE,
                  stderr=PIPE, universal_newlines=True)
     result, error = proc.communicate(script)
+    # Labelled by the calling function (player_snapshot, play, ...), a fixed set
+    OSASCRIPT_SECONDS.observe(time.perf_counter() - started, sys._getframe(1).f_code.co_name,
+                              'ok' if proc.returncode == 0 else 'error')
     return result
 
 
@@ -80,4 +91,20 @@ def get_duration():
             get duration of current track
         end tell
     '''
-    return float(execute(script))
\ No newline at end of file
+    return float(execute(script))
+
+def player_snapshot():
+    """Get state, title, artist, position and duration in a single osascript call."""
+    script = '''
+        tell application "Music"
+            set s to player state as string
+            if s is "stopped" then return s
+            set t to current track
+            return s & linefeed & (name of t) & linefeed & (artist of t) & linefeed & (player position as string) & linefeed & (duration of t as string)
+        end tell
+    '''
+    fields = execute(script).rstrip('\n').split('\n')
+    if len(fields) < 5:
+        return fields[0] or 'stopped', '', '', 0.0, 0.0
+    state, title, artist, position, duration = fields[:5]
+    return state, title, artist, float(position), float(duration)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Player state service for LyricStamp.
+A single background poller owns the player connection and publishes a cached
+snapshot, so web routes can read the player state without spawning osascript.
+"""
+
+import abc
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, List, Optional, Tuple
+
+import player_control
+
+
+@dataclass(frozen=True)
+class PlayerSnapshot:
+    """Immutable view of the player at one sample time."""
+    title: str = ''
+    artist: str = ''
+    position: float = 0.0
+    duration: float = 0.0
+    state: str = 'stopped'  # playing, paused, stopped
+    sampled_at: float = 0.0  # time.monotonic() when the sample was taken
+    error: str = ''
+
+    @property
+    def is_playing(self) -> bool:
+        return self.state == 'playing'
+
+    def to_dict(self) -> dict:
+        return {
+            'title': self.title,
+            'artist': self.artist,
+            'position': self.position,
+            'duration': self.duration,
+            'state': self.state,
+            'sampled_at': self.sampled_at
+        }
+
+
+class PlayerBackend(abc.ABC):
+    """Interface every player backend implements."""
+    name = 'base'
+
+    @abc.abstractmethod
+    def snapshot(self) -> PlayerSnapshot:
+        ...
+
+    @abc.abstractmethod
+    def play(self):
+        ...
+
+    @abc.abstractmethod
+    def play_pause(self):
+        ...
+
+    @abc.abstractmethod
+    def set_position(self, position: float):
+        ...
+
+    @abc.abstractmethod
+    def next_track(self):
+        ...
+
+
+class AppleMusicBackend(PlayerBackend):
+    """Apple Music backend driven through player_control (osascript)."""
+    name = 'apple_music'
+
+    def snapshot(self) -> PlayerSnapshot:
+        started = time.monotonic()
+        state, title, artist, position, duration = player_control.player_snapshot()
+        # The position was read somewhere inside the osascript round trip
+        sampled_at = (started + time.monotonic()) / 2
+        return PlayerSnapshot(title=title, artist=artist, position=position,
+                              duration=duration, state=state,
+                              sampled_at=sampled_at)
+
+    def play(self):
+        player_control.play()
+
+    def play_pause(self):
+        player_control.play_pause()
+
+    def set_position(self, position: float):
+        player_control.set_player_position(position)
+
+    def next_track(self):
+        player_control.play_next()
+
+
+class SimulatedPlayer(PlayerBackend):
+    """In-process player that stands in for Apple Music in tests and benchmarks."""
+    name = 'simulated'
+
+    def __init__(self, tracks: Optional[List[Tuple[str, str, float]]] = None, autoplay: bool = False):
+        self.tracks = tracks or [('Simulated Song', 'LyricStamp', 240.0)]
+        self.track_index = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._base_position = 0.0
+        self._base_time = time.monotonic()
+        self._playing = autoplay
+
+    def _position(self, now: float) -> float:
+        position = self._base_position
+        if self._playing:
+            position += now - self._base_time
+        return min(position, self.tracks[self.track_index][2])
+
+    def snapshot(self) -> PlayerSnapshot:
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            title, artist, duration = self.tracks[self.track_index]
+            position = self._position(now)
+            if self._playing and position >= duration:
+                self._advance(now)
+                title, artist, duration = self.tracks[self.track_index]
+                position = 0.0
+            return PlayerSnapshot(title=title, artist=artist, position=position,
+                                  duration=duration,
+                                  state='playing' if self._playing else 'paused',
+                                  sampled_at=now)
+
+    def _advance(self, now: float):
+        self.track_index = (self.track_index + 1) % len(self.tracks)
+        self._base_position = 0.0
+        self._base_time = now
+
+    def play(self):
+        with self._lock:
+            self._base_position = 0.0
+            self._base_time = time.monotonic()
+            self._playing = True
+
+    def play_pause(self):
+        with self._lock:
+            now = time.monotonic()
+            self._base_position = self._position(now)
+            self._base_time = now
+            self._playing = not self._playing
+
+    def set_position(self, position: float):
+        with self._lock:
+            self._base_position = max(0.0, float(position))
+            self._base_time = time.monotonic()
+
+    def next_track(self):
+        with self._lock:
+            self._advance(time.monotonic())
+            self._playing = True
+
+
+class PositionModel:
+    """Extrapolates the player position between samples with a monotonic clock.
+
+    Each sample anchors (position, monotonic time, playing flag). Queries are
+    answered by extrapolating from the anchor; a seek, pause/play or track change
+    (or a sample that disagrees by more than resync_threshold) resets it.
+    `clock` must be the clock that samples' sampled_at is read from.
+    """
+
+    def __init__(self, resync_threshold: float = 0.25, clock: Callable[[], float] = time.monotonic):
+        self.resync_threshold = resync_threshold
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._anchor_position = 0.0
+        self._anchor_time = 0.0
+        self._playing = False
+        self._duration = 0.0
+        self._track = None
+        self.samples = 0
+        self.resyncs = 0
+        self._drift_count = 0
+        self._drift_total = 0.0
+        self._drift_max = 0.0
+
+    def _predict(self, now: float) -> float:
+        position = self._anchor_position
+        if self._playing:
+            position += now - self._anchor_time
+        if self._duration:
+            position = min(position, self._duration)
+        return position
+
+    def position(self, now: Optional[float] = None) -> float:
+        """Return the extrapolated position at `now` (default: the model's clock)."""
+        with self._lock:
+            return self._predict(self.clock() if now is None else now)
+
+    def observe(self, snapshot: PlayerSnapshot):
+        """Feed a real sample; records drift or resyncs on a discontinuity."""
+        with self._lock:
+            self.samples += 1
+            track = (snapshot.title, snapshot.artist)
+            continuous = (self._anchor_time and track == self._track
+                          and snapshot.is_playing == self._playing)
+            if continuous:
+                drift = self._predict(snapshot.sampled_at) - snapshot.position
+                if abs(drift) > self.resync_threshold:
+                    self.resyncs += 1
+                else:
+                    self._drift_count += 1
+                    self._drift_total += abs(drift)
+                    self._drift_max = max(self._drift_max, abs(drift))
+            elif self._anchor_time:
+                self.resyncs += 1
+            self._track = track
+            self._playing = snapshot.is_playing
+            self._duration = snapshot.duration
+            self._anchor_position = snapshot.position
+            self._anchor_time = snapshot.sampled_at
+
+    def error_estimate(self) -> float:
+        """Typical error of an extrapolated position, in seconds (the mean observed drift)."""
+        with self._lock:
+            return self._drift_total / self._drift_count if self._drift_count else 0.0
+
+    def reset(self, position: float):
+        """Re-anchor immediately after an explicit seek."""
+        with self._lock:
+            self.resyncs += 1
+            self._anchor_position = float(position)
+            self._anchor_time = self.clock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'samples': self.samples,
+                'resyncs': self.resyncs,
+                'mean_drift_ms': (self._drift_total / self._drift_count * 1000) if self._drift_count else 0.0,
+                'max_drift_ms': self._drift_max * 1000
+            }
+
+
+def create_backend(name: Optional[str] = None) -> PlayerBackend:
+    """Create a backend by name, or from LYRICSTAMP_PLAYER (default: Apple Music on macOS)."""
+    name = name or os.environ.get('LYRICSTAMP_PLAYER')
+    if not name:
+        name = 'apple_music' if sys.platform == 'darwin' else 'simulated'
+    if name == 'apple_music':
+        return AppleMusicBackend()
+    if name == 'simulated':
+        return SimulatedPlayer()
+    raise ValueError(f"Unknown player backend: {name}")
+
+
+class PlayerStateService:
+    """Polls a backend in the background and serves the latest snapshot in O(1).
+
+    The backend is sampled at a low rate; positions in between come from the
+    PositionModel, so fast pollers never cause an IPC round trip.
+    """
+
+    def __init__(self, backend: PlayerBackend, interval: float = 1.0):
+        self.backend = backend
+        self.interval = interval
+        self.model = PositionModel()
+        self._snapshot = PlayerSnapshot()
+        self._lock = threading.Lock()
+        # Serializes sampling, so a slow sample never overwrites a newer one
+        self._refresh_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the poller thread if it is not already running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='player-state', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self) -> PlayerSnapshot:
+        """Sample the backend now and publish the result."""
+        with self._refresh_lock:
+            try:
+                snapshot = self.backend.snapshot()
+                self.model.observe(snapshot)
+            except Exception as e:
+                snapshot = replace(self._snapshot, error=str(e), sampled_at=time.monotonic())
+            self._snapshot = snapshot
+            return snapshot
+
+    @property
+    def ready(self) -> bool:
+        """Whether the backend has been sampled at least once (successfully or not)."""
+        return bool(self._snapshot.sampled_at)
+
+    def snapshot(self, at: Optional[float] = None) -> PlayerSnapshot:
+        """Return the latest snapshot with the position extrapolated to now.
+
+        `at` (a time.monotonic() value, e.g. a key press reported by a client)
+        extrapolates to that moment instead.
+        """
+        if self._thread is None:
+            self.start()
+        snapshot = self._snapshot
+        if not snapshot.sampled_at:
+            # Before the first poll; concurrent first requests share one sample
+            with self._refresh_lock:
+                snapshot = self._snapshot if self._snapshot.sampled_at else self.refresh()
+        if snapshot.error:
+            return snapshot
+        now = time.monotonic() if at is None else at
+        return replace(snapshot, position=self.model.position(now), sampled_at=now)
+
+    def _control(self, action, *args):
+        action(*args)
+        self.refresh()
+        self._wake.set()
+
+    def play(self):
+        self._control(self.backend.play)
+
+    def play_pause(self):
+        self._control(self.backend.play_pause)
+
+    def set_position(self, position: float):
+        self.backend.set_position(position)
+        self.model.reset(position)
+        self.refresh()
+        self._wake.set()
+
+    def next_track(self):
+        self._control(self.backend.next_track)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling for LyricStamp's hot paths.
+Code marked with @profiled(region) (Flask request handling and the AI
+pipeline) is profiled while a session runs, in one of two modes:
+- sample: a background thread snapshots the stacks of the threads inside a
+  marked region every few milliseconds; output is collapsed stacks for
+  flamegraph.pl or speedscope, or a text summary. Covers every thread at
+  once (request threads, AI batch workers) with low, steady overhead.
+- cprofile: each marked call runs under cProfile and the results are merged;
+  output is a pstats dump for snakeviz/pstats, or a text summary.
+
+With no session running a marked call costs one global lookup.
+LYRICSTAMP_PROFILE enables it: `sample` or `cprofile` profiles from startup
+until exit (written to LYRICSTAMP_PROFILE_OUTPUT if set), and any other
+non-empty value (e.g. `on`) only allows on-demand sessions via start().
+"""
+
+import atexit
+import cProfile
+import functools
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+MODES = ('sample', 'cprofile')
+FORMATS = {'sample': ('collapsed', 'text'), 'cprofile': ('pstats', 'text')}
+
+
+class ProfilingBusy(Exception):
+    """Raised when a session is started while another one is running."""
+
+
+class SamplingSession:
+    """Periodic stack samples of the threads inside profiled regions."""
+
+    mode = 'sample'
+
+    def __init__(self, interval: float = 0.005, all_threads: bool = False):
+        self.interval = interval
+        self.all_threads = all_threads
+        self.started = time.time()
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        # Thread ident -> stack of region names it is currently inside
+        self._regions: Dict[int, List[str]] = {}
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self, region: str, func, args, kwargs):
+        ident = threading.get_ident()
+        regions = self._regions.setdefault(ident, [])
+        regions.append(region)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            regions.pop()
+            if not regions:
+                self._regions.pop(ident, None)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()} if self.all_threads else {}
+            frames = sys._current_frames()
+            sampled = Counter()
+            for ident, frame in frames.items():
+                # A copy: the owning thread may leave its region while we walk its stack
+                regions = list(self._regions.get(ident) or ())
+                if ident == me or not (regions or self.all_threads):
+                    continue
+                stack, entry = [], None
+                while frame is not None:
+                    if regions and frame.f_code is _RUN_CODE:
+                        # The last match going up is the outermost region's entry
+                        entry = len(stack)
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if entry is not None:
+                    # Drop the thread's frames above the region (bootstrap, server loop)
+                    del stack[entry:]
+                # The root is the outermost region (or the thread name), so each hot path is its own tower
+                stack.append(regions[0] if regions else names.get(ident, 'thread'))
+                sampled[';'.join(reversed(stack))] += 1
+            del frames
+            with self._lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        """One `frame;frame;frame count` line per distinct stack (Brendan Gregg's collapsed format)."""
+        with self._lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def text(self, limit: int = 40) -> str:
+        """Functions ranked by the share of samples they were on the stack (total) and on top (self)."""
+        with self._lock:
+            stacks = list(self.stacks.items())
+            samples = self.samples
+        total, own = Counter(), Counter()
+        for stack, count in stacks:
+            frames = stack.split(';')
+            for frame in set(frames[1:]):
+                total[frame] += count
+            own[frames[-1]] += count
+        observed = sum(count for _, count in stacks) or 1
+        lines = [f"{samples} sampling rounds every {self.interval * 1000:.1f} ms, {observed} thread samples",
+                 f"{'total':>7} {'self':>7}  function"]
+        for frame, count in total.most_common(limit):
+            lines.append(f"{count / observed:7.1%} {own[frame] / observed:7.1%}  {frame}")
+        return '\n'.join(lines) + '\n'
+
+    def render(self, format: str):
+        if format == 'text':
+            return self.text(), 'text/plain'
+        return self.collapsed(), 'text/plain'
+
+
+_RUN_CODE = SamplingSession.run.__code__
+
+
+class CProfileSession:
+    """cProfile around each profiled call, merged into one set of stats."""
+
+    mode = 'cprofile'
+
+    def __init__(self):
+        self.started = time.time()
+        self.calls = 0
+        self.skipped = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def run(self, region: str, func, args, kwargs):
+        if getattr(self._local, 'active', False):
+            # Already inside a profiled call on this thread (e.g. the AI pipeline under a request)
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler owns the interpreter (Python 3.12+ allows only one at a time)
+            with self._lock:
+                self.skipped += 1
+            return func(*args, **kwargs)
+        self._local.active = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._local.active = False
+            with self._lock:
+                self.calls += 1
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+
+    def pstats_dump(self) -> bytes:
+        """The merged stats in the format pstats.Stats(path) and snakeviz read."""
+        with self._lock:
+            return marshal.dumps(self._stats.stats if self._stats else {})
+
+    def text(self, limit: int = 40) -> str:
+        output = io.StringIO()
+        with self._lock:
+            output.write(f"{self.calls} profiled calls ({self.skipped} skipped)\n")
+            if self._stats is not None:
+                self._stats.stream = output
+                self._stats.sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+
+    def render(self, format: str):
+        if format == 'text':
+            return self.text(), 'text/plain'
+        return self.pstats_dump(), 'application/octet-stream'
+
+
+_session = None
+_session_lock = threading.Lock()
+# Set from LYRICSTAMP_PROFILE by start_from_env(); on-demand sessions need it
+enabled = False
+continuous = False
+
+
+def profiled(region: str):
+    """Decorator marking a hot path; a no-op unless a profiling session is running."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _session
+            if session is None:
+                return func(*args, **kwargs)
+            return session.run(region, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def start(mode: str = 'sample', interval: float = 0.005, all_threads: bool = False):
+    """Start a session; raises ProfilingBusy if one is already running."""
+    global _session
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    with _session_lock:
+        if _session is not None:
+            raise ProfilingBusy(f"A {_session.mode} profiling session is already running")
+        session = SamplingSession(interval, all_threads) if mode == 'sample' else CProfileSession()
+        session.start()
+        _session = session
+    return session
+
+
+def stop(session=None):
+    """Stop the running session (only if it is `session`, when given) and return it, or None."""
+    global _session
+    with _session_lock:
+        if _session is None or (session is not None and _session is not session):
+            return None
+        session, _session = _session, None
+    session.stop()
+    return session
+
+
+def current():
+    return _session
+
+
+def profile_for(seconds: float, mode: str = 'sample', interval: float = 0.005, all_threads: bool = False):
+    """Run a session for `seconds` and return it, stopped."""
+    session = start(mode, interval, all_threads)
+    try:
+        time.sleep(seconds)
+    finally:
+        stop(session)
+    return session
+
+
+def write_output(session, path: str):
+    """Write a session in its default format (collapsed stacks or a pstats dump)."""
+    data, _ = session.render(FORMATS[session.mode][0])
+    with open(path, 'wb') as f:
+        f.write(data.encode('utf-8') if isinstance(data, str) else data)
+
+
+def start_from_env():
+    """Apply LYRICSTAMP_PROFILE: enable on-demand sessions, or profile this whole process."""
+    global enabled, continuous
+    setting = os.environ.get('LYRICSTAMP_PROFILE', '').strip().lower()
+    if not setting or setting in ('0', 'off', 'false'):
+        return None
+    enabled = True
+    if setting not in MODES:
+        return None
+    interval = float(os.environ.get('LYRICSTAMP_PROFILE_INTERVAL_MS', 5)) / 1000
+    session = start(setting, interval)
+    continuous = True
+    output = os.environ.get('LYRICSTAMP_PROFILE_OUTPUT')
+    if output:
+        atexit.register(lambda: write_output(stop() or session, output))
+    return session
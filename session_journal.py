@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Crash-safe autosave journal for timing sessions.
+Every stamp is appended to a JSON-lines journal by a background flusher that
+batches writes and fsyncs once per batch, so the stamping request only pays
+for a list append. On startup the journal is replayed to recover sessions a
+restart would have lost, and it is periodically compacted: changed sessions
+are handed to an autosave callback and the journal is rewritten as one
+snapshot record per live session.
+
+Several server processes can share one session store, so each process owns
+its own journal file (a "slot": sessions.journal, sessions.1.journal, ...)
+for as long as it holds the slot's lock file. Compaction only ever rewrites
+the owner's file, and recovery also adopts the slots of processes that are
+no longer running.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import atomic_io
+
+
+# Session fields a snapshot record carries; recovery restores exactly these
+SNAPSHOT_KEYS = ('lines', 'timestamps', 'current_line', 'output_filename', 'start_time', 'is_recording')
+
+
+def default_journal_path() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'lyricstamp', 'sessions.journal')
+
+
+def slot_path(path: str, slot: int) -> str:
+    """Journal file of one slot: slot 0 is `path` itself, slot N inserts .N before the extension."""
+    if slot == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{slot}{ext}"
+
+
+def _slot_paths(path: str) -> List[str]:
+    """Every slot journal on disk for the base `path`."""
+    directory, name = os.path.split(path)
+    root, ext = os.path.splitext(name)
+    pattern = re.compile(rf'{re.escape(root)}\.\d+{re.escape(ext)}')
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, n) for n in sorted(names) if n == name or pattern.fullmatch(n)]
+
+
+def _try_lock(path: str) -> Optional[int]:
+    """Take an exclusive lock on `path` without waiting.
+
+    Returns the descriptor holding the lock (released when it is closed, or
+    when the process dies), or None if another holder has it.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class SessionJournal:
+    """Append-only log of session changes with an in-memory mirror of each session.
+
+    `on_compact(session_id, state)` is called during compaction for every
+    session changed since the last one; `state` holds the SNAPSHOT_KEYS.
+    `path` is the base path; `self.path` becomes this process's slot once
+    it writes or recovers.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_interval: float = 0.2,
+                 compact_interval: float = 30.0, ttl: float = 12 * 60 * 60,
+                 on_compact: Optional[Callable[[str, dict], None]] = None, fsync: bool = True):
+        self.base_path = os.path.abspath(path or default_journal_path())
+        self.path = self.base_path
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.ttl = ttl
+        self.on_compact = on_compact
+        self.fsync = fsync
+        self.records_written = 0
+        self.flushes = 0
+        self._states: Dict[str, dict] = {}
+        self._dirty = set()
+        self._buffer: List[bytes] = []
+        self._cond = threading.Condition()
+        self._fd = None
+        self._lock_fd = None
+        self._adopted = []
+        self._thread = None
+        self._closed = False
+        self._last_compact = time.monotonic()
+        self._since_compact = 0
+
+    # Recording; each call only updates the mirror and queues one line
+
+    def record_session(self, session_id: str, session: dict):
+        """Snapshot a whole session (new session, or lines replaced by AI processing)."""
+        self._append(session_id, dict({key: session[key] for key in SNAPSHOT_KEYS}, op='session'))
+
+    def record_stamp(self, session_id: str, line: int, timestamp: str, current_line: int):
+        self._append(session_id, {'op': 'stamp', 'line': line, 'timestamp': timestamp,
+                                  'current_line': current_line})
+
+    def record_timing(self, session_id: str, start_time: float, is_recording: bool):
+        """Timing started (wall-clock `start_time`) or stopped, so a restart mid-line can still stop it."""
+        self._append(session_id, {'op': 'timing', 'start_time': start_time, 'is_recording': is_recording})
+
+    def record_cursor(self, session_id: str, current_line: int):
+        self._append(session_id, {'op': 'cursor', 'current_line': current_line})
+
+    def record_saved(self, session_id: str):
+        """The user saved the session; compaction has nothing to write for it."""
+        self._append(session_id, {'op': 'saved'})
+
+    def _append(self, session_id: str, record: dict):
+        record['session'] = session_id
+        record['time'] = time.time()
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._cond:
+            if self._closed:
+                return
+            self._apply(record)
+            self._buffer.append(line)
+            self._since_compact += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='session-journal', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _apply(self, record: dict):
+        """Replay one record onto the mirror; unknown sessions or ops are ignored."""
+        session_id, op = record.get('session'), record.get('op')
+        if op == 'session':
+            self._states[session_id] = {
+                'lines': list(record['lines']),
+                'timestamps': list(record['timestamps']),
+                'current_line': record['current_line'],
+                'output_filename': record['output_filename'],
+                # Absent from journals written before timing was recorded
+                'start_time': record.get('start_time', 0),
+                'is_recording': record.get('is_recording', False),
+                'updated': record['time']
+            }
+            self._dirty.add(session_id)
+            return
+        state = self._states.get(session_id)
+        if state is None:
+            return
+        state['updated'] = record['time']
+        if op == 'stamp':
+            if 0 <= record['line'] < len(state['timestamps']):
+                state['timestamps'][record['line']] = record['timestamp']
+            state['current_line'] = record['current_line']
+            self._dirty.add(session_id)
+        elif op == 'cursor':
+            state['current_line'] = record['current_line']
+        elif op == 'timing':
+            state['start_time'] = record['start_time']
+            state['is_recording'] = record['is_recording']
+        elif op == 'saved':
+            self._dirty.discard(session_id)
+
+    # Recovery
+
+    def recover(self) -> Dict[str, dict]:
+        """Replay this process's journal and any orphaned slots; return the recovered sessions by ID.
+
+        A slot whose lock can be taken belongs to a process that has exited:
+        its sessions are folded into this process's journal and its file is
+        removed by the next compaction. A torn final line from a crash
+        mid-write is skipped and cut off.
+        """
+        self._claim()
+        for path in [self.path] + [p for p in _slot_paths(self.base_path) if p != self.path]:
+            if path != self.path:
+                lock_fd = _try_lock(path + '.lock')
+                if lock_fd is None:
+                    continue
+                self._adopted.append((path, lock_fd))
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            if path == self.path and data and not data.endswith(b'\n'):
+                # Cut the torn record off, or the next append would be glued onto it
+                os.truncate(path, data.rfind(b'\n') + 1)
+            with self._cond:
+                for raw in data.splitlines():
+                    try:
+                        self._apply(json.loads(raw))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        with self._cond:
+            self._expire()
+            # Adopted sessions have to reach this slot's file before the orphans are removed
+            self._since_compact += len(self._adopted)
+            return {session_id: dict(state) for session_id, state in self._states.items()}
+
+    def forget(self, session_id: str):
+        """Stop carrying a recovered session, e.g. one the shared session store already has."""
+        with self._cond:
+            self._states.pop(session_id, None)
+            self._dirty.discard(session_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for session_id in [sid for sid, state in self._states.items() if state['updated'] < cutoff]:
+            del self._states[session_id]
+            self._dirty.discard(session_id)
+
+    # Background writer
+
+    def _claim(self):
+        """Lock the first free slot and make it self.path; the lock is held until close()."""
+        with self._cond:
+            if self._lock_fd is not None:
+                return
+            os.makedirs(os.path.dirname(self.base_path), exist_ok=True)
+            slot = 0
+            while self._lock_fd is None:
+                path = slot_path(self.base_path, slot)
+                self._lock_fd = _try_lock(path + '.lock')
+                slot += 1
+            self.path = path
+
+    def _open(self):
+        self._claim()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _write(self, chunks: List[bytes]):
+        if self._fd is None:
+            self._open()
+        os.write(self._fd, b''.join(chunks))
+        if self.fsync:
+            os.fsync(self._fd)
+        self.records_written += len(chunks)
+        self.flushes += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._buffer and not self._closed:
+                    self._cond.wait(self.compact_interval)
+                closed = self._closed
+            # Let a burst of stamps accumulate into one write and one fsync
+            if not closed:
+                time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if closed:
+                    return
+                if self._since_compact and time.monotonic() - self._last_compact >= self.compact_interval:
+                    self.compact()
+            except OSError as e:
+                print(f"Session journal write failed: {e}")
+
+    def flush(self):
+        with self._cond:
+            chunks, self._buffer = self._buffer, []
+        if chunks:
+            self._write(chunks)
+
+    def compact(self):
+        """Write changed sessions out through on_compact and shrink the journal to snapshots."""
+        self._last_compact = time.monotonic()
+        self._claim()
+        self.flush()
+        # Records queued after this point are appended to the new file; replaying
+        # them on top of the snapshot is harmless because every record is idempotent
+        with self._cond:
+            self._since_compact = 0
+            self._expire()
+            dirty = {sid: dict(self._states[sid], timestamps=list(self._states[sid]['timestamps']))
+                     for sid in self._dirty}
+            self._dirty.clear()
+            snapshot = [
+                (json.dumps({'op': 'session', 'session': session_id, 'time': state['updated'],
+                             **{key: state[key] for key in SNAPSHOT_KEYS}},
+                            ensure_ascii=False) + '\n').encode('utf-8')
+                for session_id, state in self._states.items()
+            ]
+        for session_id, state in dirty.items():
+            if self.on_compact and any(state['timestamps']):
+                try:
+                    self.on_compact(session_id, state)
+                except Exception as e:
+                    print(f"Session journal compaction failed for {session_id}: {e}")
+        # Only this thread writes this slot's file, so appenders never wait on the rewrite
+        atomic_io.atomic_write(self.path, b''.join(snapshot), fsync=self.fsync)
+        for path, lock_fd in self._adopted:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            os.close(lock_fd)
+        self._adopted = []
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def close(self):
+        """Flush everything queued and stop the writer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread:
+            thread.join()
+        else:
+            self.flush()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        for _, lock_fd in self._adopted:
+            os.close(lock_fd)
+        self._adopted = []
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def stats(self) -> dict:
+        return {
+            'sessions': len(self._states),
+            'pending': len(self._buffer),
+            'records_written': self.records_written,
+            'flushes': self.flushes
+        }
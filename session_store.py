@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Timing session storage for LyricStamp.
+Each browser tab or user gets its own session, addressed by an ID carried in a
+cookie or header. Stores hand out one session at a time under a per-session
+lock and expire sessions that have been idle longer than their TTL. Sessions
+live in memory by default; the SQLite store shares them between worker
+processes, and any class implementing SessionStore can be plugged in.
+"""
+
+import abc
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_TTL = 12 * 60 * 60
+# How often idle sessions are swept, at most
+EXPIRE_INTERVAL = 60.0
+
+
+def new_session() -> dict:
+    """Fresh state for a timing session."""
+    return {
+        'lines': [],
+        'timestamps': [],
+        'stamp_errors': [],  # estimated error of each stamp in ms, None if unknown
+        'current_line': 0,
+        'is_recording': False,
+        'start_time': 0,
+        'output_filename': '',
+        'audio_file': None,
+        'ai_job_id': None
+    }
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+class SessionStore(abc.ABC):
+    """Interface for session backends.
+
+    Subclasses implement load/save/delete/ids/expire; locked() is the one way
+    request handlers read and modify a session.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_lock = threading.Lock()
+        self._last_expired = 0.0
+
+    @abc.abstractmethod
+    def load(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abc.abstractmethod
+    def save(self, session_id: str, data: dict):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abc.abstractmethod
+    def ids(self) -> List[str]:
+        ...
+
+    @abc.abstractmethod
+    def expire(self) -> int:
+        """Drop sessions idle for longer than the TTL; returns how many were dropped."""
+
+    def exists(self, session_id: Optional[str]) -> bool:
+        return bool(session_id) and self.load(session_id) is not None
+
+    def create(self) -> str:
+        session_id = new_session_id()
+        self.save(session_id, new_session())
+        return session_id
+
+    def _lock_for(self, session_id: str) -> threading.RLock:
+        with self._locks_lock:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = self._locks[session_id] = threading.RLock()
+            return lock
+
+    def _maybe_expire(self):
+        now = time.monotonic()
+        if now - self._last_expired < EXPIRE_INTERVAL:
+            return
+        self._last_expired = now
+        if self.expire():
+            with self._locks_lock:
+                live = set(self.ids())
+                for session_id in [sid for sid in self._locks if sid not in live]:
+                    del self._locks[session_id]
+
+    @contextmanager
+    def locked(self, session_id: str) -> Iterator[dict]:
+        """Yield the session (created if missing) and save it when the block exits."""
+        self._maybe_expire()
+        with self._lock_for(session_id):
+            data = self.load(session_id)
+            if data is None:
+                data = new_session()
+            yield data
+            self.save(session_id, data)
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions held in this process; fastest, but not shared between workers."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        super().__init__(ttl)
+        self._sessions: Dict[str, dict] = {}
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            data = self._sessions.get(session_id)
+            if data is not None:
+                self._touched[session_id] = time.time()
+            return data
+
+    def save(self, session_id: str, data: dict):
+        with self._lock:
+            self._sessions[session_id] = data
+            self._touched[session_id] = time.time()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._touched.pop(session_id, None)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def expire(self) -> int:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            stale = [sid for sid, touched in self._touched.items() if touched < cutoff]
+            for session_id in stale:
+                del self._sessions[session_id]
+                del self._touched[session_id]
+        return len(stale)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions stored as JSON rows, shared by every worker process using the file.
+
+    locked() holds a write transaction for the duration of the block, so
+    workers in other processes see each update whole and in order.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL):
+        super().__init__(ttl)
+        if not path:
+            cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+            path = os.path.join(cache_home, 'lyricstamp', 'sessions.sqlite')
+        self.path = path
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)')
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite's own locking coordinates processes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Optional[dict]:
+        row = self._connection().execute(
+            'SELECT data FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, data: dict):
+        self._connection().execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                                   (session_id, json.dumps(data), time.time()))
+
+    def delete(self, session_id: str):
+        self._connection().execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def ids(self) -> List[str]:
+        return [row[0] for row in self._connection().execute('SELECT id FROM sessions')]
+
+    def expire(self) -> int:
+        cursor = self._connection().execute('DELETE FROM sessions WHERE updated < ?',
+                                            (time.time() - self.ttl,))
+        return cursor.rowcount
+
+    @contextmanager
+    def locked(self, session_id: str) -> Iterator[dict]:
+        self._maybe_expire()
+        with self._lock_for(session_id):
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                data = self.load(session_id)
+                if data is None:
+                    data = new_session()
+                yield data
+                self.save(session_id, data)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+
+def create_store(spec: Optional[str] = None, ttl: Optional[float] = None) -> SessionStore:
+    """Create a store from a spec, or from LYRICSTAMP_SESSION_STORE (default: memory).
+
+    Specs: 'memory', 'sqlite' (default path), 'sqlite:/path/to/file', or
+    'package.module:ClassName' for a custom SessionStore subclass.
+    LYRICSTAMP_SESSION_TTL sets the idle timeout in seconds.
+    """
+    spec = spec or os.environ.get('LYRICSTAMP_SESSION_STORE') or 'memory'
+    if ttl is None:
+        ttl = float(os.environ.get('LYRICSTAMP_SESSION_TTL', DEFAULT_TTL))
+    if spec == 'memory':
+        return MemorySessionStore(ttl)
+    if spec == 'sqlite' or spec.startswith('sqlite:'):
+        return SQLiteSessionStore(spec[len('sqlite:'):] or None, ttl)
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown session store: {spec}")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(store_class, type) and issubclass(store_class, SessionStore)):
+        raise ValueError(f"{spec} is not a SessionStore subclass")
+    return store_class(ttl=ttl)
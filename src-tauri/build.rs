@@ -14,12 +14,11 @@ fn main() {
     let resources_dir = Path::new(&out_dir).join("resources");
     fs::create_dir_all(&resources_dir).unwrap();
     
-    // Copy Python files
-    let python_files = ["web_lyricstamp.py", "player_control.py", "ai_postprocess.py"];
-    for file in &python_files {
-        let src = project_root.join(file);
-        let dst = resources_dir.join(file);
-        if src.exists() {
+    // Copy Python files (the server imports its sibling modules)
+    for entry in fs::read_dir(project_root).unwrap() {
+        let src = entry.unwrap().path();
+        if src.extension().map_or(false, |ext| ext == "py") {
+            let dst = resources_dir.join(src.file_name().unwrap());
             fs::copy(&src, &dst).unwrap();
         }
     }
@@ -0,0 +1,170 @@
+"""
+Tests for the ai_postprocess helpers that do not need a model: parsing and
+rendering .lrcx files around the AI-inserted lines.
+"""
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ai_postprocess
+
+TRANSLATED = (
+    "[ti:Song]\n"
+    "[00:01.000]line one\n"
+    "[00:01.000][tr:zh-Hans]trans one\n"
+    "[00:02.000]line two\n"
+    "[00:02.000][tr:zh-Hans]trans two\n"
+    "[00:03.000]line three\n"
+)
+
+STREAMED = ('```json\n[\n  {"id": 1, "romaji": "say \\"hi\\" {not a brace}"},\n'
+            '  {"id": 2, "romaji": "back\\\\slash \\u00e9t\\u00e9", "notes": ["a]", {"b": "}"}]}\n]\n```')
+
+
+def test_render_round_trips_translation_rows(tmp_path):
+    path = tmp_path / 'song.lrcx'
+    path.write_text(TRANSLATED, encoding='utf-8')
+    timestamps, lyrics = ai_postprocess.parse_lrcx_file(str(path))
+    assert ai_postprocess.render_enhanced_lrcx(timestamps, lyrics, list(lyrics)) == TRANSLATED
+
+
+def test_render_inserted_lines_repeat_previous_prefix(tmp_path):
+    path = tmp_path / 'song.lrcx'
+    path.write_text(TRANSLATED, encoding='utf-8')
+    timestamps, lyrics = ai_postprocess.parse_lrcx_file(str(path))
+    enhanced = []
+    for lyric in lyrics:
+        enhanced.append(lyric)
+        if lyric.startswith('line'):
+            enhanced.append(f"[tr]{lyric.upper()}")
+    assert ai_postprocess.render_enhanced_lrcx(timestamps, lyrics, enhanced) == (
+        "[ti:Song]\n"
+        "[00:01.000]line one\n"
+        "[00:01.000][tr]LINE ONE\n"
+        "[00:01.000][tr:zh-Hans]trans one\n"
+        "[00:02.000]line two\n"
+        "[00:02.000][tr]LINE TWO\n"
+        "[00:02.000][tr:zh-Hans]trans two\n"
+        "[00:03.000]line three\n"
+        "[00:03.000][tr]LINE THREE\n"
+    )
+
+
+def test_batch_keeps_timestamps_of_translation_rows(tmp_path, monkeypatch):
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+    from mock_llm import MockLLMServer
+
+    source = tmp_path / 'song.lrcx'
+    source.write_text(TRANSLATED, encoding='utf-8')
+    with MockLLMServer(latency=0) as server:
+        monkeypatch.setenv('OLLAMA_URL', server.url)
+        counts = ai_postprocess.process_library(
+            [str(source)], include_kanji=True, use_ollama=True, use_cache=False,
+            manifest_path=str(tmp_path / 'manifest.jsonl'), progress_stream=io.StringIO())
+    assert counts['done'] == 1
+    assert (tmp_path / 'song_enhanced.lrcx').read_text(encoding='utf-8') == (
+        "[ti:Song]\n"
+        "[00:01.000]line one\n"
+        "[00:01.000][tr]romaji line one\n"
+        "[00:01.000][tr:zh-Hans]trans one\n"
+        "[00:02.000]line two\n"
+        "[00:02.000][tr]romaji line two\n"
+        "[00:02.000][tr:zh-Hans]trans two\n"
+        "[00:03.000]line three\n"
+        "[00:03.000][tr]romaji line three\n"
+    )
+
+
+def test_streaming_parser_every_split_point():
+    expected = json.loads(STREAMED[STREAMED.index('['):STREAMED.rindex(']') + 1])
+    assert expected[1]['romaji'] == 'back\\slash \u00e9t\u00e9'
+    for split in range(len(STREAMED) + 1):
+        parser = ai_postprocess.StreamingJSONArrayParser()
+        objects = parser.feed(STREAMED[:split]) + parser.feed(STREAMED[split:])
+        parser.close()
+        assert objects == expected, split
+        assert parser.finished
+
+
+def test_streaming_parser_one_character_at_a_time():
+    parser = ai_postprocess.StreamingJSONArrayParser()
+    seen = []
+    for position, char in enumerate(STREAMED):
+        for item in parser.feed(char):
+            seen.append((item['id'], STREAMED[position]))
+    # Each object is returned on its own closing brace, before the array ends
+    assert seen == [(1, '}'), (2, '}')]
+
+
+@pytest.mark.parametrize('text', [
+    '[{"id": 1} x {"id": 2}]',
+    'x' * 300 + '[{"id": 1}]',
+])
+def test_streaming_parser_rejects_malformed_responses(text):
+    parser = ai_postprocess.StreamingJSONArrayParser()
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed(text)
+
+
+def test_streaming_parser_close_without_array():
+    parser = ai_postprocess.StreamingJSONArrayParser()
+    assert parser.feed('Sorry, I cannot help with that.') == []
+    with pytest.raises(json.JSONDecodeError):
+        parser.close()
+
+
+def test_rate_limiter_halves_on_429_and_recovers():
+    limiter = ai_postprocess.AdaptiveRateLimiter(8)
+    for expected in (4, 2, 1, 1):
+        limiter.rate_limited(0)
+        assert limiter.limit == expected
+    for expected in (2, 3):
+        limiter.acquire()
+        limiter.release()
+        assert limiter.limit == expected
+    # A failed request does not count towards recovery
+    limiter.acquire()
+    limiter.release(success=False)
+    assert limiter.limit == 3
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8
+
+
+def test_rate_limiter_waits_out_retry_after():
+    limiter = ai_postprocess.AdaptiveRateLimiter(4)
+    limiter.rate_limited(0.2)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+    limiter.release()
+
+
+def test_rate_limiter_bounds_requests_in_flight_after_backoff():
+    limiter = ai_postprocess.AdaptiveRateLimiter(2)
+    limiter.rate_limited(0)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def second():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(5)
+    thread.join()
+    limiter.release()
+    assert limiter.active == 0
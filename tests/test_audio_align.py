@@ -0,0 +1,48 @@
+"""
+Tests for audio_align on synthetic feature envelopes, so no audio decoding
+is needed.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import audio_align
+
+
+def envelope(onsets, sung, total, seed=0):
+    """Features of a track that is quiet except for `sung` seconds of vocals from each onset."""
+    rate = audio_align.FRAME_RATE
+    rng = np.random.default_rng(seed)
+    energy = 0.2 + 0.1 * rng.random(int(total * rate))
+    onset = 0.05 * rng.random(int(total * rate))
+    for start, length in zip(onsets, sung):
+        frame = int(start * rate)
+        energy[frame:frame + int(length * rate)] += 5.0
+        onset[frame] += 3.0
+    return audio_align.AudioFeatures(energy.astype(np.float32), onset.astype(np.float32))
+
+
+def test_recovers_known_line_onsets():
+    lines = ['la la la', 'la la la la la la', 'la la', 'la la la la', 'la la la', 'la la la la la']
+    onsets, sung, t = [], [], 2.0
+    for line in lines:
+        onsets.append(t)
+        sung.append(audio_align.line_weight(line) * 0.9)
+        t += sung[-1] + 0.8
+    proposals = audio_align.align(envelope(onsets, sung, t + 3.0), lines)
+    assert np.allclose([p.time for p in proposals], onsets, atol=0.05)
+    assert not any(p.suspect for p in proposals)
+
+
+def test_many_lines_stay_in_order():
+    lines = ['la la la'] * 300
+    onsets = [2.0 + 3.5 * i for i in range(len(lines))]
+    proposals = audio_align.align(envelope(onsets, [2.7] * len(lines), onsets[-1] + 5.0), lines)
+    times = [p.time for p in proposals]
+    assert times == sorted(times)
+    assert np.allclose(times, onsets, atol=0.05)
@@ -0,0 +1,42 @@
+"""
+Tests for audio_cache on a generated WAV file (no ffmpeg needed).
+"""
+
+import os
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import audio_cache
+
+
+@pytest.fixture
+def audio(tmp_path):
+    rate = 8000
+    samples = (np.sin(np.arange(rate * 4) * 0.05) * 20000).astype('<i2')
+    path = tmp_path / 'tone.wav'
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    return audio_cache.PCMCache(str(tmp_path / 'cache')).open(str(path))
+
+
+@pytest.mark.parametrize('start, expected', [(-5.0, 0.0), (1.0, 1.0), (99.0, None)])
+def test_peaks_report_the_start_they_used(audio, start, expected):
+    level, per_second, first, rows = audio.peaks(start, None, 100)
+    if expected is None:
+        expected = audio.duration
+        assert len(rows) == 0
+    assert first == pytest.approx(expected, abs=1 / per_second)
+    assert first * per_second == pytest.approx(round(first * per_second))
+    # The rows returned are the ones starting at `first`
+    whole = audio.peak_levels[level]
+    offset = int(round(first * per_second))
+    assert np.array_equal(rows, whole[offset:offset + len(rows)])
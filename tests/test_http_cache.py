@@ -0,0 +1,95 @@
+"""
+Tests for http_cache.ResponseCache through the Flask test client:
+conditional GET and content-encoding negotiation.
+"""
+
+import gzip
+import os
+import sys
+from email.utils import formatdate
+
+import pytest
+from flask import Flask, request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import http_cache
+
+MODIFIED = 1_700_000_000.0
+
+
+@pytest.fixture
+def cache():
+    return http_cache.ResponseCache(max_entries=2)
+
+
+@pytest.fixture
+def client(cache):
+    app = Flask(__name__)
+    builds = app.builds = []
+
+    @app.route('/<name>')
+    def page(name):
+        size = int(request.args.get('size', 10))
+
+        def build():
+            builds.append(name)
+            return {'name': name, 'text': 'x' * size}
+
+        return cache.respond(cache.get_json(name, build, last_modified=MODIFIED), request)
+
+    return app.test_client()
+
+
+def test_body_is_built_once(client, cache):
+    first = client.get('/song')
+    second = client.get('/song')
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == {'name': 'song', 'text': 'x' * 10}
+    assert second.data == first.data
+    assert client.application.builds == ['song']
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert first.headers['Vary'] == 'Accept-Encoding'
+    assert cache.stats()['hits'] == 1
+
+
+def test_if_none_match_gets_304(client, cache):
+    etag = client.get('/song').headers['ETag']
+    response = client.get('/song', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert cache.stats()['not_modified'] == 1
+    assert client.get('/song', headers={'If-None-Match': '"other"'}).status_code == 200
+    assert client.get('/song', headers={'If-None-Match': '*'}).status_code == 304
+
+
+def test_if_modified_since(client):
+    assert client.get('/song', headers={'If-Modified-Since': formatdate(MODIFIED, usegmt=True)}).status_code == 304
+    assert client.get('/song', headers={'If-Modified-Since': formatdate(MODIFIED - 60, usegmt=True)}).status_code == 200
+
+
+def test_gzip_negotiation(client, monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    plain = client.get('/song?size=5000')
+    zipped = client.get('/song?size=5000', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert len(zipped.data) < len(plain.data)
+    # Each encoding has its own ETag, but either one revalidates the content
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    assert client.get('/song?size=5000', headers={'If-None-Match': zipped.headers['ETag']}).status_code == 304
+
+
+def test_small_bodies_are_not_compressed(client):
+    response = client.get('/song', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_least_recently_used_entry_is_evicted(client, cache):
+    for name in ('a', 'b', 'a', 'c', 'a', 'b'):
+        client.get(f'/{name}')
+    assert client.application.builds == ['a', 'b', 'c', 'b']
+    assert cache.stats()['entries'] == 2
@@ -0,0 +1,56 @@
+"""
+Round-trip tests for lrc_parser: tokenize -> dumps must reproduce every file in
+benchmarks/corpus exactly, including blank lines, whitespace and CRLF endings.
+"""
+
+import glob
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lrc_parser
+from lyrics_timeline import Timeline
+
+CORPUS = sorted(glob.glob(os.path.join(ROOT, 'benchmarks', 'corpus', '*.lrcx')))
+
+
+@pytest.mark.parametrize('path', CORPUS, ids=os.path.basename)
+def test_corpus_round_trip(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+    assert lrc_parser.dumps(lrc_parser.tokenize_text(text)).encode('utf-8') == data
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        assert lrc_parser.dumps(lrc_parser.tokenize(f)) == text
+    assert Timeline.from_file(path).dumps() == text
+
+
+def test_corpus_covers_blank_lines_and_crlf():
+    texts = []
+    for path in CORPUS:
+        with open(path, 'rb') as f:
+            texts.append(f.read())
+    assert any(b'\r\n' in text for text in texts)
+    assert any(b'\n\r\n' in text or b'\n\n' in text for text in texts)
+
+
+def test_whitespace_and_line_endings_are_kept():
+    text = '\n[00:01.00]a  \r\n\t[00:02.00]b\r   \r\n[00:03.00]c'
+    rows = list(lrc_parser.tokenize_text(text))
+    assert [row.kind for row in rows] == ['blank', 'lyric', 'lyric', 'blank', 'lyric']
+    assert [row.raw for row in rows] == ['', '[00:01.00]a', '[00:02.00]b', '', '[00:03.00]c']
+    assert lrc_parser.dumps(rows) == text
+
+
+def test_blank_rows_do_not_become_lines():
+    timeline = Timeline.from_text('[00:01.00]a\r\n\r\n[00:02.00]b\r\n')
+    assert timeline.lines == ['a', 'b']
+    assert list(timeline.times) == [1000, 2000]
+
+
+def test_lines_without_endings_are_joined():
+    assert lrc_parser.dumps(lrc_parser.tokenize(['[00:01.00]a', '[00:02.00]b'])) == '[00:01.00]a\n[00:02.00]b'
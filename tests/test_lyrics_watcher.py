@@ -0,0 +1,33 @@
+"""
+Tests for lyrics_watcher with a temporary LyricsX folder.
+"""
+
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lyrics_watcher
+
+
+def test_missing_directory_is_not_created_until_it_exists(tmp_path):
+    directory = tmp_path / 'LyricsX'
+    changed = []
+    seen = threading.Event()
+    watcher = lyrics_watcher.LyricsWatcher(str(directory), lambda names: (changed.append(names), seen.set()),
+                                           interval=0.05, debounce=0.05)
+    watcher.start()
+    assert not directory.exists()
+    assert not watcher.running
+
+    directory.mkdir()
+    watcher.start()
+    try:
+        assert watcher.running
+        (directory / 'Song - Artist.lrcx').write_text('[00:01.000]one\n', encoding='utf-8')
+        assert seen.wait(5)
+        assert 'Song - Artist.lrcx' in set().union(*changed)
+    finally:
+        watcher.stop()
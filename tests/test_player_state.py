@@ -0,0 +1,103 @@
+"""
+Tests for player_state.PositionModel with an injected clock, so no time
+passes for real.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from player_state import PlayerSnapshot, PositionModel
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def model(clock):
+    return PositionModel(clock=clock)
+
+
+def sample(clock, position, state='playing', title='Song', duration=200.0):
+    return PlayerSnapshot(title=title, artist='Artist', position=position, duration=duration,
+                          state=state, sampled_at=clock.now)
+
+
+def test_extrapolates_while_playing(model, clock):
+    model.observe(sample(clock, 10.0))
+    clock.now += 1.5
+    assert model.position() == pytest.approx(11.5)
+    assert model.position(clock.now + 0.5) == pytest.approx(12.0)
+
+
+def test_stops_at_duration(model, clock):
+    model.observe(sample(clock, 199.0))
+    clock.now += 5
+    assert model.position() == pytest.approx(200.0)
+
+
+def test_small_drift_is_recorded_not_resynced(model, clock):
+    model.observe(sample(clock, 10.0))
+    clock.now += 1.0
+    model.observe(sample(clock, 11.1))
+    assert model.resyncs == 0
+    assert model.error_estimate() == pytest.approx(0.1)
+    # Re-anchored on the new sample
+    clock.now += 1.0
+    assert model.position() == pytest.approx(12.1)
+
+
+def test_pause_stops_extrapolation(model, clock):
+    model.observe(sample(clock, 10.0))
+    clock.now += 2.0
+    model.observe(sample(clock, 12.0, state='paused'))
+    assert model.resyncs == 1
+    clock.now += 30.0
+    assert model.position() == pytest.approx(12.0)
+    model.observe(sample(clock, 12.0))
+    clock.now += 1.0
+    assert model.position() == pytest.approx(13.0)
+
+
+def test_seek_in_sample_resyncs(model, clock):
+    model.observe(sample(clock, 10.0))
+    clock.now += 1.0
+    model.observe(sample(clock, 95.0))
+    assert model.resyncs == 1
+    assert model.error_estimate() == 0.0
+    clock.now += 1.0
+    assert model.position() == pytest.approx(96.0)
+
+
+def test_explicit_seek_re_anchors_on_the_clock(model, clock):
+    model.observe(sample(clock, 10.0))
+    clock.now += 3.0
+    model.reset(42.0)
+    assert model.position() == pytest.approx(42.0)
+    clock.now += 0.5
+    assert model.position() == pytest.approx(42.5)
+
+
+def test_track_change_resyncs(model, clock):
+    model.observe(sample(clock, 100.0))
+    clock.now += 1.0
+    model.observe(sample(clock, 0.5, title='Next Song'))
+    assert model.resyncs == 1
+    assert model.error_estimate() == 0.0
+    clock.now += 1.0
+    assert model.position() == pytest.approx(1.5)
+    assert model.stats()['samples'] == 2
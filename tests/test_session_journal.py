@@ -0,0 +1,160 @@
+"""
+Tests for session_journal: recovery, compaction and sharing the journal
+directory between several server processes.
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import session_journal
+
+
+def session(name):
+    return {'lines': ['one', 'two'], 'timestamps': ['', ''], 'current_line': 0,
+            'output_filename': name, 'start_time': 0, 'is_recording': False}
+
+
+def journal(path, **kwargs):
+    return session_journal.SessionJournal(str(path), fsync=False, compact_interval=3600, **kwargs)
+
+
+def crash_after(path, body, state=None):
+    """Run `body` against a journal `j` at `path` in another process, then kill it without closing `j`."""
+    code = subprocess.run([sys.executable, '-c', textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {ROOT!r})
+        import session_journal
+        SESSION = {state!r}
+        j = session_journal.SessionJournal({str(path)!r}, fsync=False)
+    """) + textwrap.dedent(body) + "j.flush()\nos._exit(1)\n"]).returncode
+    assert code == 1
+
+
+def test_processes_get_separate_slots_and_keep_each_others_sessions(tmp_path):
+    base = tmp_path / 'sessions.journal'
+    first, second = journal(base), journal(base)
+    first.record_session('a', session('a.lrcx'))
+    second.record_session('b', session('b.lrcx'))
+    first.flush()
+    second.flush()
+    assert first.path == str(base)
+    assert second.path == session_journal.slot_path(str(base), 1)
+    first.compact()
+    second.compact()
+    first.close()
+    second.close()
+
+    restarted = journal(base)
+    assert sorted(restarted.recover()) == ['a', 'b']
+    restarted.close()
+
+
+def test_slot_of_crashed_process_is_adopted(tmp_path):
+    base = tmp_path / 'sessions.journal'
+    live = journal(base)
+    live.record_session('live', session('live.lrcx'))
+    live.flush()
+    # A second process journals a stamp and dies without closing its journal
+    crash_after(base, """
+        j.record_session('crashed', SESSION)
+        j.record_stamp('crashed', 0, '[00:01.000]', 1)
+    """, session('crashed.lrcx'))
+    orphan = session_journal.slot_path(str(base), 1)
+    assert os.path.exists(orphan)
+
+    recovered = live.recover()
+    assert recovered['crashed']['timestamps'] == ['[00:01.000]', '']
+    live.compact()
+    assert not os.path.exists(orphan)
+    live.close()
+
+    restarted = journal(base)
+    assert sorted(restarted.recover()) == ['crashed', 'live']
+    restarted.close()
+
+
+def test_recovers_after_unclean_exit(tmp_path):
+    path = tmp_path / 'sessions.journal'
+    crash_after(path, """
+        j.record_session('tab', SESSION)
+        j.record_timing('tab', 1000.0, True)
+        j.record_stamp('tab', 0, '[00:01.000]', 1)
+        j.record_cursor('tab', 2)
+    """, session('song.lrcx'))
+
+    restarted = journal(path)
+    recovered = restarted.recover()
+    restarted.close()
+    assert list(recovered) == ['tab']
+    state = recovered['tab']
+    assert state['lines'] == ['one', 'two']
+    assert state['timestamps'] == ['[00:01.000]', '']
+    assert state['current_line'] == 2
+    assert state['output_filename'] == 'song.lrcx'
+    assert (state['start_time'], state['is_recording']) == (1000.0, True)
+
+
+def test_torn_last_record_is_skipped(tmp_path):
+    path = tmp_path / 'sessions.journal'
+    writer = journal(path)
+    writer.record_session('tab', session('song.lrcx'))
+    writer.record_stamp('tab', 0, '[00:01.000]', 1)
+    writer.close()
+    with open(path, 'ab') as f:
+        f.write(b'{"op": "stamp", "line": 1, "timestamp": "[00:0')
+
+    restarted = journal(path)
+    recovered = restarted.recover()
+    assert recovered['tab']['timestamps'] == ['[00:01.000]', '']
+    # New records still replay after the torn line
+    restarted.record_stamp('tab', 1, '[00:02.000]', 2)
+    restarted.close()
+    again = journal(path)
+    assert again.recover()['tab']['timestamps'] == ['[00:01.000]', '[00:02.000]']
+    again.close()
+
+
+def test_compaction_writes_changed_sessions_and_shrinks_the_journal(tmp_path):
+    path = tmp_path / 'sessions.journal'
+    written = {}
+    j = journal(path, on_compact=lambda session_id, state: written.update({session_id: state}))
+    j.record_session('stamped', session('stamped.lrcx'))
+    for n in range(20):
+        j.record_stamp('stamped', 0, f'[00:{n:02d}.000]', 1)
+    j.record_session('untouched', session('untouched.lrcx'))
+    j.record_session('saved', session('saved.lrcx'))
+    j.record_stamp('saved', 0, '[00:01.000]', 1)
+    j.record_saved('saved')
+    j.flush()
+    assert len(path.read_bytes().splitlines()) == 25
+
+    j.compact()
+    # Only sessions with unsaved stamps reach the autosave callback
+    assert list(written) == ['stamped']
+    assert written['stamped']['timestamps'] == ['[00:19.000]', '']
+    assert len(path.read_bytes().splitlines()) == 3
+    written.clear()
+    j.compact()
+    assert written == {}
+    j.close()
+
+    restarted = journal(path)
+    recovered = restarted.recover()
+    restarted.close()
+    assert sorted(recovered) == ['saved', 'stamped', 'untouched']
+    assert recovered['stamped']['timestamps'] == ['[00:19.000]', '']
+
+
+def test_expired_sessions_are_not_recovered(tmp_path):
+    path = tmp_path / 'sessions.journal'
+    writer = journal(path)
+    writer.record_session('old', session('old.lrcx'))
+    writer.close()
+    restarted = journal(path, ttl=-1)
+    assert restarted.recover() == {}
+    restarted.close()
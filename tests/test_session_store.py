@@ -0,0 +1,100 @@
+"""
+Tests for the session store backends: the in-memory store and the SQLite
+store shared between processes.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import session_store
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return session_store.MemorySessionStore()
+    return session_store.SQLiteSessionStore(str(tmp_path / 'sessions.sqlite'))
+
+
+def test_create_and_load(store):
+    session_id = store.create()
+    assert store.exists(session_id)
+    assert store.load(session_id) == session_store.new_session()
+    assert store.ids() == [session_id]
+    assert not store.exists('missing')
+    assert not store.exists(None)
+
+
+def test_locked_creates_and_saves(store):
+    with store.locked('tab') as session:
+        assert session == session_store.new_session()
+        session['lines'] = ['one', 'two']
+        session['timestamps'] = ['[00:01.000]', '']
+    assert store.load('tab')['lines'] == ['one', 'two']
+    assert store.load('tab')['timestamps'] == ['[00:01.000]', '']
+
+
+def test_delete(store):
+    session_id = store.create()
+    store.delete(session_id)
+    assert not store.exists(session_id)
+    assert store.ids() == []
+
+
+def test_expire_drops_idle_sessions(store):
+    session_id = store.create()
+    assert store.expire() == 0
+    store.ttl = -1
+    assert store.expire() == 1
+    assert not store.exists(session_id)
+
+
+def test_locked_serializes_concurrent_updates(store):
+    session_id = store.create()
+
+    def stamp():
+        for _ in range(50):
+            with store.locked(session_id) as session:
+                session['current_line'] += 1
+
+    threads = [threading.Thread(target=stamp) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.load(session_id)['current_line'] == 200
+
+
+def test_sqlite_is_shared_and_rolls_back(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite')
+    first, second = session_store.SQLiteSessionStore(path), session_store.SQLiteSessionStore(path)
+    with first.locked('tab') as session:
+        session['current_line'] = 3
+    assert second.load('tab')['current_line'] == 3
+
+    with pytest.raises(RuntimeError):
+        with second.locked('tab') as session:
+            session['current_line'] = 4
+            raise RuntimeError('handler failed')
+    assert first.load('tab')['current_line'] == 3
+
+
+def test_create_store_specs(tmp_path):
+    assert isinstance(session_store.create_store('memory'), session_store.MemorySessionStore)
+    store = session_store.create_store(f"sqlite:{tmp_path / 'store.sqlite'}", ttl=5)
+    assert isinstance(store, session_store.SQLiteSessionStore)
+    assert store.ttl == 5
+    custom = session_store.create_store('session_store:MemorySessionStore')
+    assert isinstance(custom, session_store.MemorySessionStore)
+    with pytest.raises(ValueError):
+        session_store.create_store('nonsense')
+    with pytest.raises(ValueError):
+        session_store.create_store('os:path')
+    with pytest.raises(TypeError):
+        session_store.SessionStore()
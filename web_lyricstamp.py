@@ -8,56 +8,252 @@ import os
 import sys
 import json
 import time
+import functools
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, g, render_template, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 import subprocess
 import threading
-import player_control
+import ai_jobs
+import atomic_io
+import audio_library
+import event_stream
+import http_cache
+import lyrics_index
+import lyrics_timeline
+import lyrics_watcher
+import metrics
+import player_state
+import profiling
+import session_journal
+import session_store
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'lyricstamp-web-secret-key'
 
-# Global variables to store current session data
-current_session = {
-    'lines': [],
-    'timestamps': [],
-    'current_line': 0,
-    'is_recording': False,
-    'start_time': 0,
-    'output_filename': '',
-    'audio_file': None
-}
+# Opt-in profiling (LYRICSTAMP_PROFILE); every request is a profiled region
+app.wsgi_app = profiling.profiled('request')(app.wsgi_app)
+profiling.start_from_env()
+
+# Shared player state; one background poller instead of one osascript per request
+player_service = player_state.PlayerStateService(player_state.create_backend())
+
+# Push channel shared by every open page; one producer feeds all subscribers
+event_hub = event_stream.EventHub()
+
+# Timing sessions, one per browser tab or user (LYRICSTAMP_SESSION_STORE picks the backend)
+sessions = session_store.create_store()
+SESSION_COOKIE = 'lyricstamp_session'
+SESSION_HEADER = 'X-LyricStamp-Session'
+
+def autosave_path(session_id, state):
+    """Where a session's unsaved stamps are autosaved: next to the journal, one file per session."""
+    name = os.path.splitext(os.path.basename(state['output_filename'] or 'untitled.lrcx'))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(journal.path)), 'autosave', f"{name}.{session_id}.lrcx")
+
+def compact_session(session_id, state):
+    """Journal compaction target: write the session's stamps so far to its autosave file.
+
+    Never the LyricsX folder: a half-stamped session must not replace a
+    finished file of the same name, and every new tab is named untitled.lrcx.
+    """
+    path = autosave_path(session_id, state)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_io.write_if_changed(path, render_lyrics(state['lines'], state['timestamps']))
+
+def discard_autosave(session_id, session):
+    try:
+        os.remove(autosave_path(session_id, session))
+    except FileNotFoundError:
+        pass
+
+# Autosave: every stamp is journaled, so a restart mid-song loses nothing
+journal = session_journal.SessionJournal(os.environ.get('LYRICSTAMP_JOURNAL'), ttl=sessions.ttl,
+                                         on_compact=compact_session)
+
+_recover_lock = threading.Lock()
+_recovered = False
+
+def recover_sessions():
+    """Restore journaled sessions the session store no longer has (e.g. after a restart), once.
+
+    Runs before the first request rather than at import, so importing the
+    module (tools, tests, a WSGI server's master) leaves the journal alone.
+    """
+    global _recovered
+    with _recover_lock:
+        if _recovered:
+            return
+        recovered = 0
+        for session_id, state in journal.recover().items():
+            if sessions.exists(session_id):
+                # Another process still serves it and journals its own changes
+                journal.forget(session_id)
+                continue
+            with sessions.locked(session_id) as session:
+                for key in session_journal.SNAPSHOT_KEYS:
+                    session[key] = state[key]
+            recovered += 1
+        # Set last, so requests that arrive meanwhile wait on the lock instead of skipping ahead
+        _recovered = True
+    if recovered:
+        print(f"Recovered {recovered} timing session(s) from {journal.path}")
+
+@app.before_request
+def ensure_sessions_recovered():
+    if not _recovered:
+        recover_sessions()
+
+# Last track announced on the push channel
+last_published_track = {'title': None, 'artist': None, 'duration': None}
+
+def request_session_id(create=False):
+    """Session ID from the X-LyricStamp-Session header, ?session= or the cookie.
+
+    Unknown or expired IDs count as no session; with `create`, a new session
+    is made and its cookie set on the response.
+    """
+    session_id = (request.headers.get(SESSION_HEADER) or request.args.get('session')
+                  or request.cookies.get(SESSION_COOKIE))
+    if session_id and sessions.exists(session_id):
+        return session_id
+    if not create:
+        return None
+    session_id = sessions.create()
+    g.new_session_id = session_id
+    return session_id
+
+ROUTE_SECONDS = metrics.histogram('lyricstamp_http_request_seconds',
+                                  'Request handling time by route, to the first byte for streamed responses',
+                                  ('method', 'route', 'status'))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The URL rule, not the path, so label values stay a fixed set
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        ROUTE_SECONDS.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+    return response
+
+@app.after_request
+def set_session_cookie(response):
+    session_id = g.pop('new_session_id', None)
+    if session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=int(sessions.ttl),
+                            httponly=True, samesite='Lax')
+    return response
+
+def session_route(view):
+    """Run a view with the request's session locked, as view(session_id, session)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        session_id = request_session_id()
+        if not session_id:
+            return jsonify({'error': 'No active session'}), 400
+        with sessions.locked(session_id) as session:
+            return view(session_id, session, *args, **kwargs)
+    return wrapper
+
+def session_state(session):
+    """Summarize a session for status responses and push updates."""
+    state = {
+        'current_line': session['current_line'],
+        'total_lines': len(session['lines']),
+        'is_recording': session['is_recording'],
+        'timestamps': session['timestamps'],
+        'stamp_errors': session.get('stamp_errors', [])
+    }
+    if session['lines']:
+        state['current_line_text'] = session['lines'][session['current_line']]
+    return state
+
+def publish_session(session_id, session):
+    """Push a session's state to the pages subscribed to it."""
+    event_hub.publish('session', session_state(session), channel=session_id)
+
+def current_ai_status(session):
+    """Status of the session's most recent AI job, or the idle status before any job ran."""
+    job = ai_job_queue.get(session.get('ai_job_id') or '')
+    return job.to_dict() if job else dict(AI_IDLE_STATUS)
+
+def publish_ai_status(session_id, job):
+    """Push an AI job's status to the pages subscribed to its session."""
+    event_hub.publish('ai_status', job.to_dict(), coalesce=True, channel=session_id)
+
+def track_event(snapshot):
+    return {'title': snapshot.title, 'artist': snapshot.artist, 'duration': snapshot.duration}
+
+def position_event(snapshot):
+    return {'position': snapshot.position, 'state': snapshot.state}
+
+def publish_player_tick():
+    """Producer for the push channel: one position tick, plus a track event on change."""
+    snapshot = player_service.snapshot()
+    if snapshot.error:
+        return
+    track = track_event(snapshot)
+    if track != last_published_track:
+        last_published_track.update(track)
+        event_hub.publish('track', track)
+    event_hub.publish('position', position_event(snapshot), coalesce=True)
+
+event_hub.add_producer(publish_player_tick, 0.05)
 
 def get_lyricsx_dir():
     """Get the LyricsX directory path."""
     return os.path.expanduser("~/Music/LyricsX")
 
-def list_audio_files():
-    """List available audio files in common directories."""
-    audio_extensions = {'.mp3', '.m4a', '.wav', '.flac', '.aac'}
-    audio_files = []
-    
-    # Common audio directories
-    search_dirs = [
-        os.path.expanduser("~/Music"),
-        os.path.expanduser("~/Downloads"),
-        os.path.expanduser("~/Desktop")
-    ]
-    
-    for search_dir in search_dirs:
-        if os.path.exists(search_dir):
-            for root, dirs, files in os.walk(search_dir):
-                for file in files:
-                    if Path(file).suffix.lower() in audio_extensions:
-                        rel_path = os.path.relpath(os.path.join(root, file), search_dir)
-                        audio_files.append({
-                            'path': os.path.join(root, file),
-                            'name': file,
-                            'display': rel_path
-                        })
-    
-    return audio_files[:50]  # Limit to first 50 files
+# Index of every lyrics file in the LyricsX directory, used to resolve the current song
+library_index = lyrics_index.LyricsIndex(get_lyricsx_dir())
+
+def lyrics_payload(title, artist, file_path=None, validate=False):
+    """Build the lyrics response for a song, or None if it has no lyrics file."""
+    file_path = file_path or library_index.lookup(title, artist)
+    if not file_path:
+        return None
+    # Parsed once per file version; while the watcher runs it invalidates changed files
+    timeline = lyrics_timeline.load_timeline(file_path, validate=validate or not lyrics_file_watcher.running)
+    return {
+        'success': True,
+        'filename': os.path.basename(file_path),
+        'title': title,
+        'artist': artist,
+        **timeline.to_dict()
+    }
+
+def on_lyrics_changed(filenames):
+    """Drop stale timelines and push fresh lyrics for the current song to all displays."""
+    for filename in filenames:
+        lyrics_timeline.invalidate(os.path.join(get_lyricsx_dir(), filename))
+    library_index.refresh()
+    snapshot = player_service.snapshot()
+    if snapshot.error:
+        return
+    payload = lyrics_payload(snapshot.title, snapshot.artist)
+    if payload and payload['filename'] in filenames:
+        event_hub.publish('lyrics', payload)
+
+# Hot-reloads lyrics edited by ai_postprocess or an external editor; started on first use
+lyrics_file_watcher = lyrics_watcher.LyricsWatcher(get_lyricsx_dir(), on_lyrics_changed)
+
+AUDIO_EXTENSIONS = set(audio_library.AUDIO_EXTENSIONS)
+
+# Audio files in ~/Music, ~/Downloads and ~/Desktop, rescanned incrementally in the background
+audio_files = audio_library.AudioLibrary(lyrics=library_index)
+
+def list_audio_files(query='', offset=0, limit=50, **filters):
+    """List indexed audio files matching a query; returns (total matches, page of track dicts)."""
+    audio_files.ensure_fresh()
+    total, tracks = audio_files.query(query, offset=offset, limit=limit, **filters)
+    return total, [track.to_dict() for track in tracks]
+
+def is_audio_file(path):
+    return bool(path) and Path(path).suffix.lower() in AUDIO_EXTENSIONS and os.path.isfile(path)
 
 def get_song_info_from_clipboard():
     """Get song info from clipboard (placeholder for now)."""
@@ -87,74 +283,116 @@ def create_safe_filename(title, artist):
     
     return filename
 
-def save_lyrics(lines, timestamps, filename):
-    """Save lyrics to .lrcx file."""
+def render_lyrics(lines, timestamps):
+    """The .lrcx text for a session's lines and timestamps."""
+    return ''.join(f"{timestamps[i]}{line}\n" if i < len(timestamps) and timestamps[i] else f"{line}\n"
+                   for i, line in enumerate(lines))
+
+def save_lyrics(lines, timestamps, filename, fsync=False, only_if_changed=False):
+    """Save lyrics to .lrcx file.
+
+    The file is replaced atomically; with `only_if_changed` an identical file
+    is left untouched.
+    """
     try:
         output_path = os.path.join(get_lyricsx_dir(), filename)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for i, line in enumerate(lines):
-                if i < len(timestamps) and timestamps[i]:
-                    f.write(f"{timestamps[i]}{line}\n")
-                else:
-                    f.write(f"{line}\n")
+        content = render_lyrics(lines, timestamps)
+        if only_if_changed:
+            atomic_io.write_if_changed(output_path, content, fsync=fsync)
+        else:
+            atomic_io.atomic_write(output_path, content, fsync=fsync)
         return True
     except Exception as e:
         print(f"Error saving file: {e}")
         return False
 
-def process_ai_enhancements(lines, add_romaji=False, add_translation=False, use_ollama=False):
-    """Process AI enhancements using the existing ai_phonetics script."""
+def process_ai_enhancements(lines, add_romaji=False, add_translation=False, use_ollama=False, progress=None, cancel_event=None, on_line=None):
+    """Process AI enhancements using the existing ai_phonetics script.
+
+    `on_line(index, romaji)` gets indices into `lines`, not into the lyrics
+    actually sent to the model.
+    """
+    from ai_postprocess import AIProcessingCancelled, add_ai_phonetics_and_translation
     try:
-        from ai_postprocess import add_ai_phonetics_and_translation
-        
         # Extract lyrics without timestamps for AI processing
-        lyrics_only = [line for line in lines if not line.startswith('[') and line.strip()]
+        sources = [i for i, line in enumerate(lines) if not line.startswith('[') and line.strip()]
+        lyrics_only = [lines[i] for i in sources]
         
         enhanced_lyrics = lyrics_only
         
+        def report_line(index, romaji):
+            # The pipeline counts in lyrics_only; callers address session lines
+            on_line(sources[index], romaji)
+        
         if add_romaji or add_translation:
             enhanced_lyrics = add_ai_phonetics_and_translation(
                 lyrics_only,
                 target_language="en",
                 model="phi3.5:3.8b" if use_ollama else "gpt-3.5-turbo",
                 include_kanji=add_romaji,
-                use_ollama=use_ollama
+                use_ollama=use_ollama,
+                progress=progress,
+                cancel_event=cancel_event,
+                on_line=report_line if on_line else None
             )
         
         return enhanced_lyrics
+    except AIProcessingCancelled:
+        raise
     except Exception as e:
         print(f"AI processing failed: {e}")
         return lines
 
+# Serialized JSON and rendered pages, served with ETags so repeat loads get a 304
+response_cache = http_cache.ResponseCache()
+
+# Cache and player stats, read only when /api/metrics is scraped
+metrics.REGISTRY.register_stats('lyricstamp_response_cache', response_cache.stats,
+                                counters=('hits', 'misses', 'not_modified'))
+metrics.REGISTRY.register_stats('lyricstamp_timeline_cache', lyrics_timeline.stats, counters=('hits', 'misses'))
+metrics.REGISTRY.register_stats('lyricstamp_lyrics_index', library_index.stats,
+                                counters=('hits', 'misses', 'cached_misses'))
+metrics.REGISTRY.register_stats('lyricstamp_player_drift', player_service.model.stats, counters=('samples', 'resyncs'))
+metrics.REGISTRY.register_stats('lyricstamp_journal', journal.stats, counters=('records_written', 'flushes'))
+metrics.REGISTRY.register_stats('lyricstamp_audio_library', audio_files.stats)
+
+def render_page(template):
+    """Render a page once per template version and serve it from the response cache."""
+    path = os.path.join(app.root_path, app.template_folder, template)
+    mtime = os.path.getmtime(path)
+    cached = response_cache.get(('page', template, mtime),
+                                lambda: render_template(template).encode('utf-8'), 'text/html', mtime)
+    return response_cache.respond(cached, request)
+
 @app.route('/')
 def index():
     """Main page - redirect to setup."""
-    return render_template('setup.html')
+    return render_page('setup.html')
 
 @app.route('/setup')
 def setup():
     """Setup page for lyrics input."""
-    return render_template('setup.html')
+    return render_page('setup.html')
 
 @app.route('/timing')
 def timing():
     """Timing interface page."""
-    return render_template('timing.html')
+    return render_page('timing.html')
 
 @app.route('/display')
 def display():
     """Display page for viewing existing .lrcx files."""
-    return render_template('display.html')
+    return render_page('display.html')
 
 @app.route('/karaoke')
 def karaoke():
     """Karaoke-style lyrics display page."""
-    return render_template('karaoke.html')
+    return render_page('karaoke.html')
 
 @app.route('/ai-processing')
 def ai_processing():
     """AI processing page for real-time AI enhancement status."""
-    return render_template('ai_processing.html')
+    return render_page('ai_processing.html')
 
 @app.route('/api/start_session', methods=['POST'])
 def start_session():
@@ -176,117 +414,197 @@ def start_session():
     if not lyrics:
         return jsonify({'error': 'No lyrics provided'}), 400
     
-    # Initialize session
-    current_session['lines'] = lyrics
-    current_session['timestamps'] = [''] * len(lyrics)
-    current_session['current_line'] = 0
-    current_session['is_recording'] = False
-    current_session['output_filename'] = data.get('filename', 'untitled.lrcx')
+    # A tab that already has a session restarts it; anything else gets a new one,
+    # so a second tab or user never takes over an existing session via the cookie
+    session_id = request.headers.get(SESSION_HEADER)
+    if not (session_id and sessions.exists(session_id)):
+        session_id = sessions.create()
+        g.new_session_id = session_id
+    
+    with sessions.locked(session_id) as session:
+        session.clear()
+        session.update(session_store.new_session())
+        session['lines'] = lyrics
+        session['timestamps'] = [''] * len(lyrics)
+        session['output_filename'] = data.get('filename', 'untitled.lrcx')
+        if data.get('audio_file'):
+            session['audio_file'] = os.path.expanduser(data['audio_file'])
+        journal.record_session(session_id, session)
+        publish_session(session_id, session)
     
     return jsonify({
         'success': True,
+        'session_id': session_id,
         'total_lines': len(lyrics),
         'current_line': 0,
         'lines': lyrics
     })
 
+# Client press times further than this in the past come from a stale clock sync
+MAX_PRESS_AGE = 10.0
+
+def press_time(data):
+    """Server time.monotonic() of a key press reported by the client, and its error in seconds.
+
+    Clients send the press time on their own clock (`client_time`, ms) with
+    the offset to the server clock measured through /api/clock
+    (`clock_offset`, ms) and that measurement's error (`clock_error`, ms).
+    Returns (None, None) if the request has no usable press time; the
+    server's receive time is used then.
+    """
+    try:
+        when = (float(data['client_time']) + float(data['clock_offset'])) / 1000
+        clock_error = abs(float(data.get('clock_error', 0))) / 1000
+    except (KeyError, TypeError, ValueError):
+        return None, None
+    now = time.monotonic()
+    if not now - MAX_PRESS_AGE <= when <= now + clock_error + 0.1:
+        return None, None
+    return min(when, now), clock_error
+
+def record_stamp_error(session, index, error_ms):
+    errors = session.setdefault('stamp_errors', [])
+    errors.extend([None] * (len(session['lines']) - len(errors)))
+    errors[index] = error_ms
+
+@app.route('/api/clock')
+def clock():
+    """NTP-style clock exchange: the server's monotonic clock (ms) on receive and transmit."""
+    received = time.monotonic() * 1000
+    return jsonify({'received': received, 'transmitted': time.monotonic() * 1000})
+
 @app.route('/api/start_timing', methods=['POST'])
-def start_timing():
+@session_route
+def start_timing(session_id, session):
     """Start timing the current line."""
-    if not current_session['lines']:
+    if not session['lines']:
         return jsonify({'error': 'No active session'}), 400
     
-    current_session['is_recording'] = True
-    current_session['start_time'] = time.time()
+    pressed, _ = press_time(request.get_json(silent=True) or {})
+    session['is_recording'] = True
+    # Wall-clock start, moved back to the moment of the key press when the client reported it
+    session['start_time'] = time.time() - (time.monotonic() - pressed if pressed else 0.0)
+    journal.record_timing(session_id, session['start_time'], True)
+    publish_session(session_id, session)
     
     return jsonify({
         'success': True,
-        'current_line': current_session['current_line'],
-        'line_text': current_session['lines'][current_session['current_line']]
+        'current_line': session['current_line'],
+        'line_text': session['lines'][session['current_line']]
     })
 
 @app.route('/api/stop_timing', methods=['POST'])
-def stop_timing():
+@session_route
+def stop_timing(session_id, session):
     """Stop timing and save timestamp."""
-    if not current_session['is_recording']:
+    if not session['is_recording']:
         return jsonify({'error': 'Not currently timing'}), 400
     
-    elapsed_time = time.time() - current_session['start_time']
+    pressed, clock_error = press_time(request.get_json(silent=True) or {})
+    stopped = time.time() - (time.monotonic() - pressed if pressed else 0.0)
+    elapsed_time = max(0.0, stopped - session['start_time'])
     minutes = int(elapsed_time // 60)
     seconds = int(elapsed_time % 60)
     milliseconds = int((elapsed_time % 1) * 1000)
     
     timestamp = f"[{minutes}:{seconds:02d}.{milliseconds:03d}]"
-    current_session['timestamps'][current_session['current_line']] = timestamp
-    current_session['is_recording'] = False
+    session['timestamps'][session['current_line']] = timestamp
+    session['is_recording'] = False
+    error_ms = clock_error * 1000 if pressed else None
+    record_stamp_error(session, session['current_line'], error_ms)
+    journal.record_timing(session_id, session['start_time'], False)
+    journal.record_stamp(session_id, session['current_line'], timestamp, session['current_line'])
+    publish_session(session_id, session)
     
     return jsonify({
         'success': True,
         'timestamp': timestamp,
-        'current_line': current_session['current_line']
+        'current_line': session['current_line'],
+        'error_ms': error_ms
     })
 
 @app.route('/api/next_line', methods=['POST'])
-def next_line():
-    """Move to the next line and add timestamp."""
-    if current_session['current_line'] < len(current_session['lines']) - 1:
+@session_route
+def next_line(session_id, session):
+    """Move to the next line and add timestamp.
+
+    The stamp is the player position at the key press: the client's reported
+    press time when it has a clock sync, else the time the request arrived.
+    """
+    pressed, clock_error = press_time(request.get_json(silent=True) or {})
+    error_ms = None
+    if session['current_line'] < len(session['lines']) - 1:
         # Add timestamp for current line before moving to next
-        if current_session['current_line'] == 0:
+        if session['current_line'] == 0:
             # First line gets 00:00.000 timestamp
             timestamp = "[00:00.000]"
+            error_ms = 0.0
         else:
             # Get current player position for timestamp
             try:
-                pos = player_control.player_position()
+                snapshot = player_service.snapshot(at=pressed)
+                if snapshot.error:
+                    raise RuntimeError(snapshot.error)
+                pos = snapshot.position
+                # Clock sync error plus how far extrapolated positions typically drift
+                error_ms = ((clock_error or 0.0) + player_service.model.error_estimate()) * 1000 if pressed else None
                 minutes = int(pos // 60)
                 seconds = int(pos % 60)
                 milliseconds = int((pos % 1) * 1000)
                 timestamp = f"[{minutes}:{seconds:02d}.{milliseconds:03d}]"
             except Exception as e:
                 # Fallback to current time if player position fails
-                elapsed_time = time.time() - current_session.get('start_time', time.time())
+                elapsed_time = time.time() - session.get('start_time', time.time())
                 minutes = int(elapsed_time // 60)
                 seconds = int(elapsed_time % 60)
                 milliseconds = int((elapsed_time % 1) * 1000)
                 timestamp = f"[{minutes}:{seconds:02d}.{milliseconds:03d}]"
         
         # Save timestamp for current line
-        current_session['timestamps'][current_session['current_line']] = timestamp
+        session['timestamps'][session['current_line']] = timestamp
+        record_stamp_error(session, session['current_line'], error_ms)
         
         # Move to next line
-        current_session['current_line'] += 1
+        session['current_line'] += 1
+        journal.record_stamp(session_id, session['current_line'] - 1, timestamp, session['current_line'])
+        publish_session(session_id, session)
         
         return jsonify({
             'success': True,
-            'current_line': current_session['current_line'],
-            'line_text': current_session['lines'][current_session['current_line']],
+            'current_line': session['current_line'],
+            'line_text': session['lines'][session['current_line']],
             'timestamp': timestamp,
-            'is_last': current_session['current_line'] == len(current_session['lines']) - 1
+            'error_ms': error_ms,
+            'is_last': session['current_line'] == len(session['lines']) - 1
         })
     else:
         return jsonify({
             'success': False,
             'error': 'Already at last line',
-            'current_line': current_session['current_line'],
-            'total_lines': len(current_session['lines']),
+            'current_line': session['current_line'],
+            'total_lines': len(session['lines']),
             'is_last': True
         })
 
 @app.route('/api/prev_line', methods=['POST'])
-def prev_line():
+@session_route
+def prev_line(session_id, session):
     """Move to the previous line."""
-    if current_session['current_line'] > 0:
-        current_session['current_line'] -= 1
+    if session['current_line'] > 0:
+        session['current_line'] -= 1
+        journal.record_cursor(session_id, session['current_line'])
+        publish_session(session_id, session)
         return jsonify({
             'success': True,
-            'current_line': current_session['current_line'],
-            'line_text': current_session['lines'][current_session['current_line']]
+            'current_line': session['current_line'],
+            'line_text': session['lines'][session['current_line']]
         })
     else:
         return jsonify({'error': 'Already at first line'}), 400
 
 @app.route('/api/save', methods=['POST'])
-def save_file():
+@session_route
+def save_file(session_id, session):
     """Save the current session to file."""
     data = request.get_json()
     
@@ -301,13 +619,17 @@ def save_file():
     else:
         # Auto-generate filename from current song
         try:
-            title, artist = player_control.now_playing()
-            filename = create_safe_filename(title, artist)
+            snapshot = player_service.snapshot()
+            if snapshot.error or not snapshot.title:
+                raise RuntimeError(snapshot.error or 'Nothing playing')
+            filename = create_safe_filename(snapshot.title, snapshot.artist)
         except Exception as e:
             # Fallback to default
-            filename = current_session.get('output_filename', 'untitled.lrcx')
+            filename = session.get('output_filename', 'untitled.lrcx')
     
-    if save_lyrics(current_session['lines'], current_session['timestamps'], filename):
+    if save_lyrics(session['lines'], session['timestamps'], filename, fsync=True):
+        journal.record_saved(session_id)
+        discard_autosave(session_id, session)
         return jsonify({
             'success': True, 
             'filename': filename,
@@ -316,9 +638,9 @@ def save_file():
     else:
         return jsonify({'error': 'Failed to save file'}), 500
 
-# Global AI processing status
-ai_processing_status = {
-    'status': 'idle',  # idle, processing, completed, error
+# AI processing status reported before a session has run any job
+AI_IDLE_STATUS = {
+    'status': 'idle',  # idle, queued, processing, completed, error, cancelled
     'current_line': 0,
     'total_lines': 0,
     'progress': 0,
@@ -326,127 +648,290 @@ ai_processing_status = {
     'backend': 'ollama'
 }
 
+# Background AI jobs; /api/ai_menu returns as soon as its job is queued
+ai_job_queue = ai_jobs.JobQueue(max_workers=2)
+
 @app.route('/api/ai_menu', methods=['POST'])
-def ai_menu():
-    """Show AI processing options."""
+@session_route
+def ai_menu(session_id, session):
+    """Queue AI processing of the current session and return its job ID."""
     data = request.get_json()
     add_romaji = data.get('add_romaji', False)
     add_translation = data.get('add_translation', False)
     use_ollama = data.get('use_ollama', False)
     
     if add_romaji or add_translation:
-        # Initialize AI processing status
-        global ai_processing_status
-        ai_processing_status = {
-            'status': 'processing',
-            'current_line': 0,
-            'total_lines': len(current_session['lines']),
-            'progress': 0,
-            'message': 'Starting AI processing...',
-            'backend': 'ollama' if use_ollama else 'openai'
-        }
-        
-        # Create backup first
-        backup_filename = current_session['output_filename'].replace('.lrcx', '.backup.lrcx')
-        save_lyrics(current_session['lines'], current_session['timestamps'], backup_filename)
-        
-        # Process AI enhancements
-        enhanced_lines = process_ai_enhancements(
-            current_session['lines'], 
-            add_romaji=add_romaji, 
-            add_translation=add_translation, 
-            use_ollama=use_ollama
-        )
+        if not session['lines']:
+            return jsonify({'error': 'No active session'}), 400
+        lines = list(session['lines'])
+        timestamps = list(session['timestamps'])
+        output_filename = session['output_filename']
         
-        # Update session with enhanced lines
-        current_session['lines'] = enhanced_lines
-        current_session['timestamps'] = [''] * len(enhanced_lines)
+        def work(job):
+            # Create backup first
+            backup_filename = output_filename.replace('.lrcx', '.backup.lrcx')
+            # Skipped when the backup already holds this content (re-running AI on the same lyrics)
+            save_lyrics(lines, timestamps, backup_filename, only_if_changed=True)
+            
+            def on_line(index, romaji):
+                # Streamed results reach the UI before the whole job finishes
+                job.partial[index] = romaji
+                event_hub.publish('ai_line', {'job_id': job.id, 'index': index, 'romaji': romaji},
+                                  channel=session_id)
+            
+            # Process AI enhancements, reporting per-line progress to the job
+            enhanced_lines = process_ai_enhancements(
+                lines, 
+                add_romaji=add_romaji, 
+                add_translation=add_translation, 
+                use_ollama=use_ollama,
+                progress=job.update,
+                cancel_event=job.cancel_event,
+                on_line=on_line
+            )
+            
+            # Update session with enhanced lines, unless it moved on (new lyrics, a newer job) meanwhile
+            with sessions.locked(session_id) as current:
+                if current.get('ai_job_id') != job.id or current['lines'] != lines:
+                    raise RuntimeError('the session changed while it ran, so the result was not applied')
+                current['lines'] = enhanced_lines
+                current['timestamps'] = [''] * len(enhanced_lines)
+                current['stamp_errors'] = []
+                journal.record_session(session_id, current)
+                publish_session(session_id, current)
+            return enhanced_lines
         
-        # Update status to completed
-        ai_processing_status['status'] = 'completed'
-        ai_processing_status['progress'] = 100
-        ai_processing_status['message'] = 'AI processing completed successfully!'
+        job = ai_job_queue.submit(work, total_lines=len(lines),
+                                  backend='ollama' if use_ollama else 'openai',
+                                  on_update=functools.partial(publish_ai_status, session_id), owner=session_id)
+        session['ai_job_id'] = job.id
+        publish_ai_status(session_id, job)
         
         return jsonify({
             'success': True,
-            'enhanced_lines': enhanced_lines,
-            'total_lines': len(enhanced_lines)
-        })
+            'job_id': job.id,
+            'status': job.status
+        }), 202
     
     return jsonify({'success': True})
 
 @app.route('/api/ai_status')
 def ai_status():
-    """Get current AI processing status."""
-    global ai_processing_status
-    return jsonify(ai_processing_status)
+    """Get AI processing status for a job (default: the session's most recent one)."""
+    job_id = request.args.get('job_id')
+    if not job_id:
+        session_id = request_session_id()
+        if not session_id:
+            return jsonify(dict(AI_IDLE_STATUS))
+        with sessions.locked(session_id) as session:
+            return jsonify(current_ai_status(session))
+    job = ai_job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    status = job.to_dict()
+    if job.status == 'completed':
+        status['enhanced_lines'] = job.result
+    else:
+        status['partial_results'] = [{'index': index, 'romaji': romaji}
+                                     for index, romaji in sorted(job.partial.items())]
+    return jsonify(status)
 
-@app.route('/api/get_status')
-def get_status():
-    """Get current session status."""
-    if not current_session['lines']:
+@app.route('/api/ai_jobs')
+def list_ai_jobs():
+    """List recent AI jobs, oldest first."""
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in ai_job_queue.list()]})
+
+@app.route('/api/ai_jobs/<job_id>/cancel', methods=['POST'])
+@session_route
+def cancel_ai_job(session_id, session, job_id):
+    """Cancel one of this session's queued or running AI jobs."""
+    if not ai_job_queue.cancel(job_id, owner=session_id):
+        return jsonify({'error': f'No running job: {job_id}'}), 404
+    return jsonify({'success': True, 'job_id': job_id})
+
+@app.route('/api/align', methods=['POST'])
+def align_session():
+    """Propose a timestamp for every session line by aligning the lyrics to an audio file.
+
+    Body: {"audio_file": path (default: the session's), "apply": bool}. With
+    "apply" the proposals replace the session's timestamps; lines marked
+    "suspect" are the ones worth checking by hand.
+    """
+    try:
+        import audio_align
+    except ImportError:
+        return jsonify({'error': 'Audio alignment requires NumPy (pip install numpy)'}), 501
+    session_id = request_session_id()
+    if not session_id:
+        return jsonify({'error': 'No active session'}), 400
+    data = request.get_json(silent=True) or {}
+    # Copy what alignment needs so the session is not locked while it runs
+    with sessions.locked(session_id) as session:
+        lines = list(session['lines'])
+        audio_file = os.path.expanduser(data.get('audio_file') or session.get('audio_file') or '')
+        if audio_file:
+            session['audio_file'] = audio_file
+    if not lines:
         return jsonify({'error': 'No active session'}), 400
+    if not is_audio_file(audio_file):
+        return jsonify({'error': f'Not an audio file: {audio_file}'}), 400
+    
+    started = time.perf_counter()
+    try:
+        proposals = audio_align.align_file(audio_file, lines)
+    except (audio_align.AudioDecodeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 422
+    elapsed = time.perf_counter() - started
     
+    results = [dict(proposal.to_dict(), line=line) for proposal, line in zip(proposals, lines)]
+    if data.get('apply'):
+        with sessions.locked(session_id) as session:
+            if session['lines'] == lines:
+                session['timestamps'] = [result['timestamp'] for result in results]
+                session['stamp_errors'] = []
+                journal.record_session(session_id, session)
+                publish_session(session_id, session)
+    
+    return jsonify({
+        'success': True,
+        'audio_file': audio_file,
+        'seconds': elapsed,
+        'suspect_lines': [i for i, result in enumerate(results) if result['suspect']],
+        'lines': results
+    })
+
+@app.route('/api/audio_files')
+def audio_file_list():
+    """Page through the audio library.
+
+    Query: q (words matched against title, artist, album and filename),
+    artist, album, extension, offset and limit (default 50, at most 500).
+    With lyrics=1 each track on the page gets its matching LyricsX file.
+    """
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(500, max(0, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    total, tracks = list_audio_files(request.args.get('q', ''), offset=offset, limit=limit,
+                                     artist=request.args.get('artist', ''),
+                                     album=request.args.get('album', ''),
+                                     extension=request.args.get('extension', ''))
+    if request.args.get('lyrics') == '1':
+        for track in tracks:
+            indexed = audio_files.tracks.get(track['path'])
+            lyrics_path = audio_files.lyrics_for(indexed) if indexed else None
+            track['lyrics'] = os.path.basename(lyrics_path) if lyrics_path else None
     return jsonify({
-        'current_line': current_session['current_line'],
-        'total_lines': len(current_session['lines']),
-        'is_recording': current_session['is_recording'],
-        'current_line_text': current_session['lines'][current_session['current_line']],
-        'timestamps': current_session['timestamps']
+        'success': True,
+        'total': total,
+        'offset': offset,
+        'tracks': tracks,
+        'library': audio_files.stats()
     })
 
+@app.route('/api/waveform')
+def waveform():
+    """Min/max peaks of a track for drawing its waveform.
+
+    Query: file (default: the session's audio file), start and end in
+    seconds, width (peaks wanted, default 1000), bits (8 or 16) and format
+    (json, or binary for interleaved little-endian min/max pairs). Peaks come
+    from the audio cache's pyramid, which is built on the first request.
+    """
+    try:
+        import audio_cache
+    except ImportError:
+        return jsonify({'error': 'Waveforms require NumPy (pip install numpy)'}), 501
+    audio_file = request.args.get('file')
+    if not audio_file:
+        session_id = request_session_id()
+        if session_id:
+            with sessions.locked(session_id) as session:
+                audio_file = session.get('audio_file')
+    audio_file = os.path.expanduser(audio_file or '')
+    if not is_audio_file(audio_file):
+        return jsonify({'error': f'Not an audio file: {audio_file}'}), 404
+    try:
+        start = float(request.args.get('start', 0))
+        end = float(request.args['end']) if 'end' in request.args else None
+        width = int(request.args.get('width', 1000))
+    except ValueError:
+        return jsonify({'error': 'start, end and width must be numbers'}), 400
+    bits = 8 if request.args.get('bits') == '8' else 16
+    
+    try:
+        audio = audio_cache.open_audio(audio_file)
+    except audio_cache.AudioDecodeError as e:
+        return jsonify({'error': str(e)}), 422
+    level, peaks_per_second, first, peaks = audio.peaks(start, end, max(1, min(width, 100000)))
+    if bits == 8:
+        peaks = (peaks >> 8).astype('<i1')
+    
+    if request.args.get('format') == 'binary':
+        response = Response(peaks.tobytes(), mimetype='application/octet-stream')
+        response.headers['X-Waveform-Start'] = str(first)
+        response.headers['X-Waveform-Rate'] = str(peaks_per_second)
+        response.headers['X-Waveform-Duration'] = str(audio.duration)
+        response.headers['X-Waveform-Bits'] = str(bits)
+        return response
+    return jsonify({
+        'duration': audio.duration,
+        'start': first,
+        'peaks_per_second': peaks_per_second,
+        'level': level,
+        'bits': bits,
+        'peaks': peaks.ravel().tolist()
+    })
+
+@app.route('/api/get_status')
+@session_route
+def get_status(session_id, session):
+    """Get current session status."""
+    if not session['lines']:
+        return jsonify({'error': 'No active session'}), 400
+    
+    return jsonify(session_state(session))
+
 @app.route('/api/get_session_lines')
-def get_session_lines():
+@session_route
+def get_session_lines(session_id, session):
     """Get the lyrics lines and timestamps from the current session."""
-    if not current_session['lines']:
+    if not session['lines']:
         return jsonify({'error': 'No active session'}), 400
     
     return jsonify({
         'success': True,
-        'lines': current_session['lines'],
-        'timestamps': current_session['timestamps']
+        'lines': session['lines'],
+        'timestamps': session['timestamps']
     })
 
 @app.route('/api/get_lyrics_file')
 def get_lyrics_file():
     """Get lyrics from an existing .lrcx file based on current song."""
     try:
-        title, artist = player_control.now_playing()
-        filename = create_safe_filename(title, artist)
-        file_path = os.path.join(get_lyricsx_dir(), filename)
+        snapshot = player_service.snapshot()
+        if snapshot.error:
+            raise RuntimeError(snapshot.error)
+        title, artist = snapshot.title, snapshot.artist
+        lyrics_file_watcher.start()
+        file_path = library_index.lookup(title, artist)
         
-        if not os.path.exists(file_path):
+        if not file_path:
             return jsonify({'error': f'No lyrics file found for: {title} - {artist}'}), 404
         
-        # Read the .lrcx file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Parse the content into lines with timestamps
-        lines = []
-        timestamps = []
-        
-        for line in content.strip().split('\n'):
-            if line.strip():
-                # Check if line starts with timestamp [mm:ss.mmm]
-                if line.startswith('[') and ']' in line:
-                    timestamp_end = line.find(']')
-                    timestamp = line[:timestamp_end + 1]
-                    lyric = line[timestamp_end + 1:].strip()
-                    timestamps.append(timestamp)
-                    lines.append(lyric)
-                else:
-                    timestamps.append('')
-                    lines.append(line.strip())
-        
-        return jsonify({
-            'success': True,
-            'filename': filename,
-            'title': title,
-            'artist': artist,
-            'lines': lines,
-            'timestamps': timestamps
-        })
+        # A new mtime or size is a new key, so an edited file is never served stale
+        try:
+            stat = os.stat(file_path)
+            cached = response_cache.get_json(
+                ('lyrics', file_path, stat.st_mtime_ns, stat.st_size, title, artist),
+                lambda: lyrics_payload(title, artist, file_path, validate=True), last_modified=stat.st_mtime)
+        except OSError:
+            # Deleted or renamed since the index last looked; rescan so the next lookup knows
+            lyrics_timeline.invalidate(file_path)
+            library_index.refresh()
+            return jsonify({'error': f'No lyrics file found for: {title} - {artist}'}), 404
+        return response_cache.respond(cached, request)
         
     except Exception as e:
         return jsonify({'error': f'Error loading lyrics: {str(e)}'}), 500
@@ -456,11 +941,14 @@ def get_lyrics_file():
 def get_now_playing():
     """Get currently playing track info."""
     try:
-        title, artist = player_control.now_playing()
+        snapshot = player_service.snapshot()
+        if snapshot.error:
+            raise RuntimeError(snapshot.error)
         return jsonify({
             'success': True,
-            'title': title,
-            'artist': artist
+            'title': snapshot.title,
+            'artist': snapshot.artist,
+            'state': snapshot.state
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -469,7 +957,7 @@ def get_now_playing():
 def toggle_play_pause():
     """Toggle play/pause."""
     try:
-        player_control.play_pause()
+        player_service.play_pause()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -478,7 +966,7 @@ def toggle_play_pause():
 def play_music():
     """Start playing from beginning."""
     try:
-        player_control.play()
+        player_service.play()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -487,7 +975,7 @@ def play_music():
 def next_track():
     """Play next track."""
     try:
-        player_control.play_next()
+        player_service.next_track()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -496,10 +984,12 @@ def next_track():
 def get_position():
     """Get current player position."""
     try:
-        position = player_control.player_position()
+        snapshot = player_service.snapshot()
+        if snapshot.error:
+            raise RuntimeError(snapshot.error)
         return jsonify({
             'success': True,
-            'position': position
+            'position': snapshot.position
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -510,7 +1000,7 @@ def set_position():
     try:
         data = request.get_json()
         position = data.get('position', 0)
-        player_control.set_player_position(position)
+        player_service.set_position(position)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -519,18 +1009,196 @@ def set_position():
 def get_duration():
     """Get current track duration."""
     try:
-        duration = player_control.get_duration()
+        snapshot = player_service.snapshot()
+        if snapshot.error:
+            raise RuntimeError(snapshot.error)
         return jsonify({
             'success': True,
-            'duration': duration
+            'duration': snapshot.duration
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/music/state')
+def get_player_state():
+    """Get the full cached player snapshot."""
+    snapshot = player_service.snapshot()
+    if snapshot.error:
+        return jsonify({'error': snapshot.error}), 500
+    return jsonify({
+        'success': True,
+        'backend': player_service.backend.name,
+        'drift': player_service.model.stats(),
+        **snapshot.to_dict()
+    })
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Request latency, osascript and AI backend timings and cache stats.
+
+    Prometheus text format by default; JSON (with estimated p50/p90/p99) for
+    ?format=json or a request that prefers application/json.
+    """
+    wants_json = request.args.get('format') == 'json' or (
+        'format' not in request.args
+        and request.accept_mimetypes.best_match(['text/plain', 'application/json']) == 'application/json')
+    if wants_json:
+        return jsonify(metrics.REGISTRY.to_dict())
+    return Response(metrics.REGISTRY.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/debug/profile')
+def debug_profile():
+    """Profile requests and AI jobs for ?seconds=N, or report the session LYRICSTAMP_PROFILE started.
+
+    ?mode=sample (default) returns collapsed stacks (?format=collapsed) or a
+    summary (?format=text); ?mode=cprofile returns a pstats dump (?format=pstats)
+    or a summary. ?interval_ms sets the sampling period, ?threads=all samples
+    every thread rather than only those inside requests and the AI pipeline.
+    """
+    if not profiling.enabled:
+        return jsonify({'error': 'Profiling is disabled; set LYRICSTAMP_PROFILE to enable it'}), 404
+    session = None if 'seconds' in request.args else profiling.current()
+    if session is None and 'seconds' not in request.args:
+        return jsonify({'error': 'No profiling session running; pass ?seconds=N to start one'}), 400
+    mode = session.mode if session else request.args.get('mode', 'sample')
+    if mode not in profiling.MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(profiling.MODES)}"}), 400
+    format = request.args.get('format', profiling.FORMATS[mode][0])
+    if format not in profiling.FORMATS[mode]:
+        return jsonify({'error': f"format must be one of {', '.join(profiling.FORMATS[mode])}"}), 400
+
+    if session is None:
+        try:
+            seconds = float(request.args['seconds'])
+            interval = float(request.args.get('interval_ms', 5)) / 1000
+        except ValueError:
+            return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+        if not 0 < seconds <= 300:
+            return jsonify({'error': 'seconds must be between 0 and 300'}), 400
+        try:
+            session = profiling.profile_for(seconds, mode, max(interval, 0.001),
+                                            all_threads=request.args.get('threads') == 'all')
+        except profiling.ProfilingBusy as e:
+            return jsonify({'error': str(e)}), 409
+
+    data, mimetype = session.render(format)
+    response = Response(data, mimetype=mimetype)
+    if format == 'pstats':
+        response.headers['Content-Disposition'] = 'attachment; filename=lyricstamp.pstats'
+    return response
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events stream of position ticks, track changes, lyrics reloads, session and AI updates."""
+    # Each stream holds a server thread; past the limit pages fall back to polling
+    slots = stream_slots
+    if slots is not None and not slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many open streams'}), 503, {'Retry-After': '10'}
+    try:
+        return open_stream(slots)
+    except Exception:
+        if slots is not None:
+            slots.release()
+        raise
+
+def open_stream(slots):
+    lyrics_file_watcher.start()
+    session_id = request_session_id()
+    subscriber = event_hub.subscribe(channel=session_id)
+    initial = []
+    snapshot = player_service.snapshot()
+    if not snapshot.error:
+        initial = [('track', track_event(snapshot)), ('position', position_event(snapshot))]
+    if session_id:
+        with sessions.locked(session_id) as session:
+            initial.append(('ai_status', current_ai_status(session)))
+            if session['lines']:
+                initial.append(('session', session_state(session)))
+    else:
+        initial.append(('ai_status', dict(AI_IDLE_STATUS)))
+    response = Response(event_hub.stream(subscriber, initial),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    def close():
+        # The server closes the response when the client goes away, even before the first event
+        event_hub.unsubscribe(subscriber)
+        if slots is not None:
+            slots.release()
+    response.call_on_close(close)
+    return response
+
+@app.route('/api/ready')
+def readiness():
+    """200 once the player has been polled and the lyrics index loaded, else 503; the launcher waits on this."""
+    start_warmup()
+    checks = {
+        'player': player_service.ready,
+        'lyrics_index': warmed_up.is_set()
+    }
+    ready = all(checks.values())
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
+
+# Startup work done off the request path, so the first page load is fast
+warmed_up = threading.Event()
+_warmup_lock = threading.Lock()
+_warmup_started = False
+
+def warm_up():
+    player_service.start()
+    library_index.ensure_fresh()
+    lyrics_file_watcher.start()
+    warmed_up.set()
+
+def start_warmup():
+    """Start warm_up() in the background, once."""
+    global _warmup_started
+    with _warmup_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    threading.Thread(target=warm_up, name='warmup', daemon=True).start()
+
+# Open /api/stream connections allowed at once; None (the dev server) means unlimited
+stream_slots = None
+# Threads kept free for ordinary requests however many pages hold a stream open
+RESERVED_REQUEST_THREADS = 4
+
+def serve(host='0.0.0.0', port=5734, threads=16, dev=False):
+    """Serve the app with waitress and a fixed thread pool, or Flask's debug server with `dev`."""
+    global stream_slots
+    if not dev:
+        try:
+            import waitress
+        except ImportError:
+            print("waitress is not installed (pip install waitress); falling back to the development server")
+            dev = True
+    if dev:
+        app.run(debug=True, host=host, port=port)
+        return
+    threads = max(threads, RESERVED_REQUEST_THREADS + 1)
+    stream_slots = threading.BoundedSemaphore(threads - RESERVED_REQUEST_THREADS)
+    recover_sessions()
+    start_warmup()
+    print(f"Serving on http://{host}:{port} with {threads} threads")
+    # Streams send a keep-alive every few seconds, so the idle timeout only reaps dead clients
+    waitress.serve(app, host=host, port=port, threads=threads, channel_timeout=120, ident='LyricStamp')
+
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="LyricStamp web interface")
+    parser.add_argument('--host', default=os.environ.get('LYRICSTAMP_HOST', '0.0.0.0'),
+                        help="Interface to listen on (default: 0.0.0.0, or LYRICSTAMP_HOST)")
+    parser.add_argument('--port', type=int, default=int(os.environ.get('LYRICSTAMP_PORT', 5734)),
+                        help="Port to listen on (default: 5734, or LYRICSTAMP_PORT)")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('LYRICSTAMP_THREADS', 16)),
+                        help="Request threads; each open page's live stream holds one (default: 16, or LYRICSTAMP_THREADS)")
+    parser.add_argument('--dev', action='store_true', help="Use Flask's debug server with auto-reload")
+    args = parser.parse_args()
+
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
     
     print("Starting LyricStamp Web Interface...")
-    print("Open your browser to: http://localhost:5734")
-    app.run(debug=True, host='0.0.0.0', port=5734) 
\ No newline at end of file
+    print(f"Open your browser to: http://localhost:{args.port}")
+    serve(args.host, args.port, args.threads, args.dev)